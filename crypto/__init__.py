@@ -8,6 +8,8 @@ from .bit_padding import *
 from .CHECK_TESTING import *
 from .extended_euclidean import *
 from .fact import *
+from .pollard import *
+from .fact_cache import *
 from .int_sqrt import *
 from .jacobi import *
 from .kronecker import *
@@ -15,9 +17,11 @@ from .legendre import *
 from .modpower import *
 from .primitive_root import *
 from .random_prime_fast import *
+from .prime_reservoir import *
 from .random_prime_maurer import *
 from .random_prime_with_fact_of_p_minus_1 import *
 from .strint import *
 from .compute_h import *
 from .fundamental_discriminants import *
 from .find_sq_roots import *
+from .polynomial import *
@@ -1,10 +1,24 @@
+from math import isqrt
 from ..modpower import modpower
-from .count_points_on_curve import count_points_on_curve_with_prime_modulo
+from .count_points_on_curve import count_points_on_curve_with_prime_modulo, find_special_curve
 from .add import add
-from .double_and_add import double_and_add
+from .double_and_add import double_and_add, double_and_add_jacobian
+from .fixed_base import FixedBaseTable, get_fixed_base_table
+from .wnaf import wnaf_scale_jacobian
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, batch_to_affine, jacobian_add, jacobian_negate, to_affine
+from .multi_scale import multi_scale_jacobian
+from .discrete_log import DLOG_BSGS_MAX_TABLE, bsgs_discrete_log, kangaroo_discrete_log
+from typing import Literal
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Algorithms for multiplying an arbitrary point by a scalar
+ScalarMultiplicationMethod = Literal["double_and_add", "wnaf"]
+DEFAULT_SCALAR_MULTIPLICATION_METHOD: ScalarMultiplicationMethod = "wnaf"
 
 class EllipticCurve:
-    def __init__(self, p: int, p_is_prime: bool, a: int, b: int, starting_point: tuple[int, int]) -> None:
+    def __init__(self, p: int, p_is_prime: bool, a: int, b: int, starting_point: tuple[int, int], scalar_multiplication_method: ScalarMultiplicationMethod = DEFAULT_SCALAR_MULTIPLICATION_METHOD, num_points_on_curve: int|None = None) -> None:
         if not p_is_prime:
             # In the future: add algo to count points on curve with non-prime modulo to support this case!
             raise ValueError("p must be prime")
@@ -12,8 +26,10 @@ class EllipticCurve:
         self.a = a
         self.b = b
         self.starting_point = starting_point
+        self.scalar_multiplication_method: ScalarMultiplicationMethod = scalar_multiplication_method
 
-        self._num_points_on_curve = None # lazy load
+        self._num_points_on_curve = num_points_on_curve # lazy load, unless already known
+        self._fixed_base_table: FixedBaseTable|None = None # lazy load
 
         x, y = starting_point
         assert (4 * modpower(a, 3, p) + 27 * modpower(b, 2, p)) % p != 0
@@ -26,6 +42,19 @@ class EllipticCurve:
             self._num_points_on_curve = count_points_on_curve_with_prime_modulo(p, a, b)
         return self._num_points_on_curve
     
+    @property
+    def fixed_base_table(self) -> FixedBaseTable:
+        """Precomputed multiples of the starting point, used to speed up scale_point(s, starting_point)."""
+        if self._fixed_base_table is None:
+            p, a, b = self.p, self.a, self.b
+            special_curve = find_special_curve(p, a, b, self.starting_point)
+            # The order of the group is at most p + 1 + 2 sqrt(p) < 2p
+            self._fixed_base_table = get_fixed_base_table(
+                p, a, b, tuple(self.starting_point), p.bit_length() + 1,
+                name=special_curve.name if special_curve is not None else None,
+            )
+        return self._fixed_base_table
+    
     def __repr__(self) -> str:
         return f"EllipticCurve(p = {self.p} , a = {self.a} , b = {self.b} , starting point P = {self.starting_point})"
     
@@ -35,34 +64,98 @@ class EllipticCurve:
     def add_points(self, A: tuple[int, int], B: tuple[int, int]) -> tuple[int, int]:
         return add(self.p, self.a, self.b, A, B)
     
-    def scale_point(self, s: int, B: tuple[int, int]) -> tuple[int, int]:
+    def scale_point(self, s: int, B: tuple[int, int], method: ScalarMultiplicationMethod|None = None) -> tuple[int, int]:
+        """
+        Returns sB. Multiples of the starting point are looked up in the fixed-base
+        table ; other points are multiplied with the given method, or the curve's
+        scalar_multiplication_method if None.
+        """
+        x, y = to_affine(self.p, self._scale_point_jacobian(s, B, method))
+        
+        assert self.is_point_on_curve((x, y)), f"Point {x, y} is not on the curve {self}"
+        return x, y
+    
+    def scale_points(self, s: int, points: list[tuple[int, int]], method: ScalarMultiplicationMethod|None = None) -> list[tuple[int, int]]:
+        """Returns [sB for B in points], converting all the results to affine coordinates with a single modular inversion."""
+        results = batch_to_affine(self.p, [self._scale_point_jacobian(s, B, method) for B in points])
+        for x, y in results:
+            assert self.is_point_on_curve((x, y)), f"Point {x, y} is not on the curve {self}"
+        return results
+    
+    def _scale_point_jacobian(self, s: int, B: tuple[int, int], method: ScalarMultiplicationMethod|None = None) -> JacobianPoint:
         p = self.p
         a = self.a
         b = self.b
-        if s < 0:
+        if s != 0 and B == self.starting_point and self.fixed_base_table.can_scale(abs(s)):
+            R = self.fixed_base_table.scale_jacobian(abs(s))
+            if s < 0:
+                R = jacobian_negate(p, R)
+            return R
+        elif s < 0:
             C = (B[0], (p-B[1]) % p)
             s = -s
-            x, y = self.scale_point(s, C)
+            return self._scale_point_jacobian(s, C, method)
         elif s == 0:
-            x, y = (0, 0)
+            return JACOBIAN_INFINITY
         else:
-            x, y = double_and_add(p, a, b, s, B)
+            method = method or self.scalar_multiplication_method
+            if method == "wnaf":
+                return wnaf_scale_jacobian(p, a, b, s, B)
+            elif method == "double_and_add":
+                return double_and_add_jacobian(p, a, s, B)
+            else:
+                raise ValueError(f"Unknown scalar multiplication method {method}")
+    
+    def multi_scale(self, scalars: list[int], points: list[tuple[int, int]]) -> tuple[int, int]:
+        """
+        Returns k_1 P_1 + k_2 P_2 + ... + k_n P_n, much faster than scaling the
+        points separately: multiples of the starting point are looked up in the
+        fixed-base table, and the other points share one chain of doublings
+        (Straus-Shamir, using the joint sparse form for two points and
+        interleaved wNAF for a few more), or use Pippenger's bucket method
+        for many points.
+        """
+        if len(scalars) != len(points):
+            raise ValueError(f"scalars and points must have the same length ({len(scalars)} != {len(points)})")
+        p, a, b = self.p, self.a, self.b
+
+        fixed_base_part = None
+        other_scalars: list[int] = []
+        other_points: list[tuple[int, int]] = []
+        for k, P in zip(scalars, points):
+            if P == self.starting_point and self.fixed_base_table.can_scale(abs(k)):
+                R = self.fixed_base_table.scale_jacobian(abs(k))
+                if k < 0:
+                    R = jacobian_negate(p, R)
+                fixed_base_part = R if fixed_base_part is None else jacobian_add(p, a, R, fixed_base_part)
+            else:
+                other_scalars.append(k)
+                other_points.append(P)
         
+        res = multi_scale_jacobian(p, a, b, other_scalars, other_points)
+        if fixed_base_part is not None:
+            res = jacobian_add(p, a, res, fixed_base_part)
+        x, y = to_affine(p, res)
+
         assert self.is_point_on_curve((x, y)), f"Point {x, y} is not on the curve {self}"
         return x, y
     
-    def search_point(self, B: tuple[int, int], P: tuple[int, int], ubound: int, lbound: int = 0) -> None | int:
-        """Returns s such that sP = B. Only search within bounds."""
-        if ubound < lbound:
-            return None
-
-        o = self.scale_point(lbound, P)
-        for s in range(lbound, ubound + 1):
-            if o == B:
-                return s
-            o = self.add_points(o, P)
-        return None
-    
+    def search_point(self, B: tuple[int, int], P: tuple[int, int], ubound: int, lbound: int = 0, parallel: bool = False, deadline: float|None = None) -> None | int:
+        """
+        Returns s such that sP = B, or None. Only search within bounds, cut to
+        the size of the group, which holds the smallest s. Ranges up to
+        DLOG_BSGS_MAX_TABLE^2 wide go to baby-step giant-step, which returns the
+        smallest s; wider ones to Pollard's kangaroos, which return some s in
+        the range, or None at the deadline (a time.monotonic() value) or when
+        likely not found. With parallel=True, the kangaroos jump in the prime
+        worker pool.
+        """
+        # Hasse: the order of P is at most p + 1 + 2 sqrt(p)
+        ubound = min(ubound, lbound + self.p + 2 * isqrt(self.p) + 2)
+        if ubound - lbound + 1 <= DLOG_BSGS_MAX_TABLE**2:
+            return bsgs_discrete_log(self.p, self.a, B, P, lbound, ubound)
+        return kangaroo_discrete_log(self.p, self.a, B, P, lbound, ubound, deadline=deadline, parallel=parallel)
+
     def is_point_on_curve(self, point: tuple[int, int]) -> bool:
         x, y = point
         p = self.p
@@ -73,3 +166,60 @@ class EllipticCurve:
             return True
 
         return (modpower(y, 2, p) - modpower(x, 3, p) - a*x%p - b) % p == 0
+
+class TestEllipticCurveScalePoint(unittest.TestCase):
+    def test_starting_point_uses_fixed_base_table(self):
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        for s in range(-200, 200):
+            expected = double_and_add(827, 29, 13, abs(s), (338, 71))
+            if s < 0:
+                expected = (expected[0], (827 - expected[1]) % 827)
+            self.assertEqual(ec.scale_point(s, ec.starting_point), expected, f"s = {s}")
+            self.assertEqual(ec.get_point_by_index(s), expected, f"s = {s}")
+        self.assertIsNotNone(ec._fixed_base_table)
+        # Scalars beyond the table's range fall back to double-and-add
+        self.assertEqual(ec.scale_point(2**20 + 1, ec.starting_point), double_and_add(827, 29, 13, 2**20 + 1, (338, 71)))
+
+    def test_scalar_multiplication_methods(self):
+        B = (338, 756)
+        ec_wnaf = EllipticCurve(827, True, 29, 13, (338, 71), scalar_multiplication_method="wnaf")
+        ec_double_and_add = EllipticCurve(827, True, 29, 13, (338, 71), scalar_multiplication_method="double_and_add")
+        for s in range(-100, 100):
+            expected = ec_double_and_add.scale_point(s, B)
+            self.assertEqual(ec_wnaf.scale_point(s, B), expected, f"s = {s}")
+            self.assertEqual(ec_double_and_add.scale_point(s, B, method="wnaf"), expected, f"s = {s}")
+            self.assertEqual(ec_wnaf.scale_point(s, B, method="double_and_add"), expected, f"s = {s}")
+
+    def test_multi_scale(self):
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        G = ec.starting_point
+        Q = (338, 756)
+        R = ec.scale_point(17, G)
+        for k0 in range(-40, 40, 3):
+            for k1 in range(-40, 40, 7):
+                expected = ec.add_points(ec.scale_point(k0, G), ec.scale_point(k1, Q))
+                self.assertEqual(ec.multi_scale([k0, k1], [G, Q]), expected)
+                self.assertEqual(ec.multi_scale([k0, k1, 5], [Q, R, G]), ec.add_points(ec.add_points(ec.scale_point(k0, Q), ec.scale_point(k1, R)), ec.scale_point(5, G)))
+        self.assertEqual(ec.multi_scale([], []), (0, 0))
+
+    def test_scale_points(self):
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        points = [ec.starting_point, (0, 0)] + [ec.scale_point(k, (338, 756)) for k in range(1, 30)]
+        for s in [-5, 0, 1, 81, 1000]:
+            for method in ["wnaf", "double_and_add"]:
+                self.assertEqual(ec.scale_points(s, points, method), [ec.scale_point(s, B, method) for B in points])
+
+    def test_search_point(self):
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        G = ec.starting_point
+        for s in [0, 1, 2, 77, 400, 1500]:
+            B = ec.scale_point(s, G)
+            for lbound, ubound in [(0, 2000), (s, s), (s - 30, s + 900), (-50, 10)]:
+                expected = next((t for t in range(lbound, ubound + 1) if ec.scale_point(t, G) == B), None)
+                self.assertEqual(ec.search_point(B, G, ubound, lbound), expected, f"s = {s}, bounds = {lbound}, {ubound}")
+        # G has order 81, and (2, 71) is not one of its multiples: the wide ranges are cut to the group
+        self.assertEqual(ec.search_point(ec.scale_point(40, G), G, 2**80, 100), 121)
+        self.assertIsNone(ec.search_point((2, 71), G, 2**80))
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -2,6 +2,15 @@ from .add import *
 from .count_points_on_curve import *
 from .double_and_add import *
 from .EllipticCurve import *
+from .fixed_base import *
 from .generate import *
+from .jacobian import *
+from .multi_scale import *
 from .plain_text_conversions import *
+from .wnaf import *
 from .calculate_order_of_point_on_curve import *
+from .ecm import *
+from .montgomery import *
+from .schoof import *
+from .discrete_log import *
+from .cm import *
@@ -1,4 +1,5 @@
 import sys
+from typing import get_args
 from ..CHECK_TESTING import CHECK_TESTING
 from . import *
 
@@ -7,7 +8,16 @@ def main_generate(argv: list[str]) -> None:
         pbits = int(argv[1])
     else:
         pbits = int(input("Enter number of bits for prime p = "))
-    ec = generate_elliptic_curve_with_number_of_points_being_prime(pbits)
+    strategy = DEFAULT_CURVE_GENERATION_STRATEGY
+    if len(argv) >= 3:
+        strategy = next((s for s in get_args(CurveGenerationStrategy) if s == argv[2]), None)
+        if strategy is None:
+            raise ValueError(f"Unknown strategy {argv[2]}, expected one of {', '.join(get_args(CurveGenerationStrategy))}")
+
+    def progress(stats: CurveGenerationStats) -> None:
+        print(f"{stats['seconds']:.1f}s: {stats['curves']:.0f} curves over {stats['primes']:.0f} primes, {stats['sieved_out']:.0f} sieved out", file=sys.stderr)
+
+    ec = generate_elliptic_curve_with_number_of_points_being_prime(pbits, parallel=True, progress=progress, strategy=strategy)
     print(ec)
 
 if __name__ == "__main__":
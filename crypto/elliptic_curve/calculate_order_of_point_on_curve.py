@@ -1,22 +1,46 @@
-from ..generate_divisors import generate_divisors
+from ..fact import fact
+from .double_and_add import double_and_add_jacobian
 from .EllipticCurve import EllipticCurve
 import unittest
 from ..CHECK_TESTING import CHECK_TESTING
 
+def _kills(p: int, a: int, k: int, M: tuple[int, int]) -> bool:
+    # kM = O, without converting back to affine coordinates
+    return double_and_add_jacobian(p, a, k, M)[2] % p == 0
+
+def order_of_point_from_multiple(p: int, a: int, M: tuple[int, int], n: int, factors: dict[int, int]|None = None) -> int|None:
+    """
+    Returns the order of M, given a multiple n of it (e.g. the number of
+    points on the curve), or None if nM != O. Each prime factor q of n is
+    stripped while (n/q)M = O, for as many scalar multiplications as prime
+    factors of n, counted with multiplicity. factors is the factorization of
+    n, computed if not given.
+    """
+    if n < 1 or not _kills(p, a, n, M):
+        return None
+    if factors is None:
+        factors = fact(n)
+    for q, e in factors.items():
+        for _ in range(e):
+            if not _kills(p, a, n // q, M):
+                break
+            n //= q
+    return n
+
 def calculate_order_of_point_on_curve(ec: EllipticCurve, M: tuple[int, int], use_curve_point_count: bool=True) -> int:
     # G = ec.starting_point
     # assert ec.is_point_on_curve(G), f"The starting point {G} is not on the curve {ec}." # EllipticCurve constructor already checked this
     assert ec.is_point_on_curve(M), f"The point {M} is not on the curve {ec}."
 
     if use_curve_point_count:
-        # We are looking for the smallest positive integer d such that dM = (0, 0)
-        # We can do this by checking all divisors of the order of the curve
-        # and checking if dM = (0, 0) for each of them
-        n = ec.num_points_on_curve
-        for d in generate_divisors(n):
-            if ec.scale_point(d, M) == (0, 0):
-                return d
-        raise RuntimeError(f"Could not find the order of the point {M} on the curve {ec}. This should not happen.")
+        # We are looking for the smallest positive integer d such that dM = (0, 0),
+        # a divisor of the order of the curve
+        if M[0] % ec.p == 0 and M[1] % ec.p == 0:
+            return 1
+        d = order_of_point_from_multiple(ec.p, ec.a, M, ec.num_points_on_curve)
+        if d is None:
+            raise RuntimeError(f"Could not find the order of the point {M} on the curve {ec}. This should not happen.")
+        return d
     else:
         # We are looking for the smallest positive integer d such that dM = (0, 0)
         # We can do this by checking all positive integers
@@ -25,6 +49,23 @@ def calculate_order_of_point_on_curve(ec: EllipticCurve, M: tuple[int, int], use
             d += 1
         return d
 
+def calculate_cofactor_of_point_on_curve(ec: EllipticCurve, M: tuple[int, int]) -> int:
+    """Returns h = #E / ord(M), the index of the subgroup generated by M."""
+    return ec.num_points_on_curve // calculate_order_of_point_on_curve(ec, M)
+
+def is_point_in_subgroup(ec: EllipticCurve, M: tuple[int, int], r: int, factors: dict[int, int]|None = None) -> bool:
+    """
+    Whether M is on the curve and in the subgroup of order r, i.e. rM = O.
+    With factors, the factorization of r, it also requires M to generate the
+    whole subgroup, e.g. to check a base point of prime order r.
+    """
+    if not ec.is_point_on_curve(M):
+        return False
+    if M[0] % ec.p == 0 and M[1] % ec.p == 0:
+        return factors is None or r == 1
+    order = order_of_point_from_multiple(ec.p, ec.a, M, r, factors)
+    return order is not None and (factors is None or order == r)
+
 class TestRawCalculateOrderOfPointOnCurve(unittest.TestCase):
     def test_A_small_curve(self):
         p = 827
@@ -55,6 +96,23 @@ class TestRawCalculateOrderOfPointOnCurve(unittest.TestCase):
         self.assertEqual(calculate_order_of_point_on_curve(ec, (0, 0), use_curve_point_count=False), 1)
         self.assertEqual(calculate_order_of_point_on_curve(ec, G, use_curve_point_count=True), order)
         # self.assertEqual(calculate_order_of_point_on_curve(ec, G, use_curve_point_count=False), order) # too slow
+        self.assertEqual(calculate_cofactor_of_point_on_curve(ec, G), 1)
+        self.assertTrue(is_point_in_subgroup(ec, G, order, { order: 1 }))
+        self.assertFalse(is_point_in_subgroup(ec, (G[0], G[1] + 1), order))
+
+    def test_C_against_naive(self):
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        n = ec.num_points_on_curve
+        points = [(x, y) for x in range(827) for y in range(827) if (y * y - x**3 - 29 * x - 13) % 827 == 0]
+        for M in points[::7]:
+            order = calculate_order_of_point_on_curve(ec, M)
+            self.assertEqual(order, calculate_order_of_point_on_curve(ec, M, use_curve_point_count=False), f"M = {M}")
+            self.assertEqual(calculate_cofactor_of_point_on_curve(ec, M) * order, n)
+            self.assertTrue(is_point_in_subgroup(ec, M, order))
+            self.assertTrue(is_point_in_subgroup(ec, M, order, fact(order)))
+            self.assertFalse(is_point_in_subgroup(ec, M, n, fact(n)) and order != n)
+            if order > 1:
+                self.assertIsNone(order_of_point_from_multiple(827, 29, M, order - 1))
 
 if __name__ == "__main__":
     CHECK_TESTING()
@@ -0,0 +1,242 @@
+import decimal
+from decimal import Decimal
+from math import gcd, isqrt
+from random import choice, randrange
+from ..fundamental_discriminants import generate_fundamental_discriminants_of_increasing_h_D
+from ..legendre import legendre
+from ..polynomial import poly_roots
+from ..prime import is_prime
+from .double_and_add import double_and_add_jacobian
+from .EllipticCurve import EllipticCurve
+from .schoof import random_point_on_curve
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Largest class number h(D) of the discriminants picked by the CM method. The
+# Hilbert class polynomial has degree h(D), and its roots modulo p are needed.
+CM_MAX_CLASS_NUMBER = 7
+
+# Decimal digits computed beyond the size of the coefficients of the Hilbert
+# class polynomial, so that they round to the right integers
+CM_GUARD_DIGITS = 30
+
+# Below this size of p, there are too few primes 4p = t^2 + |D| v^2 for each D
+CM_MIN_BITS = 16
+
+# A complex number re + i im, with decimal parts
+_Complex = tuple[Decimal, Decimal]
+
+_cm_discriminants: list[int]|None = None # lazy load
+_hilbert_class_polynomials: dict[int, list[int]] = {}
+
+def cm_discriminants() -> list[int]:
+    """
+    The fundamental discriminants D < -4 with h(D) <= CM_MAX_CLASS_NUMBER and
+    D = 5 mod 8 (D = -3 gives j = 0, with 6 twists). Only for those is 2 inert
+    in Q(sqrt(D)): otherwise the Frobenius is 1 modulo a prime of norm 2 over
+    2, and the number of points, the norm of Frobenius - 1, is always even.
+    """
+    global _cm_discriminants
+    if _cm_discriminants is None:
+        discriminants = []
+        for h, D in generate_fundamental_discriminants_of_increasing_h_D():
+            if h > CM_MAX_CLASS_NUMBER:
+                break
+            if D < -4 and D % 8 == 5:
+                discriminants.append(D)
+        _cm_discriminants = discriminants
+    return _cm_discriminants
+
+def reduced_forms(D: int) -> list[tuple[int, int, int]]:
+    """
+    Returns the reduced primitive positive definite forms a x^2 + b x y + c y^2
+    of discriminant b^2 - 4ac = D < 0: |b| <= a <= c, with b >= 0 if |b| = a
+    or a = c. There are h(D) of them, one per ideal class.
+    """
+    forms = []
+    a = 1
+    while 3 * a * a <= -D:
+        for b in range(-a + 1, a + 1):
+            if (b * b - D) % (4 * a) != 0:
+                continue
+            c = (b * b - D) // (4 * a)
+            if c < a or (b < 0 and a == c) or gcd(gcd(a, b), c) != 1:
+                continue
+            forms.append((a, b, c))
+        a += 1
+    return forms
+
+def _mul(x: _Complex, y: _Complex) -> _Complex:
+    return x[0] * y[0] - x[1] * y[1], x[0] * y[1] + x[1] * y[0]
+
+def _pi() -> Decimal:
+    # The recipe of the documentation of decimal, at the precision of the context
+    decimal.getcontext().prec += 2
+    three = Decimal(3)
+    lasts, t, s, n, na, d, da = Decimal(0), three, Decimal(3), 1, 0, 0, 24
+    while s != lasts:
+        lasts = s
+        n, na = n + na, na + 8
+        d, da = d + da, da + 32
+        t = (t * n) / d
+        s += t
+    decimal.getcontext().prec -= 2
+    return +s
+
+def _cos_sin(x: Decimal) -> _Complex:
+    # Taylor series, for |x| <= pi
+    decimal.getcontext().prec += 2
+    epsilon = Decimal(10) ** -decimal.getcontext().prec
+    cos, sin = Decimal(0), Decimal(0)
+    term, n = Decimal(1), 0
+    while abs(term) > epsilon:
+        if n % 4 == 0:
+            cos += term
+        elif n % 4 == 1:
+            sin += term
+        elif n % 4 == 2:
+            cos -= term
+        else:
+            sin -= term
+        n += 1
+        term = term * x / n
+    decimal.getcontext().prec -= 2
+    return +cos, +sin
+
+def _j(a: int, b: int, D: int, pi: Decimal) -> _Complex:
+    # j(tau) for tau = (-b + sqrt(D)) / 2a, from q = exp(2 i pi tau) and
+    # f = q prod (1 + q^n)^24 = Delta(2 tau) / Delta(tau): j = (256 f + 1)^3 / f
+    modulus = (-pi * Decimal(-D).sqrt() / a).exp()
+    cos, sin = _cos_sin(-pi * b / a)
+    q = modulus * cos, modulus * sin
+    epsilon = Decimal(10) ** -(decimal.getcontext().prec + 2)
+    f = q
+    qn = q
+    while abs(qn[0]) + abs(qn[1]) > epsilon:
+        u = (1 + qn[0], qn[1])
+        u3 = _mul(_mul(u, u), u)
+        u24 = _mul(u3, u3)
+        u24 = _mul(u24, u24)
+        u24 = _mul(u24, u24)
+        f = _mul(f, u24)
+        qn = _mul(qn, q)
+    g = (256 * f[0] + 1, 256 * f[1])
+    g3 = _mul(_mul(g, g), g)
+    norm = f[0] * f[0] + f[1] * f[1]
+    return _mul(g3, (f[0] / norm, -f[1] / norm))
+
+def hilbert_class_polynomial(D: int) -> list[int]:
+    """
+    Returns the Hilbert class polynomial H_D = prod (X - j(tau)), lowest degree
+    first, over the roots tau = (-b + sqrt(D)) / 2a of the reduced forms of
+    discriminant D. Its coefficients are integers, rounded from a product
+    computed with enough decimal digits: |j(tau)| ~ exp(pi sqrt(|D|) / a).
+    """
+    H = _hilbert_class_polynomials.get(D)
+    if H is not None:
+        return H
+    forms = reduced_forms(D)
+    digits = int(3.1416 * isqrt(-D) * sum(1 / a for a, _b, _c in forms) / 2.3) + len(forms) + 1
+    with decimal.localcontext() as context:
+        context.prec = digits + CM_GUARD_DIGITS
+        context.Emax = decimal.MAX_EMAX
+        context.Emin = decimal.MIN_EMIN
+        pi = _pi()
+        product: list[_Complex] = [(Decimal(1), Decimal(0))]
+        for a, b, _c in forms:
+            j = _j(a, b, D, pi)
+            # product * (X - j)
+            shifted = [(Decimal(0), Decimal(0))] + product
+            for i, c in enumerate(product):
+                jc = _mul(j, c)
+                shifted[i] = (shifted[i][0] - jc[0], shifted[i][1] - jc[1])
+            product = shifted
+        H = [int(re.to_integral_value()) for re, _im in product]
+        if any(abs(re - c) > Decimal("0.1") or abs(im) > Decimal("0.1") for (re, im), c in zip(product, H)):
+            raise RuntimeError(f"Please review this algorithm. FAIL TEST: H_D for D = {D} is not close enough to integers")
+    _hilbert_class_polynomials[D] = H
+    return H
+
+def _cm_prime_and_order(pbits: int, D: int) -> tuple[int, int]:
+    # Random 4p = t^2 + |D| v^2 in [2^(pbits + 2), 2^(pbits + 3)), until p and one of p + 1 -+ t are prime
+    lo, hi = 4 << pbits, 8 << pbits
+    while True:
+        v = randrange(1, isqrt((lo - 1) // -D) + 1)
+        dv2 = -D * v * v
+        t = randrange(isqrt(lo - dv2 - 1) + 1, isqrt(hi - dv2 - 1) + 1)
+        if (t * t + dv2) % 4 != 0:
+            continue
+        p = (t * t + dv2) // 4
+        if not is_prime(p, "fast"):
+            continue
+        for N in (p + 1 - t, p + 1 + t):
+            if is_prime(N, "fast") and is_prime(N, "deterministic") and is_prime(p, "deterministic"):
+                return p, N
+
+def generate_curve_with_prime_order_by_cm(pbits: int, D: int|None = None) -> EllipticCurve:
+    """
+    Returns a curve over a prime p in [2^pbits, 2^(pbits + 1)) with a prime
+    number of points N, by complex multiplication, without counting points:
+    for a fundamental discriminant D (random among cm_discriminants() if not
+    given), p and N = p + 1 -+ t come from 4p = t^2 + |D| v^2, and the roots
+    of the Hilbert class polynomial H_D modulo p are the j-invariants of the
+    curves with N points or p + 1 +- t points, their quadratic twists.
+    The curves have a small CM discriminant |D|, unlike random ones.
+    """
+    if pbits < CM_MIN_BITS:
+        raise ValueError(f"The CM method needs pbits >= {CM_MIN_BITS}, not {pbits}")
+    if D is None:
+        D = choice(cm_discriminants())
+    elif D % 8 != 5 or D >= -4:
+        raise ValueError(f"The CM method needs D = 5 mod 8 and D < -4 for a prime number of points, not {D}")
+    H = hilbert_class_polynomial(D)
+    while True:
+        p, N = _cm_prime_and_order(pbits, D)
+        roots = [j for j in poly_roots([c % p for c in H], p) if j != 0 and j != 1728 % p]
+        if len(roots) == 0:
+            continue
+        j = roots[0]
+        # y^2 = x^3 + 3k x + 2k has j-invariant 1728 k / (k + 1) = j
+        k = j * pow(1728 - j, -1, p) % p
+        a, b = 3 * k % p, 2 * k % p
+        if double_and_add_jacobian(p, a, N, random_point_on_curve(p, a, b))[2] % p != 0:
+            # The quadratic twist by a non-residue c has the other number of points
+            c = next(c for c in range(2, p) if legendre(c, p) == -1)
+            a, b = a * c * c % p, b * c * c * c % p
+            if double_and_add_jacobian(p, a, N, random_point_on_curve(p, a, b))[2] % p != 0:
+                raise RuntimeError(f"Please review this algorithm. FAIL TEST: no twist of j = {j} over p = {p} has {N} points")
+        return EllipticCurve(p, True, a, b, random_point_on_curve(p, a, b), num_points_on_curve=N)
+
+class TestCM(unittest.TestCase):
+    def test_reduced_forms(self):
+        self.assertEqual(reduced_forms(-7), [(1, 1, 2)])
+        self.assertEqual(reduced_forms(-20), [(1, 0, 5), (2, 2, 3)])
+        self.assertEqual(reduced_forms(-23), [(1, 1, 6), (2, -1, 3), (2, 1, 3)])
+
+    def test_hilbert_class_polynomial(self):
+        self.assertEqual(hilbert_class_polynomial(-7), [3375, 1])
+        self.assertEqual(hilbert_class_polynomial(-8), [-8000, 1])
+        self.assertEqual(hilbert_class_polynomial(-163), [640320**3, 1])
+        self.assertEqual(hilbert_class_polynomial(-15), [-121287375, 191025, 1])
+        self.assertEqual(hilbert_class_polynomial(-23), [12771880859375, -5151296875, 3491750, 1])
+        for D in cm_discriminants()[::10]:
+            H = hilbert_class_polynomial(D)
+            self.assertEqual(len(H) - 1, len(reduced_forms(D)), f"D = {D}")
+            self.assertEqual(H[-1], 1)
+
+    def test_generate(self):
+        for pbits, D in [(16, -11), (64, -59), (128, None), (256, None), (521, -1867)]:
+            ec = generate_curve_with_prime_order_by_cm(pbits, D)
+            self.assertEqual(ec.p.bit_length(), pbits + 1)
+            N = ec.num_points_on_curve
+            self.assertTrue(is_prime(N))
+            self.assertEqual(ec.scale_point(N, ec.starting_point), (0, 0))
+            self.assertNotEqual(ec.starting_point, (0, 0))
+            if pbits <= 64:
+                from .count_points_on_curve import count_points_on_curve_with_prime_modulo
+                self.assertEqual(count_points_on_curve_with_prime_modulo(ec.p, ec.a, ec.b), N)
+        self.assertRaises(ValueError, generate_curve_with_prime_order_by_cm, 64, -7)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -1,10 +1,16 @@
+import operator
+from collections import deque
+from itertools import accumulate, islice, repeat
 from ..legendre import legendre
+from ..prime.sieve import primes_up_to
+from .schoof import count_points_on_curve_with_bsgs, count_points_on_curve_with_schoof, count_points_on_curve_with_schoof_sieved
 import unittest
 from ..CHECK_TESTING import CHECK_TESTING
-# from ..prime import basic_primes, is_prime
-# from ..fact import find_next_prime_from
-# from ..int_sqrt import int_sqrt_up
-# from ..crt import crt
+
+# Up to this size of p, going through all the x is as fast as a baby-step
+# giant-step, which is a few milliseconds from there up to 64 bits (Schoof
+# only computes t mod 2 up to there, see count_points_on_curve_with_schoof())
+COUNT_POINTS_TABLE_MAX_BITS = 12
 
 class SpecialEllipticCurve:
     def __init__(self, name: str, p: int, a: int, b: int, order: int, starting_point: tuple[int, int]) -> None:
@@ -90,18 +96,21 @@ special_curves: list[SpecialEllipticCurve] = [
     ),
 ]
 
-def count_points_on_special_curve_if_any(p: int, a: int, b: int) -> int|None:
-    # Special case for special curves
+def find_special_curve(p: int, a: int, b: int, starting_point: tuple[int, int]|None = None) -> SpecialEllipticCurve|None:
     for special_curve in special_curves:
         if special_curve.p == p and special_curve.a == a and special_curve.b == b:
-            return special_curve.order
+            if starting_point is None or special_curve.starting_point == tuple(starting_point):
+                return special_curve
     return None
 
-def count_points_on_curve_with_prime_modulo(p: int, a: int, b: int) -> int:
-    count = count_points_on_special_curve_if_any(p, a, b)
-    if count is not None:
-        return count
-    
+def count_points_on_special_curve_if_any(p: int, a: int, b: int) -> int|None:
+    # Special case for special curves
+    special_curve = find_special_curve(p, a, b)
+    if special_curve is not None:
+        return special_curve.order
+    return None
+
+def count_points_on_curve_with_prime_modulo_naive(p: int, a: int, b: int) -> int:
     count = 0
     for x in range(p):
         y2 = (x**3 + a*x + b) % p
@@ -113,51 +122,61 @@ def count_points_on_curve_with_prime_modulo(p: int, a: int, b: int) -> int:
             count += 2
     count += 1
     return count
-    # E = EllipticCurve(GF(p), [a, b]) # type: ignore
-    # return E.cardinality() # type: ignore
 
-# def count_points_on_curve_with_prime_modulo(p: int, a: int, b: int) -> int:
-#     count = count_points_on_special_curve_if_any(p, a, b)
-#     if count is not None:
-#         return count
-    
-#     if not is_prime(p):
-#         raise NotImplementedError("Sorry, we don't support the case of non-prime moduli yet.")
+def count_points_on_curve_with_prime_modulo_table(p: int, a: int, b: int) -> int:
+    """
+    Same as count_points_on_curve_with_prime_modulo_naive(), but the number
+    of square roots of every residue is looked up in a table of p bytes built
+    from all the squares, instead of a Legendre symbol per x, and all the
+    loops run in C (itertools and map). About 5 times faster.
+    """
+    # table[v] = number of y such that y^2 = v
+    table = bytearray(p)
+    # The squares of 1, ..., (p - 1) / 2 are the sums of the first odd numbers
+    deque(map(table.__setitem__, map(operator.mod, accumulate(range(1, p, 2)), repeat(p)), repeat(2)), maxlen=0)
+    table[0] = 1
+    # x^3 + a x + b for x = 0, 1, ... from its finite differences: the third one is 6,
+    # the second one 6 x + 6, the first one 3 x^2 + 3 x + 1 + a
+    values = islice(accumulate(accumulate(accumulate(repeat(6), initial=6), initial=1 + a), initial=b), p)
+    return 1 + sum(map(table.__getitem__, map(operator.mod, values, repeat(p))))
 
-#     if p.bit_length() <= 10:
-#        return count_points_on_curve_with_prime_modulo_naive(p, a, b)
-    
-#     # Schoof
-#     minProdLExclusive = 4 * int_sqrt_up(p)
-#     L: list[int] = []
-#     prodL = 1
-#     for prime in filter(lambda x: x != 2, basic_primes):
-#         if p % prime != 0:
-#             L.append(prime)
-#             prodL *= prime
-#             if prodL > minProdLExclusive:
-#                 break
-    
-#     while prodL <= minProdLExclusive:
-#         prime = find_next_prime_from(L[-1])
-#         L.append(prime)
-#         prodL *= prime
-    
-#     T: list[int] = []
-#     for l in L:
-#         # Calculate the Frobenius trace modulo l
-#         n = count_points_on_curve_with_prime_modulo(l, a, b)
-#         t = l + 1 - n
-#         T.append(t)
-    
-#     t = crt(T, L)
-#     Hasse_bound = int(2 * (p ** 0.5)) 
-#     while t > Hasse_bound:
-#         t -= prodL
-#     while t < -Hasse_bound:
-#         t += prodL
-#     print(f"trace = {t}")
-#     return p + 1 - t
+def is_singular_curve(p: int, a: int, b: int) -> bool:
+    return (4 * a**3 + 27 * b**2) % p == 0
+
+def count_points_on_singular_curve(p: int, a: int, b: int) -> int:
+    """
+    Number of points of y^2 = x^3 + a x + b when 4a^3 + 27b^2 = 0 mod p > 3:
+    the cubic is (x - r)^2 (x + 2r), with r = -3b / 2a (0 for a cusp), and
+    y^2 = (x - r)^2 (x + 2r) has 1 + (x + 2r | p) solutions for every x != r
+    and one for x = r, hence p + 1 - (3r | p) points with the one at infinity.
+    """
+    r = -3 * b * pow(2 * a, -1, p) % p if a % p != 0 else 0
+    return p + 1 - legendre(3 * r % p, p)
+
+def count_points_on_curve_with_prime_modulo(p: int, a: int, b: int) -> int:
+    count = count_points_on_special_curve_if_any(p, a, b)
+    if count is not None:
+        return count
+
+    if p > 3 and is_singular_curve(p, a, b):
+        # Schoof's algorithm and the baby-step giant-step need a genuine elliptic curve
+        return count_points_on_singular_curve(p, a, b)
+    if p.bit_length() <= COUNT_POINTS_TABLE_MAX_BITS:
+        return count_points_on_curve_with_prime_modulo_table(p, a, b)
+    return count_points_on_curve_with_schoof(p, a, b)
+
+def count_points_on_curve_with_prime_modulo_sieved(p: int, a: int, b: int, sieve_bound: int) -> int|None:
+    """
+    Same as count_points_on_curve_with_prime_modulo(), but returns None if the
+    number of points has a prime factor l <= sieve_bound other than itself,
+    which Schoof's algorithm finds out before most of the work.
+    """
+    if p.bit_length() > COUNT_POINTS_TABLE_MAX_BITS and count_points_on_special_curve_if_any(p, a, b) is None and not is_singular_curve(p, a, b):
+        return count_points_on_curve_with_schoof_sieved(p, a, b, sieve_bound)
+    N = count_points_on_curve_with_prime_modulo(p, a, b)
+    if any(N % l == 0 and N != l for l in primes_up_to(sieve_bound)):
+        return None
+    return N
 
 class TestCountPointsOnCurve(unittest.TestCase):
     def test_A_small(self):
@@ -172,13 +191,44 @@ class TestCountPointsOnCurve(unittest.TestCase):
             0x0000000000000000000000000000000000000000000000000000000000000007,
         ), 0xfffffffffffffffffffffffffffffffebaaedce6af48a03bbfd25e8cd0364141)
     
-    # def test_C_unknown_curve_secp112r1(self):
-    #     # https://neuromancer.sk/std/secg/secp112r1
-    #     self.assertEqual(count_points_on_curve_with_prime_modulo(
-    #         0xdb7c2abf62e35e668076bead208b,
-    #         0xdb7c2abf62e35e668076bead2088,
-    #         0x659ef8ba043916eede8911702b22,
-    #     ), 0xdb7c2abf62e35e7628dfac6561c5)
+    def test_C_unknown_curve_secp112r1(self):
+        # https://neuromancer.sk/std/secg/secp112r1
+        self.assertEqual(count_points_on_curve_with_prime_modulo(
+            0xdb7c2abf62e35e668076bead208b,
+            0xdb7c2abf62e35e668076bead2088,
+            0x659ef8ba043916eede8911702b22,
+        ), 0xdb7c2abf62e35e7628dfac6561c5)
+
+    def test_D_schoof_against_naive(self):
+        for p, a, b in [(65537, 2, 3), (65537, 0, 7), (65537, 5, 0), (100003, 123, 456)]:
+            self.assertEqual(count_points_on_curve_with_schoof(p, a, b), count_points_on_curve_with_prime_modulo_naive(p, a, b), f"p = {p}, a = {a}, b = {b}")
+
+    def test_E_table_against_naive(self):
+        for p, a, b in [(5, 1, 1), (827, 29, 13), (827, 0, 0), (4093, 4092, 0), (65537, 2, 3)]:
+            self.assertEqual(count_points_on_curve_with_prime_modulo_table(p, a, b), count_points_on_curve_with_prime_modulo_naive(p, a, b), f"p = {p}, a = {a}, b = {b}")
+
+    def test_F_bsgs_mid_size(self):
+        # 2^61 - 1: the Hasse interval has 2^32 candidates, 2^31 once t mod 2 is known
+        p, a, b = 2**61 - 1, 2, 3
+        N = count_points_on_curve_with_prime_modulo(p, a, b)
+        self.assertEqual(count_points_on_curve_with_bsgs(p, a, b), N)
+
+    def test_G_sieved(self):
+        for p in [11, 827, 10007]:
+            for a, b in [(1, 1), (2, 3), (5, 7), (29, 13)]:
+                N = count_points_on_curve_with_prime_modulo_naive(p, a, b)
+                expected = None if any(N % l == 0 and N != l for l in [2, 3, 5]) else N
+                self.assertEqual(count_points_on_curve_with_prime_modulo_sieved(p, a, b, 5), expected, f"p = {p}, a = {a}, b = {b}")
+
+    def test_H_singular(self):
+        self.assertEqual(count_points_on_curve_with_prime_modulo(10007, 10004, 2), 10007)
+        self.assertEqual(count_points_on_curve_with_prime_modulo(10007, 0, 0), 10008)
+        for p in [5, 7, 1009, 10007]:
+            for r in [0, 1, 2, 5, 100]:
+                # (x - r)^2 (x + 2r) = x^3 - 3r^2 x + 2r^3
+                a, b = -3 * r * r % p, 2 * r**3 % p
+                self.assertEqual(count_points_on_singular_curve(p, a, b), count_points_on_curve_with_prime_modulo_naive(p, a, b), f"p = {p}, r = {r}")
+                self.assertEqual(count_points_on_curve_with_prime_modulo(p, a, b), count_points_on_curve_with_prime_modulo_naive(p, a, b), f"p = {p}, r = {r}")
 
 if __name__ == "__main__":
     CHECK_TESTING()
@@ -0,0 +1,378 @@
+import time
+import random
+from math import isqrt
+from ..extended_euclidean import batch_inverse
+from .add import add
+from .double_and_add import double_and_add_jacobian
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, batch_to_affine, is_affine_infinity, jacobian_add, jacobian_negate, to_affine, to_jacobian
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Most entries in the baby-step table of bsgs_discrete_log(), about 100 bytes
+# each. Wider ranges cost more giant steps instead: width / entries of them.
+DLOG_BSGS_MAX_TABLE = 1 << 18
+
+# Baby and giant steps converted to affine coordinates with a single inversion
+DLOG_BSGS_BATCH = 256
+
+# Number of kangaroos (or rho walks) stepped together, sharing the modular
+# inversion of their affine additions (Montgomery's trick)
+DLOG_HERD_SIZE = 32
+
+# Steps of each herd between two looks at the distinguished points, which is
+# also one task for a worker process when parallel
+DLOG_ROUND_STEPS = 512
+
+# Number of jumps of the r-adding walk of Pollard's rho
+DLOG_RHO_JUMPS = 20
+
+# The kangaroos and rho walks give up after this many times their expected
+# number of steps, when there is likely no solution. Ranges of at most
+# DLOG_BSGS_MAX_TABLE^2 then go to baby-step giant-step for a definite answer.
+DLOG_WALK_BUDGET = 8
+
+# A herd member: affine point (x, y) = c P + d B, kept with c and d, and
+# whether it is a tame (0) or a wild (1) kangaroo
+Walker = tuple[int, int, int, int, int]
+
+# A jump: the affine point c P + d B added by the walk, with c and d
+Jump = tuple[int, int, int, int]
+
+def _out_of_time(deadline: float|None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+def _multiple(p: int, a: int, s: int, P: tuple[int, int]) -> JacobianPoint:
+    # sP for any sign of s
+    return double_and_add_jacobian(p, a, s, P) if s >= 0 else jacobian_negate(p, double_and_add_jacobian(p, a, -s, P))
+
+def _affine_key(p: int, P: JacobianPoint) -> tuple[int, int]|None:
+    # Not (0, 0) for the point at infinity, which is a genuine point when b = 0
+    return None if P[2] % p == 0 else to_affine(p, P)
+
+def bsgs_discrete_log(p: int, a: int, B: tuple[int, int], P: tuple[int, int], lbound: int, ubound: int, max_table: int = DLOG_BSGS_MAX_TABLE) -> int|None:
+    """
+    Returns the smallest s in [lbound, ubound] such that sP = B, or None, by
+    baby-step giant-step: s = lbound + i m + j with a table of the jP,
+    j < m, and a walk B - lbound P - i mP over i. m = sqrt(width) unless that
+    exceeds max_table, which trades memory for time: width / m giant steps.
+    """
+    if ubound < lbound:
+        return None
+    width = ubound - lbound + 1
+    m = min(isqrt(width - 1) + 1, max_table)
+
+    baby: dict[tuple[int, int]|None, int] = {}
+    R = JACOBIAN_INFINITY
+    for start in range(0, m, DLOG_BSGS_BATCH):
+        batch = []
+        for _ in range(min(DLOG_BSGS_BATCH, m - start)):
+            batch.append(R)
+            R = jacobian_add(p, a, R, to_jacobian(p, P))
+        for j, (Q, key) in enumerate(zip(batch, batch_to_affine(p, batch)), start):
+            baby.setdefault(None if Q[2] % p == 0 else key, j)
+    giant = jacobian_negate(p, R) # -mP
+
+    R = jacobian_add(p, a, to_jacobian(p, B), _multiple(p, a, -lbound, P)) # B - lbound P
+    i = 0
+    while i * m < width:
+        batch = []
+        for _ in range(DLOG_BSGS_BATCH):
+            batch.append(R)
+            R = jacobian_add(p, a, R, giant)
+        for Q, key in zip(batch, batch_to_affine(p, batch)):
+            j = baby.get(None if Q[2] % p == 0 else key)
+            if j is not None and i * m + j < width:
+                return lbound + i * m + j
+            i += 1
+            if i * m >= width:
+                break
+    return None
+
+def _walk_herd(p: int, a: int, jumps: list[Jump], herd: list[Walker], steps: int, dp_mask: int) -> tuple[list[Walker], list[tuple[int, Walker]]]:
+    """
+    Moves every walker of the herd steps times by the jump selected by its x,
+    and returns the new herd, with the distinguished points met on the way
+    (x & dp_mask = 0), as (index in the herd, walker). Walkers that fall on
+    the point at infinity are reported as distinguished too, and stay there.
+    """
+    k = len(jumps)
+    herd = list(herd)
+    distinguished: list[tuple[int, Walker]] = []
+    for _ in range(steps):
+        inverses = batch_inverse([jumps[x % k][0] - x for x, _y, _c, _d, _kind in herd], p)
+        for i, ((x, y, c, d, kind), inv) in enumerate(zip(herd, inverses)):
+            if x == 0 and y == 0:
+                continue
+            jx, jy, jc, jd = jumps[x % k]
+            if inv is None:
+                # The walker is at +-the jump: doubling, or infinity
+                x3, y3 = add(p, a, 0, (x, y), (jx, jy))
+            else:
+                lmbda = (jy - y) * inv % p
+                x3 = (lmbda * lmbda - x - jx) % p
+                y3 = (lmbda * (x - x3) - y) % p
+            herd[i] = (x3, y3, c + jc, d + jd, kind)
+            if x3 & dp_mask == 0:
+                distinguished.append((i, herd[i]))
+    return herd, distinguished
+
+def _walk_herd_worker(args: tuple[int, int, list[Jump], list[Walker], int, int]) -> tuple[list[Walker], list[tuple[int, Walker]]]:
+    return _walk_herd(*args)
+
+def _walk_herds(p: int, a: int, jumps: list[Jump], herds: list[list[Walker]], dp_mask: int, parallel: bool) -> list[tuple[list[Walker], list[tuple[int, Walker]]]]:
+    tasks = [(p, a, jumps, herd, DLOG_ROUND_STEPS, dp_mask) for herd in herds]
+    if not parallel:
+        return [_walk_herd_worker(task) for task in tasks]
+    # Imported here, since random_prime_fast depends on fact(), which depends on the elliptic curves
+    from ..random_prime_fast import get_prime_worker_pool
+    return get_prime_worker_pool().map(_walk_herd_worker, tasks)
+
+def _distinguished_bits(expected_steps: int, walkers: int) -> int:
+    # About 16 distinguished points per walker over the whole run
+    return max(0, (expected_steps // (16 * walkers)).bit_length() - 1)
+
+def _max_rounds(expected_steps: int, walkers: int, dp_mask: int) -> int:
+    # Rounds of DLOG_ROUND_STEPS for DLOG_WALK_BUDGET times the expected steps of
+    # each walker, plus its distance to the next distinguished point
+    steps = DLOG_WALK_BUDGET * (expected_steps // walkers + dp_mask + 1)
+    return max(1, -(-steps // DLOG_ROUND_STEPS))
+
+def _herd_count(parallel: bool) -> int:
+    if not parallel:
+        return 1
+    # Imported here, since random_prime_fast depends on fact(), which depends on the elliptic curves
+    from ..random_prime_fast import get_prime_worker_pool
+    return get_prime_worker_pool().processes
+
+def kangaroo_discrete_log(p: int, a: int, B: tuple[int, int], P: tuple[int, int], lbound: int, ubound: int, deadline: float|None = None, parallel: bool = False) -> int|None:
+    """
+    Returns s in [lbound, ubound] such that sP = B, with Pollard's kangaroos
+    (lambda method) in van Oorschot and Wiener's parallel version: herds of
+    tame kangaroos, starting from known multiples of P in the middle of the
+    range, and of wild ones, starting from B plus small multiples of P, jump
+    by powers of 2 chosen by their x. When a wild kangaroo lands on the trail
+    of a tame one, they meet at the next distinguished point, which reveals
+    s. About 2 sqrt(width) additions, and little memory. With parallel=True,
+    the herds walk in the processes of the prime worker pool.
+
+    Returns None at the deadline (a time.monotonic() value), or when the
+    kangaroos used up DLOG_WALK_BUDGET times their expected number of jumps,
+    after baby-step giant-step ruled out any s if the range is small enough.
+    When the order of P is below the width, s is not necessarily the
+    smallest solution.
+    """
+    if ubound < lbound:
+        return None
+    width = ubound - lbound + 1
+    if width <= 4 * DLOG_HERD_SIZE:
+        return bsgs_discrete_log(p, a, B, P, lbound, ubound)
+    herds = _herd_count(parallel)
+    walkers = herds * DLOG_HERD_SIZE
+    # Mean jump about walkers sqrt(width) / 4, with jumps 2^i, i < k
+    mean = max(1, walkers * isqrt(width) // 4)
+    k = 1
+    while (2**k - 1) // k < mean:
+        k += 1
+    jumps: list[Jump] = []
+    for (x, y), i in zip(batch_to_affine(p, [double_and_add_jacobian(p, a, 2**i, P) for i in range(k)]), range(k)):
+        jumps.append((x, y, 2**i, 0))
+    dp_mask = (1 << _distinguished_bits(2 * isqrt(width), walkers)) - 1
+    max_rounds = _max_rounds(2 * isqrt(width), walkers, dp_mask)
+    BJ = to_jacobian(p, B)
+    middle = lbound + width // 2
+
+    def start(kind: int) -> Walker:
+        while True:
+            r = random.randrange(isqrt(width) + 1)
+            if kind == 0:
+                c = middle + r
+                Q = _multiple(p, a, c, P)
+            else:
+                c = r
+                Q = jacobian_add(p, a, BJ, double_and_add_jacobian(p, a, r, P))
+            if Q[2] % p != 0:
+                x, y = to_affine(p, Q)
+                return x, y, c, 0, kind
+
+    # x -> (c, kind) of the first kangaroo seen there
+    seen: dict[int, tuple[int, int]] = {}
+    herd_list = [[start(i % 2) for i in range(DLOG_HERD_SIZE)] for _ in range(herds)]
+    for _ in range(max_rounds):
+        if _out_of_time(deadline):
+            return None
+        results = _walk_herds(p, a, jumps, herd_list, dp_mask, parallel)
+        herd_list = []
+        for herd, distinguished in results:
+            for i, (x, y, c, _d, kind) in distinguished:
+                if x == 0 and y == 0:
+                    herd[i] = start(kind)
+                    continue
+                other = seen.setdefault(x, (c, kind))
+                if other == (c, kind):
+                    continue
+                if other[1] != kind:
+                    # Tame at cP, wild at B + c'P
+                    s = other[0] - c if kind == 1 else c - other[0]
+                    if lbound <= s <= ubound and _is_log(p, a, B, P, s):
+                        return s
+                # Two kangaroos of the same kind share their trail from now on
+                herd[i] = start(kind)
+            herd_list.append(herd)
+    if width <= DLOG_BSGS_MAX_TABLE**2:
+        return bsgs_discrete_log(p, a, B, P, lbound, ubound)
+    return None
+
+def _is_log(p: int, a: int, B: tuple[int, int], P: tuple[int, int], s: int) -> bool:
+    return _affine_key(p, _multiple(p, a, s, P)) == (None if is_affine_infinity(p, B) else (B[0] % p, B[1] % p))
+
+def rho_discrete_log(p: int, a: int, B: tuple[int, int], P: tuple[int, int], n: int, deadline: float|None = None, parallel: bool = False) -> int|None:
+    """
+    Returns s in [0, n) such that sP = B, where n is the prime order of P,
+    with Pollard's rho: walks c P + d B by an r-adding walk (DLOG_RHO_JUMPS
+    random jumps chosen by x) until two of them meet at a distinguished
+    point, then s = (c - c') / (d' - d) mod n. About sqrt(pi n / 2) additions
+    over all the walks, and little memory. With parallel=True, the herds of
+    walks run in the processes of the prime worker pool.
+
+    Returns None at the deadline (a time.monotonic() value), or when the
+    walks used up DLOG_WALK_BUDGET times their expected number of steps,
+    after baby-step giant-step ruled out any s if n is small enough: B is
+    then likely not a multiple of P.
+    """
+    if is_affine_infinity(p, B):
+        return 0
+    if n <= 4 * DLOG_HERD_SIZE:
+        return bsgs_discrete_log(p, a, B, P, 0, n - 1)
+
+    def point(c: int, d: int) -> JacobianPoint:
+        return jacobian_add(p, a, double_and_add_jacobian(p, a, c, P), double_and_add_jacobian(p, a, d, B))
+
+    jumps: list[Jump] = []
+    while len(jumps) < DLOG_RHO_JUMPS:
+        c, d = random.randrange(1, n), random.randrange(1, n)
+        Q = point(c, d)
+        if Q[2] % p != 0:
+            x, y = to_affine(p, Q)
+            jumps.append((x, y, c, d))
+
+    def start() -> Walker:
+        while True:
+            c, d = random.randrange(n), random.randrange(1, n)
+            Q = point(c, d)
+            if Q[2] % p != 0:
+                x, y = to_affine(p, Q)
+                return x, y, c, d, 0
+
+    herds = _herd_count(parallel)
+    walkers = herds * DLOG_HERD_SIZE
+    dp_mask = (1 << _distinguished_bits(isqrt(n), walkers)) - 1
+    # A walk caught in a cycle without distinguished point would loop forever: restart
+    # the walks that have not met one for much longer than expected
+    max_quiet_rounds = max(4, 64 * (dp_mask + 1) // DLOG_ROUND_STEPS)
+    max_rounds = _max_rounds(isqrt(2 * n), walkers, dp_mask)
+    seen: dict[tuple[int, int], tuple[int, int]] = {}
+    herd_list = [[start() for _ in range(DLOG_HERD_SIZE)] for _ in range(herds)]
+    quiet = [[0] * DLOG_HERD_SIZE for _ in range(herds)]
+    for _ in range(max_rounds):
+        if _out_of_time(deadline):
+            return None
+        results = _walk_herds(p, a, jumps, herd_list, dp_mask, parallel)
+        herd_list = []
+        for h, (herd, distinguished) in enumerate(results):
+            met = set()
+            for i, (x, y, c, d, _kind) in distinguished:
+                met.add(i)
+                if x == 0 and y == 0:
+                    # c P + d B = 0
+                    herd[i] = start()
+                    if d % n != 0:
+                        s = -c * pow(d, -1, n) % n
+                        if _is_log(p, a, B, P, s):
+                            return s
+                    continue
+                c, d = c % n, d % n
+                other = seen.setdefault((x, y), (c, d))
+                if other == (c, d):
+                    continue
+                if (d - other[1]) % n != 0:
+                    # c P + d B = c' P + d' B
+                    s = (other[0] - c) * pow(d - other[1], -1, n) % n
+                    if _is_log(p, a, B, P, s):
+                        return s
+                herd[i] = start()
+            for i in range(DLOG_HERD_SIZE):
+                quiet[h][i] = 0 if i in met else quiet[h][i] + 1
+                if quiet[h][i] > max_quiet_rounds:
+                    herd[i] = start()
+                    quiet[h][i] = 0
+            herd_list.append(herd)
+    if n <= DLOG_BSGS_MAX_TABLE**2:
+        return bsgs_discrete_log(p, a, B, P, 0, n - 1)
+    return None
+
+class TestDiscreteLog(unittest.TestCase):
+    # y^2 = x^3 + 2x + 4 over Z/pZ with p = 1000003: 1001228 points = 2^2 * 250307
+    p, a, b = 1000003, 2, 4
+
+    def _point_of_order(self, n: int) -> tuple[int, int]:
+        p, a, b = self.p, self.a, self.b
+        for x in range(1, p):
+            y2 = (x**3 + a * x + b) % p
+            y = pow(y2, (p + 1) // 4, p) # p = 3 mod 4
+            if y * y % p != y2:
+                continue
+            P = to_affine(p, double_and_add_jacobian(p, a, 1001228 // n, (x, y)))
+            if not is_affine_infinity(p, P):
+                return P
+        raise RuntimeError("no point")
+
+    def test_bsgs(self):
+        p, a = self.p, self.a
+        P = self._point_of_order(250307)
+        for s in [0, 1, 2, 1000, 123456, 250306]:
+            B = to_affine(p, double_and_add_jacobian(p, a, s, P))
+            self.assertEqual(bsgs_discrete_log(p, a, B, P, 0, 250306), s)
+            self.assertEqual(bsgs_discrete_log(p, a, B, P, 0, 250306, max_table=37), s)
+            self.assertEqual(bsgs_discrete_log(p, a, B, P, s - 10, s + 10), s)
+            self.assertIsNone(bsgs_discrete_log(p, a, B, P, s + 1, s + 1000) if s < 249000 else None)
+        # The smallest solution when the order of P is below the width
+        B = to_affine(p, double_and_add_jacobian(p, a, 7, P))
+        self.assertEqual(bsgs_discrete_log(p, a, B, P, 250307, 3 * 250307), 250307 + 7)
+
+    def test_kangaroo(self):
+        p, a = self.p, self.a
+        P = self._point_of_order(250307)
+        for s in [5, 98765, 200000]:
+            B = to_affine(p, double_and_add_jacobian(p, a, s, P))
+            self.assertEqual(kangaroo_discrete_log(p, a, B, P, 0, 250306), s)
+            self.assertEqual(kangaroo_discrete_log(p, a, B, P, s - 3000, s + 5000), s)
+        # Without a deadline, the kangaroos stop when there is no solution
+        B = to_affine(p, double_and_add_jacobian(p, a, 200000, P))
+        self.assertIsNone(kangaroo_discrete_log(p, a, B, P, 0, 150000))
+
+    def test_rho(self):
+        p, a = self.p, self.a
+        P = self._point_of_order(250307)
+        for s in [0, 1, 31337, 250306]:
+            B = to_affine(p, double_and_add_jacobian(p, a, s, P))
+            self.assertEqual(rho_discrete_log(p, a, B, P, 250307), s)
+        # A point of order 2 is not a multiple of P
+        x = next(x for x in range(p) if (x**3 + a * x + self.b) % p == 0)
+        self.assertIsNone(rho_discrete_log(p, a, (x, 0), P, 250307))
+
+    def test_parallel(self):
+        p, a = self.p, self.a
+        P = self._point_of_order(250307)
+        B = to_affine(p, double_and_add_jacobian(p, a, 171717, P))
+        self.assertEqual(rho_discrete_log(p, a, B, P, 250307, parallel=True), 171717)
+        self.assertEqual(kangaroo_discrete_log(p, a, B, P, 100000, 250306, parallel=True), 171717)
+
+    def test_deadline(self):
+        p = 2**61 - 1
+        P = (2, 8) # on y^2 = x^3 + 2x + 52
+        B = to_affine(p, double_and_add_jacobian(p, 2, 2**50 + 12345, P))
+        self.assertIsNone(kangaroo_discrete_log(p, 2, B, P, 0, 2**60, deadline=time.monotonic() + 0.2))
+
+if __name__ == "__main__":
+    CHECK_TESTING()
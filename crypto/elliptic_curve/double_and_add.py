@@ -1,20 +1,40 @@
 from .add import add
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, is_affine_infinity, jacobian_add_affine, jacobian_double, to_affine
 
 from ..CHECK_TESTING import CHECK_TESTING
 import unittest
 
 def double_and_add(p: int, a: int, b: int, s: int, P: tuple[int, int]):
     """
-    let bits = bit_representation(s) # the vector of bits (from LSB to MSB) representing s
+    let bits = bit_representation(s) # the vector of bits (from MSB to LSB) representing s
     let res = (0, 0) # point at infinity
-    let temp = P # track doubled P val
-    for bit in bits: 
-        if bit == 1:            
-            res = res + temp # point add
-            temp = temp + temp # double
+    for bit in bits:
+        res = res + res # double
+        if bit == 1:
+            res = res + P # point add
     return res
+
+    The running point res is kept in Jacobian coordinates and P stays affine
+    (mixed addition), so the whole loop costs a single modular inversion
+    when converting res back to affine coordinates.
     """
 
+    return to_affine(p, double_and_add_jacobian(p, a, s, P))
+
+def double_and_add_jacobian(p: int, a: int, s: int, P: tuple[int, int]) -> JacobianPoint:
+    """Same as double_and_add(), but returns sP in Jacobian coordinates."""
+    if s <= 0 or is_affine_infinity(p, P):
+        return JACOBIAN_INFINITY
+
+    res = JACOBIAN_INFINITY
+    for i in range(s.bit_length() - 1, -1, -1):
+        res = jacobian_double(p, a, res) # double
+        if (s >> i) & 1:
+            res = jacobian_add_affine(p, a, res, P) # point add
+    return res
+
+def double_and_add_affine(p: int, a: int, b: int, s: int, P: tuple[int, int]):
+    """The plain affine double-and-add, with one modular inversion per point operation. Kept for reference and testing."""
     x = s
     res = (0, 0)
     temp = P
@@ -29,6 +49,10 @@ class TestDoubleAndAdd(unittest.TestCase):
     def test(self):
         A = double_and_add(827, 29, 13, 80, (338, 71))
         self.assertEqual(A, (338, 756))
+    
+    def test_against_affine(self):
+        for s in range(0, 200):
+            self.assertEqual(double_and_add(827, 29, 13, s, (338, 71)), double_and_add_affine(827, 29, 13, s, (338, 71)), f"s = {s}")
 
 if __name__ == '__main__':
     CHECK_TESTING()
@@ -0,0 +1,182 @@
+import time
+import random
+from math import gcd, isqrt
+from ..extended_euclidean import inverse
+from ..prime.sieve import primes_up_to, segmented_sieve
+from .montgomery import MONTGOMERY_INFINITY, MontgomeryPoint, montgomery_add, montgomery_double, montgomery_ladder
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# (digits of the factors aimed at, B1, number of curves), after the usual GMP-ECM table.
+# Each level finds most factors of up to that many digits.
+ECM_SCHEDULE: list[tuple[int, int, int]] = [
+    (15, 2000, 25),
+    (20, 11000, 90),
+    (25, 50000, 300),
+    (30, 250000, 700),
+    (35, 1000000, 1800),
+    (40, 3000000, 5100),
+]
+
+# Stage 2 bound, relative to B1
+ECM_B2_FACTOR = 100
+
+# Giant step of stage 2 = 2 * 3 * 5 * 7 * 11: only the odd j <= D/2 prime to D need baby steps
+ECM_STAGE2_D = 2310
+
+def _out_of_time(deadline: float|None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+def _found(g: int, n: int) -> int|None:
+    return g if 1 < g < n else None
+
+def ecm_one_curve(n: int, B1: int, B2: int, sigma: int, deadline: float|None = None) -> int|None:
+    """
+    Runs one curve of Lenstra's elliptic curve method on n: returns a
+    non-trivial factor of n, or None. The curve is the Montgomery curve of
+    Suyama's parametrization for sigma, whose order is divisible by 12.
+
+    It finds a prime factor q when the order of the curve modulo q is
+    B1-smooth, except for at most one prime factor in (B1, B2].
+    """
+    u = (sigma * sigma - 5) % n
+    v = 4 * sigma % n
+    denominator = 16 * u**3 * v % n
+    inv = inverse(denominator, n)
+    if inv is None:
+        return _found(gcd(denominator, n), n)
+    a24 = pow(v - u, 3, n) * (3 * u + v) * inv % n
+    Q: MontgomeryPoint = (u**3 % n, v**3 % n)
+
+    # Stage 1: Q = [M]Q where M is the product of all the prime powers <= B1
+    for i, p in enumerate(primes_up_to(B1)):
+        pk = p
+        while pk * p <= B1:
+            pk *= p
+        Q = montgomery_ladder(n, a24, pk, Q)
+        if i % 256 == 255 and _out_of_time(deadline):
+            return None
+    g = gcd(Q[1], n)
+    if g != 1:
+        return _found(g, n)
+    if B2 <= B1:
+        return None
+
+    # Stage 2, baby-step giant-step: every prime q of (B1, B2] is m D +- j with
+    # j <= D/2, and [q]Q = 0 iff [m D]Q = +-[j]Q, i.e. x([m D]Q) = x([j]Q),
+    # so the product of the X_G Z_j - X_j Z_G over all q reveals it in one gcd.
+    D = ECM_STAGE2_D
+    Q2 = montgomery_double(n, a24, Q)
+    baby: dict[int, MontgomeryPoint] = {1: Q, 3: montgomery_add(n, Q2, Q, Q)}
+    for j in range(5, D // 2 + 1, 2):
+        baby[j] = montgomery_add(n, baby[j - 2], Q2, baby[j - 4])
+
+    # The first window m D +- D/2 holds B1 + 1, so m may be 0 or 1, where there
+    # is no difference yet for montgomery_add(): [D]Q and [2D]Q come from the ladder
+    G = montgomery_ladder(n, a24, D, Q)
+    m = (B1 + D // 2) // D
+    G_previous = montgomery_ladder(n, a24, (m - 1) * D, Q) if m >= 2 else MONTGOMERY_INFINITY
+    G_current = montgomery_ladder(n, a24, m * D, Q) if m >= 1 else MONTGOMERY_INFINITY
+    product = 1
+    for count, q in enumerate(segmented_sieve(max(B1 + 1, 3), B2 + 1)):
+        while q > m * D + D // 2:
+            m += 1
+            if m <= 2:
+                G_previous, G_current = G_current, montgomery_ladder(n, a24, m * D, Q)
+            else:
+                G_previous, G_current = G_current, montgomery_add(n, G_current, G, G_previous)
+        Xj, Zj = baby[abs(q - m * D)]
+        product = product * (G_current[0] * Zj - Xj * G_current[1]) % n
+        if count % 4096 == 4095:
+            if _out_of_time(deadline):
+                return None
+    return _found(gcd(product, n), n)
+
+def _ecm_worker(args: tuple[int, int, int, int, float|None]) -> int|None:
+    n, B1, B2, sigma, deadline = args
+    return ecm_one_curve(n, B1, B2, sigma, deadline)
+
+def ecm(n: int, B1: int, curves: int, B2: int|None = None, deadline: float|None = None, parallel: bool = False) -> int|None:
+    """
+    Runs up to curves random curves of ECM on the composite n, and returns
+    the first non-trivial factor found, or None. With parallel=True, the
+    curves are spread over the processes of the prime worker pool.
+    """
+    if B2 is None:
+        B2 = ECM_B2_FACTOR * B1
+    if n % 2 == 0:
+        return 2 if n > 2 else None
+
+    if not parallel:
+        for _ in range(curves):
+            if _out_of_time(deadline):
+                return None
+            d = ecm_one_curve(n, B1, B2, random.randrange(6, n - 1), deadline)
+            if d is not None:
+                return d
+        return None
+
+    # Imported here, since random_prime_fast depends on fact(), which depends on this module
+    from ..random_prime_fast import get_prime_worker_pool
+    pool = get_prime_worker_pool()
+    remaining = curves
+    while remaining > 0 and not _out_of_time(deadline):
+        batch = min(remaining, pool.processes)
+        remaining -= batch
+        for d in pool.map(_ecm_worker, [(n, B1, B2, random.randrange(6, n - 1), deadline) for _ in range(batch)]):
+            if d is not None:
+                return d
+    return None
+
+def ecm_factor(n: int, deadline: float|None = None, parallel: bool = False) -> int|None:
+    """
+    Returns a non-trivial factor of the composite n, going through
+    ECM_SCHEDULE from the smallest factors up. Levels aimed at factors
+    larger than sqrt(n) are skipped, and the last level is repeated until
+    a factor is found, or the deadline (a time.monotonic() value) is reached.
+    """
+    sqrt_digits = len(str(isqrt(n)))
+    levels = [level for level in ECM_SCHEDULE if level[0] - 5 < sqrt_digits] or ECM_SCHEDULE[:1]
+    i = 0
+    while not _out_of_time(deadline):
+        _digits, B1, curves = levels[min(i, len(levels) - 1)]
+        d = ecm(n, B1, curves, deadline=deadline, parallel=parallel)
+        if d is not None:
+            return d
+        i += 1
+    return None
+
+class TestEcm(unittest.TestCase):
+    def test_one_curve(self):
+        # q is far beyond Pollard rho's reach in this test (2^44 steps), and so is p
+        # for the quick walk of fact(), while several of these curves have a smooth
+        # enough order modulo p
+        p, q = 1000000000039, 2**89 + 29
+        n = p * q
+        found = [sigma for sigma in range(6, 31) if ecm_one_curve(n, 2000, 200000, sigma) == p]
+        self.assertGreater(len(found), 1)
+        # Most of them need stage 2
+        found_by_stage_1 = [sigma for sigma in found if ecm_one_curve(n, 2000, 2000, sigma) == p]
+        self.assertLess(len(found_by_stage_1), len(found))
+
+    def test_stage2_right_above_B1(self):
+        # B2 < 1.5 D: stage 2 is all in the first windows, m = 0 for B1 = 500 and m = 1 for B1 = 2000
+        p, q = 10000019, 2**89 + 29
+        n = p * q
+        for B1 in [500, 2000]:
+            found_by_stage_1 = {sigma for sigma in range(6, 60) if ecm_one_curve(n, B1, B1, sigma) == p}
+            found = {sigma for sigma in range(6, 60) if ecm_one_curve(n, B1, 3400, sigma) == p}
+            self.assertLess(found_by_stage_1, found, f"B1 = {B1}")
+
+    def test_ecm_factor(self):
+        for p, q in [(1000003, 999983), (1000000000039, 1000000000061), (1000000000039, 2**89 + 29)]:
+            self.assertIn(ecm_factor(p * q), (p, q))
+        self.assertIsNone(ecm_factor((2**89 + 29) * (2**107 + 39), deadline=time.monotonic() + 0.2))
+
+    def test_parallel(self):
+        p, q = 1000000000039, 2**89 + 29
+        self.assertEqual(ecm(p * q, 2000, 200, parallel=True), p)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -0,0 +1,257 @@
+import os
+import json
+import tempfile
+
+from ..extended_euclidean import batch_inverse
+from .add import add
+from .double_and_add import double_and_add
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, batch_to_affine, jacobian_add_affine, jacobian_double, to_affine, to_jacobian
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+FIXED_BASE_WINDOW_BITS = 4
+
+# Set this environment variable to a directory to cache the precomputed tables
+# of the named curves on disk. Unset or empty, there is no disk cache.
+FIXED_BASE_CACHE_DIR_ENV = "CRYPTOENGINE_CACHE_DIR"
+
+class FixedBaseTable:
+    """
+    Windowed fixed-base table of multiples of a point P:
+
+        rows[i][j - 1] = j * 2^(w*i) * P    for 1 <= j < 2^w
+
+    all in affine coordinates. A scalar s < 2^(w * len(rows)) is then
+    multiplied by splitting it into w-bit digits and adding up one table
+    entry per non-zero digit - no doubling at all.
+    """
+
+    def __init__(self, p: int, a: int, b: int, P: tuple[int, int], window_bits: int, rows: list[list[tuple[int, int]]]) -> None:
+        self.p = p
+        self.a = a
+        self.b = b
+        self.P = P
+        self.window_bits = window_bits
+        self.rows = rows
+
+    @property
+    def max_scalar_bits(self) -> int:
+        return self.window_bits * len(self.rows)
+
+    def can_scale(self, s: int) -> bool:
+        return 0 <= s and s.bit_length() <= self.max_scalar_bits
+
+    def scale(self, s: int) -> tuple[int, int]:
+        """Returns sP. s must satisfy can_scale(s)."""
+        return to_affine(self.p, self.scale_jacobian(s))
+
+    def scale_jacobian(self, s: int) -> JacobianPoint:
+        """Returns sP in Jacobian coordinates. s must satisfy can_scale(s)."""
+        if not self.can_scale(s):
+            raise ValueError(f"Scalar s = {s} is out of the range of this table ({self.max_scalar_bits} bits)")
+        p, a = self.p, self.a
+        w = self.window_bits
+        mask = (1 << w) - 1
+
+        res = JACOBIAN_INFINITY
+        i = 0
+        while s > 0:
+            digit = s & mask
+            if digit != 0:
+                res = jacobian_add_affine(p, a, res, self.rows[i][digit - 1])
+            s >>= w
+            i += 1
+        return res
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "p": hex(self.p),
+            "a": hex(self.a),
+            "b": hex(self.b),
+            "P": [hex(self.P[0]), hex(self.P[1])],
+            "window_bits": self.window_bits,
+            "rows": [[[hex(x), hex(y)] for x, y in row] for row in self.rows],
+        })
+
+    @staticmethod
+    def from_json(s: str) -> "FixedBaseTable":
+        d = json.loads(s)
+        return FixedBaseTable(
+            p=int(d["p"], 16),
+            a=int(d["a"], 16),
+            b=int(d["b"], 16),
+            P=(int(d["P"][0], 16), int(d["P"][1], 16)),
+            window_bits=int(d["window_bits"]),
+            rows=[[(int(x, 16), int(y, 16)) for x, y in row] for row in d["rows"]],
+        )
+
+def _row_bases(p: int, a: int, P: tuple[int, int], num_rows: int, window_bits: int) -> list[tuple[int, int]]:
+    # The 2^(w*i) * P for i < num_rows, normalized together with a single inversion
+    bases: list[JacobianPoint] = [to_jacobian(p, P)]
+    for _ in range(1, num_rows):
+        base = bases[-1]
+        for _j in range(window_bits):
+            base = jacobian_double(p, a, base)
+        bases.append(base) # 2^w * previous base
+    return batch_to_affine(p, bases)
+
+def build_fixed_base_table(p: int, a: int, b: int, P: tuple[int, int], max_scalar_bits: int, window_bits: int = FIXED_BASE_WINDOW_BITS) -> FixedBaseTable:
+    num_rows = (max_scalar_bits + window_bits - 1) // window_bits
+    row_size = (1 << window_bits) - 1
+
+    # Each row only needs its (affine) base, so normalize the bases of all rows
+    # together, then the entries of all rows together: two inversions in total.
+    affine_bases = _row_bases(p, a, P, num_rows, window_bits)
+
+    entries: list[JacobianPoint] = []
+    for base in affine_bases:
+        entry = to_jacobian(p, base)
+        entries.append(entry)
+        for _j in range(2, row_size + 1):
+            entry = jacobian_add_affine(p, a, entry, base)
+            entries.append(entry)
+    affine_entries = batch_to_affine(p, entries)
+
+    rows = [affine_entries[i * row_size:(i + 1) * row_size] for i in range(num_rows)]
+    return FixedBaseTable(p, a, b, P, window_bits, rows)
+
+def fixed_base_cache_dir() -> str|None:
+    return os.environ.get(FIXED_BASE_CACHE_DIR_ENV) or None
+
+def _fixed_base_cache_path(name: str, window_bits: int) -> str|None:
+    cache_dir = fixed_base_cache_dir()
+    if cache_dir is None:
+        return None
+    return os.path.join(cache_dir, f"fixed_base_{name}_w{window_bits}.json")
+
+def _load_cached_fixed_base_table(path: str, p: int, a: int, b: int, P: tuple[int, int], max_scalar_bits: int, window_bits: int) -> FixedBaseTable|None:
+    try:
+        with open(path, "r") as f:
+            table = FixedBaseTable.from_json(f.read())
+    except (OSError, ValueError, KeyError, TypeError, IndexError):
+        return None
+    if (table.p, table.a, table.b, table.P, table.window_bits) != (p, a, b, P, window_bits):
+        return None
+    if table.max_scalar_bits < max_scalar_bits:
+        return None
+    if not _is_consistent_fixed_base_table(table):
+        return None
+    return table
+
+def _is_consistent_fixed_base_table(table: FixedBaseTable) -> bool:
+    """
+    Checks every entry of a table read from disk, which may be corrupted or
+    tampered with: row i starts with 2^(w*i) * P, and goes on by steps of
+    its first entry. The affine additions of the steps share one inversion.
+    """
+    p, a, b = table.p, table.a, table.b
+    row_size = (1 << table.window_bits) - 1
+    if any(len(row) != row_size for row in table.rows):
+        return False
+    bases = _row_bases(p, a, table.P, len(table.rows), table.window_bits)
+    if any(row[0] != base for row, base in zip(table.rows, bases)):
+        return False
+
+    # rows[i][j] = rows[i][j - 1] + rows[i][0]
+    steps = [(row[j - 1], row[0], row[j]) for row in table.rows for j in range(1, row_size)]
+    inverses = batch_inverse([Q[0] - base[0] for Q, base, _expected in steps], p)
+    for (Q, base, expected), inv in zip(steps, inverses):
+        if inv is None or Q == (0, 0) or base == (0, 0):
+            # Doubling, or the point at infinity
+            R = add(p, a, b, Q, base)
+        else:
+            lmbda = (Q[1] - base[1]) * inv % p
+            x = (lmbda * lmbda - Q[0] - base[0]) % p
+            R = x, (lmbda * (Q[0] - x) - Q[1]) % p
+        if R != expected:
+            return False
+    return True
+
+def _store_cached_fixed_base_table(path: str, table: FixedBaseTable) -> None:
+    # Cache is best-effort: failing to write it must never break the caller.
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(table.to_json())
+            os.replace(tmp_path, path) # atomic, so concurrent workers never read a half-written file
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+def get_fixed_base_table(p: int, a: int, b: int, P: tuple[int, int], max_scalar_bits: int, name: str|None = None, window_bits: int = FIXED_BASE_WINDOW_BITS) -> FixedBaseTable:
+    """
+    Builds the fixed-base table of P. If the curve has a name (i.e. it is one
+    of the named curves), the table is cached on disk so that other processes
+    can load it instead of building it again.
+    """
+    P = (P[0], P[1])
+    path = _fixed_base_cache_path(name, window_bits) if name is not None else None
+    if path is not None:
+        table = _load_cached_fixed_base_table(path, p, a, b, P, max_scalar_bits, window_bits)
+        if table is not None:
+            return table
+
+    table = build_fixed_base_table(p, a, b, P, max_scalar_bits, window_bits)
+
+    if path is not None:
+        _store_cached_fixed_base_table(path, table)
+    return table
+
+class TestFixedBaseTable(unittest.TestCase):
+    p = 827
+    a = 29
+    b = 13
+    G = (338, 71)
+
+    def test_against_double_and_add(self):
+        for window_bits in [1, 3, 4, 5]:
+            table = build_fixed_base_table(self.p, self.a, self.b, self.G, self.p.bit_length() + 1, window_bits)
+            for s in range(0, 300):
+                self.assertEqual(table.scale(s), double_and_add(self.p, self.a, self.b, s, self.G), f"s = {s}, window_bits = {window_bits}")
+
+    def test_out_of_range(self):
+        table = build_fixed_base_table(self.p, self.a, self.b, self.G, 10)
+        self.assertTrue(table.can_scale(2**12 - 1))
+        self.assertFalse(table.can_scale(2**12))
+        self.assertFalse(table.can_scale(-1))
+        self.assertRaises(ValueError, table.scale, 2**12)
+
+    def test_disk_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            old = os.environ.get(FIXED_BASE_CACHE_DIR_ENV)
+            os.environ[FIXED_BASE_CACHE_DIR_ENV] = cache_dir
+            try:
+                table = get_fixed_base_table(self.p, self.a, self.b, self.G, 11, name="test827")
+                path = _fixed_base_cache_path("test827", FIXED_BASE_WINDOW_BITS)
+                assert path is not None
+                self.assertTrue(os.path.exists(path))
+                cached = _load_cached_fixed_base_table(path, self.p, self.a, self.b, self.G, 11, FIXED_BASE_WINDOW_BITS)
+                assert cached is not None
+                self.assertEqual(cached.rows, table.rows)
+                # Mismatching parameters must not be served from the cache
+                self.assertIsNone(_load_cached_fixed_base_table(path, self.p, self.a, self.b, (338, 756), 11, FIXED_BASE_WINDOW_BITS))
+                # Nor tables with a wrong entry, even on the curve, or in the wrong rows: they are built again
+                for rows in [
+                    [[(x, (y + 1) % self.p) for x, y in row] for row in table.rows],
+                    [table.rows[0][:5] + [table.rows[0][6]] + table.rows[0][6:]] + table.rows[1:],
+                    table.rows[:2] + [table.rows[2][:-1] + [(table.rows[2][-1][0], -table.rows[2][-1][1] % self.p)]],
+                    [table.rows[1], table.rows[0]] + table.rows[2:],
+                    [row[:-1] for row in table.rows],
+                ]:
+                    with open(path, "w") as f:
+                        f.write(FixedBaseTable(self.p, self.a, self.b, self.G, FIXED_BASE_WINDOW_BITS, rows).to_json())
+                    self.assertIsNone(_load_cached_fixed_base_table(path, self.p, self.a, self.b, self.G, 11, FIXED_BASE_WINDOW_BITS))
+                    self.assertEqual(get_fixed_base_table(self.p, self.a, self.b, self.G, 11, name="test827").rows, table.rows)
+            finally:
+                if old is None:
+                    del os.environ[FIXED_BASE_CACHE_DIR_ENV]
+                else:
+                    os.environ[FIXED_BASE_CACHE_DIR_ENV] = old
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -1,11 +1,42 @@
 from ..prime import is_prime
-from ..random_prime_fast import random_prime_fast
+from ..prime.random_prime import random_prime
+from ..random_prime_fast import get_prime_worker_pool, worker_task_cancelled
 from ..modpower import modpower
 from .EllipticCurve import EllipticCurve
-from .count_points_on_curve import special_curves
+from .count_points_on_curve import count_points_on_curve_with_prime_modulo_sieved, special_curves
+from .cm import CM_MIN_BITS, generate_curve_with_prime_order_by_cm
 
+import time
 from random import randrange
+from typing import Callable, Literal
 import unittest
+from ..CHECK_TESTING import CHECK_TESTING
+
+# Candidate curves whose number of points has a prime factor up to this bound
+# are rejected by Schoof's algorithm as soon as it computes t mod l for them,
+# before the expensive part of the count: about 6 curves in 7.
+CURVE_GEN_SIEVE_BOUND = 7
+
+# A task of a worker gives up after this long without a prime order curve, to
+# report its statistics. It also stops, between two curves, once cancelled.
+CURVE_GEN_TASK_SECONDS = 2.0
+
+# Number of curves tried on each random prime p before picking another one
+CURVE_GEN_TRIES_PER_PRIME = 100
+
+# The prime order curve found: p, a, b, a point, and the number of points
+FoundCurve = tuple[int, int, int, tuple[int, int], int]
+
+# Progress statistics, added up over the tasks: see _generate_curves()
+CurveGenerationStats = dict[str, float]
+
+# How generate_elliptic_curve_with_number_of_points_being_prime() finds a curve:
+# "random": random curves, counting their points (Schoof's algorithm), below 190 bits
+# "cm": complex multiplication, for any size from CM_MIN_BITS on, in seconds
+# "special": the standard curve of the table with at least pbits bits
+# "auto": "special" from 190 bits on, "random" below
+CurveGenerationStrategy = Literal["auto", "random", "cm", "special"]
+DEFAULT_CURVE_GENERATION_STRATEGY: CurveGenerationStrategy = "auto"
 
 def get_special_curve(pbits: int) -> EllipticCurve:
     # https://neuromancer.sk/std/secg/secp256k1
@@ -34,34 +65,125 @@ class TestGenerateSecp256k1(unittest.TestCase):
         get_special_curve(383)
         get_special_curve(520)
 
-def generate_elliptic_curve_with_number_of_points_being_prime(pbits: int) -> EllipticCurve:
-    assert pbits >= 3
-
-    if pbits >= 190:
-        return get_special_curve(pbits)
-
+def _generate_curves(pbits: int, sieve_bound: int, seconds: float, epoch: int|None = None) -> tuple[FoundCurve|None, CurveGenerationStats]:
+    """
+    Tries random curves over random primes p in [2^pbits, 2^(pbits + 2)] for
+    about seconds, until one of them has a prime number of points. Returns
+    it, or None, with the statistics of the task: the primes and curves
+    tried, and why the curves were rejected (singular, number of points with
+    a factor up to sieve_bound, or composite all the same).
+    """
+    stats: CurveGenerationStats = { "tasks": 1, "primes": 0, "curves": 0, "singular": 0, "sieved_out": 0, "not_prime": 0 }
+    deadline = time.monotonic() + seconds
     T = 2 ** pbits
-
     while True:
-        p = random_prime_fast(lbound=T, ubound=T*4, takes=1)[0]
-
-        p_is_prime = True
-
-        # print(f"Trying p = {p}")
-        for _ in range(100):
+        p = random_prime(lbound=T, ubound=T*4)
+        stats["primes"] += 1
+        for _ in range(CURVE_GEN_TRIES_PER_PRIME):
+            if worker_task_cancelled(epoch) or (stats["curves"] > 0 and time.monotonic() >= deadline):
+                return None, stats
             a = randrange(1, p - 1)
             x = randrange(1, p - 1)
 
             y = x
             while y == x or (y - x) % p == 0:
                 y = randrange(1, p - 1)
-            
-            b = (modpower(y, 2, p) - modpower(x, 3, p) - a*x % p) % p
-            # print(f"Trying a = {a}, b = {b}")
 
-            try:
-                ec = EllipticCurve(p, p_is_prime, a, b, (x, y))
-            except AssertionError:
+            b = (modpower(y, 2, p) - modpower(x, 3, p) - a*x % p) % p
+            stats["curves"] += 1
+            if (4 * modpower(a, 3, p) + 27 * modpower(b, 2, p)) % p == 0:
+                stats["singular"] += 1
                 continue
-            if is_prime(ec.num_points_on_curve):
-                return ec
+            N = count_points_on_curve_with_prime_modulo_sieved(p, a, b, sieve_bound)
+            if N is None:
+                stats["sieved_out"] += 1
+            elif is_prime(N, "deterministic"):
+                return (p, a, b, (x, y), N), stats
+            else:
+                stats["not_prime"] += 1
+
+def generate_random_curve_with_prime_order(pbits: int, parallel: bool = False, progress: Callable[[CurveGenerationStats], None]|None = None, sieve_bound: int = CURVE_GEN_SIEVE_BOUND) -> EllipticCurve:
+    """
+    Returns a random curve over a random prime p in [2^pbits, 2^(pbits + 2)]
+    with a prime number of points. With parallel=True, the candidates are
+    tried by the processes of the prime worker pool, which are cancelled as
+    soon as one of them finds a curve. progress is called with the statistics
+    so far (see _generate_curves(), plus the elapsed seconds) after each task
+    of CURVE_GEN_TASK_SECONDS, from a thread of the pool when parallel.
+    """
+    stats: CurveGenerationStats = { "tasks": 0, "primes": 0, "curves": 0, "singular": 0, "sieved_out": 0, "not_prime": 0, "seconds": 0.0 }
+    start = time.monotonic()
+
+    def on_output(output: tuple[FoundCurve|None, CurveGenerationStats]) -> None:
+        for key, value in output[1].items():
+            stats[key] += value
+        stats["seconds"] = time.monotonic() - start
+        if progress is not None:
+            progress(dict(stats))
+
+    if parallel:
+        outputs = get_prime_worker_pool().take(_generate_curves, (pbits, sieve_bound, CURVE_GEN_TASK_SECONDS), 1, lambda output: output[0] is not None, on_output=on_output, cancellable=True)
+        found = outputs[0][0]
+    else:
+        found = None
+        while found is None:
+            output = _generate_curves(pbits, sieve_bound, CURVE_GEN_TASK_SECONDS)
+            on_output(output)
+            found = output[0]
+    assert found is not None
+    p, a, b, G, N = found
+    return EllipticCurve(p, True, a, b, G, num_points_on_curve=N)
+
+def generate_elliptic_curve_with_number_of_points_being_prime(pbits: int, parallel: bool = False, progress: Callable[[CurveGenerationStats], None]|None = None, strategy: CurveGenerationStrategy = DEFAULT_CURVE_GENERATION_STRATEGY) -> EllipticCurve:
+    assert pbits >= 3
+
+    if strategy == "auto":
+        strategy = "special" if pbits >= 190 else "random"
+    if strategy == "special":
+        return get_special_curve(pbits)
+    if strategy == "cm":
+        return generate_curve_with_prime_order_by_cm(pbits)
+    if strategy == "random":
+        return generate_random_curve_with_prime_order(pbits, parallel=parallel, progress=progress)
+    raise ValueError(f"Unknown curve generation strategy {strategy}")
+
+class TestGenerateRandomCurve(unittest.TestCase):
+    def check(self, ec: EllipticCurve, pbits: int) -> None:
+        self.assertTrue(2 ** pbits <= ec.p <= 2 ** (pbits + 2))
+        self.assertTrue(is_prime(ec.num_points_on_curve, "deterministic"))
+        self.assertTrue(ec.is_point_on_curve(ec.starting_point))
+        self.assertEqual(ec.scale_point(ec.num_points_on_curve, ec.starting_point), (0, 0))
+
+    def test_serial(self):
+        for pbits in [3, 8, 20, 40]:
+            reports: list[CurveGenerationStats] = []
+            ec = generate_random_curve_with_prime_order(pbits, progress=reports.append)
+            self.check(ec, pbits)
+            self.assertGreaterEqual(len(reports), 1)
+            last = reports[-1]
+            self.assertEqual(last["curves"], last["singular"] + last["sieved_out"] + last["not_prime"] + 1)
+
+    def test_parallel(self):
+        reports: list[CurveGenerationStats] = []
+        ec = generate_elliptic_curve_with_number_of_points_being_prime(32, parallel=True, progress=reports.append)
+        self.check(ec, 32)
+        self.assertGreaterEqual(len(reports), 1)
+        # The tasks still running when the curve was found report nothing more
+        count = len(reports)
+        pool = get_prime_worker_pool()
+        deadline = time.monotonic() + 10
+        while any(pool._in_flight.values()) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(reports), count)
+
+    def test_strategies(self):
+        for pbits in [CM_MIN_BITS, 80, 256, 384]:
+            ec = generate_elliptic_curve_with_number_of_points_being_prime(pbits, strategy="cm")
+            self.assertEqual(ec.p.bit_length(), pbits + 1)
+            self.check(ec, pbits)
+        self.assertEqual(generate_elliptic_curve_with_number_of_points_being_prime(256).p, get_special_curve(256).p)
+        self.assertEqual(generate_elliptic_curve_with_number_of_points_being_prime(100, strategy="special").p, special_curves[0].p)
+        self.assertRaises(ValueError, generate_elliptic_curve_with_number_of_points_being_prime, 100, strategy="unknown")
+
+if __name__ == "__main__":
+    CHECK_TESTING()
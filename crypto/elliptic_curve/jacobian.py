@@ -0,0 +1,158 @@
+from ..extended_euclidean import inverse, batch_inverse
+from .add import add
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# A point in Jacobian coordinates (X, Y, Z) represents the affine point
+# (X / Z^2, Y / Z^3). The point at infinity is any point with Z = 0.
+# Working in Jacobian coordinates lets us add and double points without
+# a modular inversion ; we only invert once when converting back to affine.
+JacobianPoint = tuple[int, int, int]
+
+JACOBIAN_INFINITY: JacobianPoint = (1, 1, 0)
+
+def is_affine_infinity(p: int, P: tuple[int, int]) -> bool:
+    """The project represents the point at infinity as (0, 0) in affine coordinates."""
+    return P[0] % p == 0 and P[1] % p == 0
+
+def to_jacobian(p: int, P: tuple[int, int]) -> JacobianPoint:
+    if is_affine_infinity(p, P):
+        return JACOBIAN_INFINITY
+    return (P[0] % p, P[1] % p, 1)
+
+def to_affine(p: int, P: JacobianPoint) -> tuple[int, int]:
+    X, Y, Z = P
+    if Z % p == 0:
+        return (0, 0)
+    z_inverse = inverse(Z % p, p)
+    if z_inverse is None:
+        raise RuntimeError(f"Please review this algorithm. FAIL TEST: Z must be invertible mod p (Z = {Z}, p = {p})")
+    z_inverse_2 = z_inverse * z_inverse % p
+    return (X * z_inverse_2 % p, Y * z_inverse_2 * z_inverse % p)
+
+def batch_to_affine(p: int, points: list[JacobianPoint]) -> list[tuple[int, int]]:
+    """Converts all the points to affine coordinates with a single modular inversion."""
+    z_inverses = batch_inverse([Z for _X, _Y, Z in points], p)
+    results: list[tuple[int, int]] = []
+    for (X, Y, Z), z_inverse in zip(points, z_inverses):
+        if Z % p == 0:
+            results.append((0, 0))
+            continue
+        if z_inverse is None:
+            raise RuntimeError(f"Please review this algorithm. FAIL TEST: Z must be invertible mod p (Z = {Z}, p = {p})")
+        z_inverse_2 = z_inverse * z_inverse % p
+        results.append((X * z_inverse_2 % p, Y * z_inverse_2 * z_inverse % p))
+    return results
+
+def jacobian_negate(p: int, P: JacobianPoint) -> JacobianPoint:
+    X, Y, Z = P
+    return (X, (p - Y) % p, Z)
+
+def jacobian_double(p: int, a: int, P: JacobianPoint) -> JacobianPoint:
+    """Returns 2P. Costs no inversion."""
+    X1, Y1, Z1 = P
+    if Z1 == 0 or Y1 == 0:
+        return JACOBIAN_INFINITY
+
+    YY = Y1 * Y1 % p
+    S = 4 * X1 * YY % p
+    ZZ = Z1 * Z1 % p
+    M = (3 * X1 * X1 + a * ZZ * ZZ) % p
+    X3 = (M * M - 2 * S) % p
+    Y3 = (M * (S - X3) - 8 * YY * YY) % p
+    Z3 = 2 * Y1 * Z1 % p
+    return (X3, Y3, Z3)
+
+def jacobian_add_affine(p: int, a: int, P: JacobianPoint, Q: tuple[int, int]) -> JacobianPoint:
+    """Returns P + Q where Q is given in affine coordinates (mixed addition). Costs no inversion."""
+    X1, Y1, Z1 = P
+    if is_affine_infinity(p, Q):
+        return P
+    x2, y2 = Q
+    if Z1 == 0:
+        return (x2 % p, y2 % p, 1)
+
+    Z1Z1 = Z1 * Z1 % p
+    U2 = x2 * Z1Z1 % p
+    S2 = y2 * Z1 * Z1Z1 % p
+    H = (U2 - X1) % p
+    r = (S2 - Y1) % p
+    if H == 0:
+        if r == 0:
+            return jacobian_double(p, a, P)
+        return JACOBIAN_INFINITY
+
+    HH = H * H % p
+    HHH = H * HH % p
+    V = X1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - Y1 * HHH) % p
+    Z3 = Z1 * H % p
+    return (X3, Y3, Z3)
+
+def jacobian_add(p: int, a: int, P: JacobianPoint, Q: JacobianPoint) -> JacobianPoint:
+    """Returns P + Q where both P and Q are in Jacobian coordinates. Costs no inversion."""
+    X1, Y1, Z1 = P
+    X2, Y2, Z2 = Q
+    if Z1 == 0:
+        return Q
+    if Z2 == 0:
+        return P
+
+    Z1Z1 = Z1 * Z1 % p
+    Z2Z2 = Z2 * Z2 % p
+    U1 = X1 * Z2Z2 % p
+    U2 = X2 * Z1Z1 % p
+    S1 = Y1 * Z2 * Z2Z2 % p
+    S2 = Y2 * Z1 * Z1Z1 % p
+    H = (U2 - U1) % p
+    r = (S2 - S1) % p
+    if H == 0:
+        if r == 0:
+            return jacobian_double(p, a, P)
+        return JACOBIAN_INFINITY
+
+    HH = H * H % p
+    HHH = H * HH % p
+    V = U1 * HH % p
+    X3 = (r * r - HHH - 2 * V) % p
+    Y3 = (r * (V - X3) - S1 * HHH) % p
+    Z3 = Z1 * Z2 * H % p
+    return (X3, Y3, Z3)
+
+class TestJacobian(unittest.TestCase):
+    p = 827
+    a = 29
+    b = 13
+    G = (338, 71)
+
+    def test_round_trip(self):
+        p = self.p
+        self.assertEqual(to_affine(p, to_jacobian(p, self.G)), self.G)
+        self.assertEqual(to_affine(p, to_jacobian(p, (0, 0))), (0, 0))
+        self.assertEqual(to_affine(p, (338 * 4 % p, 71 * 8 % p, 2)), self.G)
+
+    def test_batch_to_affine(self):
+        p, a = self.p, self.a
+        points = [JACOBIAN_INFINITY]
+        for _ in range(100):
+            points.append(jacobian_double(p, a, jacobian_add_affine(p, a, points[-1], self.G)))
+        self.assertEqual(batch_to_affine(p, points), [to_affine(p, P) for P in points])
+        self.assertEqual(batch_to_affine(p, []), [])
+
+    def test_against_affine(self):
+        p, a, b = self.p, self.a, self.b
+        affine = (0, 0)
+        jacobian = JACOBIAN_INFINITY
+        for _ in range(100):
+            self.assertEqual(to_affine(p, jacobian_double(p, a, jacobian)), add(p, a, b, affine, affine))
+            self.assertEqual(to_affine(p, jacobian_add(p, a, jacobian, jacobian)), add(p, a, b, affine, affine))
+            self.assertEqual(to_affine(p, jacobian_add(p, a, jacobian, to_jacobian(p, self.G))), add(p, a, b, affine, self.G))
+            self.assertEqual(to_affine(p, jacobian_add(p, a, jacobian, jacobian_negate(p, jacobian))), (0, 0))
+            affine = add(p, a, b, affine, self.G)
+            jacobian = jacobian_add_affine(p, a, jacobian, self.G)
+            self.assertEqual(to_affine(p, jacobian), affine)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
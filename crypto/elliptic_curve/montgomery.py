@@ -0,0 +1,89 @@
+from ..extended_euclidean import inverse
+from .double_and_add import double_and_add
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Projective x-coordinate (X : Z) of a point on a Montgomery curve
+#     B y^2 = x^3 + A x^2 + x
+# The point at infinity is (1 : 0). The y-coordinate is never needed, and
+# neither is B: P and -P share x, and so do all the quadratic twists.
+MontgomeryPoint = tuple[int, int]
+
+MONTGOMERY_INFINITY: MontgomeryPoint = (1, 0)
+
+def montgomery_a24(n: int, A: int) -> int|None:
+    """Returns (A + 2) / 4 mod n, the constant of the doubling formula, or None if 4 is not invertible."""
+    inv4 = inverse(4, n)
+    if inv4 is None:
+        return None
+    return (A + 2) * inv4 % n
+
+def montgomery_double(n: int, a24: int, P: MontgomeryPoint) -> MontgomeryPoint:
+    """Returns 2P, with 5 multiplications modulo n."""
+    X, Z = P
+    s = (X + Z) * (X + Z) % n
+    d = (X - Z) * (X - Z) % n
+    t = s - d # = 4XZ
+    return s * d % n, t * (d + a24 * t) % n
+
+def montgomery_add(n: int, P: MontgomeryPoint, Q: MontgomeryPoint, P_minus_Q: MontgomeryPoint) -> MontgomeryPoint:
+    """Returns P + Q, given P - Q (differential addition), with 6 multiplications modulo n."""
+    XP, ZP = P
+    XQ, ZQ = Q
+    u = (XP - ZP) * (XQ + ZQ) % n
+    v = (XP + ZP) * (XQ - ZQ) % n
+    return P_minus_Q[1] * (u + v) * (u + v) % n, P_minus_Q[0] * (u - v) * (u - v) % n
+
+def montgomery_ladder(n: int, a24: int, k: int, P: MontgomeryPoint) -> MontgomeryPoint:
+    """
+    Returns kP. The ladder keeps (R0, R1) = (mP, (m + 1)P), whose difference
+    is always P, so that each bit of k costs one differential addition and
+    one doubling.
+    """
+    if k <= 0:
+        return MONTGOMERY_INFINITY
+    R0 = P
+    R1 = montgomery_double(n, a24, P)
+    for i in range(k.bit_length() - 2, -1, -1):
+        if (k >> i) & 1:
+            R0 = montgomery_add(n, R1, R0, P)
+            R1 = montgomery_double(n, a24, R1)
+        else:
+            R1 = montgomery_add(n, R1, R0, P)
+            R0 = montgomery_double(n, a24, R0)
+    return R0
+
+def montgomery_x(n: int, P: MontgomeryPoint) -> int|None:
+    """Returns the affine x = X / Z, or None for the point at infinity (or when Z is not invertible modulo n)."""
+    inv = inverse(P[1], n)
+    if inv is None:
+        return None
+    return P[0] * inv % n
+
+class TestMontgomery(unittest.TestCase):
+    def test_against_weierstrass(self):
+        # y^2 = x^3 + A x^2 + x maps to t^3 + a t + b with t = x + A/3,
+        # a = (3 - A^2)/3 and b = (2A^3 - 9A)/27 (B = 1)
+        p = 1009
+        inv3 = inverse(3, p)
+        inv27 = inverse(27, p)
+        assert inv3 is not None and inv27 is not None
+        for A in [6, 117, 500]:
+            a24 = montgomery_a24(p, A)
+            assert a24 is not None
+            a = (3 - A * A) * inv3 % p
+            b = (2 * A**3 - 9 * A) * inv27 % p
+            x0 = next(x for x in range(1, p) if any((y * y - (x**3 + A * x * x + x)) % p == 0 for y in range(1, p)))
+            y0 = next(y for y in range(1, p) if (y * y - (x0**3 + A * x0 * x0 + x0)) % p == 0)
+            W = ((x0 + A * inv3) % p, y0)
+            for k in range(1, 200):
+                Wk = double_and_add(p, a, b, k, W)
+                xk = montgomery_x(p, montgomery_ladder(p, a24, k, (x0, 1)))
+                if Wk == (0, 0):
+                    self.assertIsNone(xk, f"A = {A}, k = {k}")
+                else:
+                    self.assertEqual(xk, (Wk[0] - A * inv3) % p, f"A = {A}, k = {k}")
+
+if __name__ == "__main__":
+    CHECK_TESTING()
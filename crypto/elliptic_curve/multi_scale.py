@@ -0,0 +1,212 @@
+from .add import add
+from .double_and_add import double_and_add
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, batch_to_affine, is_affine_infinity, jacobian_add, jacobian_add_affine, jacobian_double, to_affine, to_jacobian
+from .wnaf import WNAF_WIDTH, wnaf, wnaf_precompute_jacobian
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# From this many points on, the bucket method beats interleaved wNAF
+PIPPENGER_THRESHOLD = 32
+
+def joint_sparse_form(k0: int, k1: int) -> tuple[list[int], list[int]]:
+    """
+    Returns the joint sparse form of (k0, k1), two lists of digits in {-1, 0, 1}
+    from LSB to MSB. On average only half of the digit columns are non-zero,
+    versus three quarters for plain binary.
+    """
+    # Solinas' algorithm, see Guide to Elliptic Curve Cryptography, Algorithm 3.50
+    if k0 < 0 or k1 < 0:
+        raise ValueError(f"k0 and k1 must be non-negative (k0 = {k0}, k1 = {k1})")
+
+    digits0: list[int] = []
+    digits1: list[int] = []
+    d0 = d1 = 0
+    while k0 + d0 > 0 or k1 + d1 > 0:
+        l0 = d0 + k0
+        l1 = d1 + k1
+        if l0 % 2 == 0:
+            u0 = 0
+        else:
+            u0 = 1 if l0 % 4 == 1 else -1
+            if l0 % 8 in (3, 5) and l1 % 4 == 2:
+                u0 = -u0
+        if l1 % 2 == 0:
+            u1 = 0
+        else:
+            u1 = 1 if l1 % 4 == 1 else -1
+            if l1 % 8 in (3, 5) and l0 % 4 == 2:
+                u1 = -u1
+        digits0.append(u0)
+        digits1.append(u1)
+        if 2 * d0 == 1 + u0:
+            d0 = 1 - d0
+        if 2 * d1 == 1 + u1:
+            d1 = 1 - d1
+        k0 >>= 1
+        k1 >>= 1
+    return digits0, digits1
+
+def _negate(p: int, P: tuple[int, int]) -> tuple[int, int]:
+    return (P[0], (p - P[1]) % p)
+
+def straus_jsf(p: int, a: int, b: int, k0: int, P0: tuple[int, int], k1: int, P1: tuple[int, int]) -> JacobianPoint:
+    """Returns k0 P0 + k1 P1 in Jacobian coordinates, sharing one chain of doublings (Shamir's trick on the JSF)."""
+    digits0, digits1 = joint_sparse_form(k0, k1)
+    P0_plus_P1, P0_minus_P1 = batch_to_affine(p, [
+        jacobian_add_affine(p, a, to_jacobian(p, P0), P1),
+        jacobian_add_affine(p, a, to_jacobian(p, P0), _negate(p, P1)),
+    ])
+    table: dict[tuple[int, int], tuple[int, int]] = {
+        (1, 0): P0, (-1, 0): _negate(p, P0),
+        (0, 1): P1, (0, -1): _negate(p, P1),
+        (1, 1): P0_plus_P1, (-1, -1): _negate(p, P0_plus_P1),
+        (1, -1): P0_minus_P1, (-1, 1): _negate(p, P0_minus_P1),
+    }
+
+    res = JACOBIAN_INFINITY
+    for i in range(len(digits0) - 1, -1, -1):
+        res = jacobian_double(p, a, res)
+        column = (digits0[i], digits1[i])
+        if column != (0, 0):
+            res = jacobian_add_affine(p, a, res, table[column])
+    return res
+
+def straus_wnaf(p: int, a: int, b: int, scalars: list[int], points: list[tuple[int, int]], w: int = WNAF_WIDTH) -> JacobianPoint:
+    """Returns sum(k_i P_i) in Jacobian coordinates, interleaving the wNAF of every k_i over one chain of doublings."""
+    all_digits = [wnaf(k, w) for k in scalars]
+    # Normalize the odd multiples of all the points together
+    num_odd_multiples = 1 << (w - 2)
+    flat_odd_multiples = batch_to_affine(p, [M for P in points for M in wnaf_precompute_jacobian(p, a, P, w)])
+    all_odd_multiples = [flat_odd_multiples[i * num_odd_multiples:(i + 1) * num_odd_multiples] for i in range(len(points))]
+    all_negated_odd_multiples = [[_negate(p, M) for M in odd_multiples] for odd_multiples in all_odd_multiples]
+    length = max((len(digits) for digits in all_digits), default=0)
+
+    res = JACOBIAN_INFINITY
+    for i in range(length - 1, -1, -1):
+        res = jacobian_double(p, a, res)
+        for j, digits in enumerate(all_digits):
+            if i >= len(digits):
+                continue
+            d = digits[i]
+            if d > 0:
+                res = jacobian_add_affine(p, a, res, all_odd_multiples[j][d >> 1])
+            elif d < 0:
+                res = jacobian_add_affine(p, a, res, all_negated_odd_multiples[j][(-d) >> 1])
+    return res
+
+def _pippenger_window_bits(num_points: int) -> int:
+    c = 2
+    while (1 << (c + 1)) < num_points:
+        c += 1
+    return c
+
+def pippenger(p: int, a: int, b: int, scalars: list[int], points: list[tuple[int, int]]) -> JacobianPoint:
+    """Returns sum(k_i P_i) in Jacobian coordinates using Pippenger's bucket method."""
+    c = _pippenger_window_bits(len(points))
+    mask = (1 << c) - 1
+    max_bits = max((k.bit_length() for k in scalars), default=0)
+    num_windows = (max_bits + c - 1) // c
+
+    res = JACOBIAN_INFINITY
+    for window in range(num_windows - 1, -1, -1):
+        for _ in range(c):
+            res = jacobian_double(p, a, res)
+
+        shift = window * c
+        buckets: list[JacobianPoint] = [JACOBIAN_INFINITY] * (1 << c)
+        for k, P in zip(scalars, points):
+            digit = (k >> shift) & mask
+            if digit != 0:
+                buckets[digit] = jacobian_add_affine(p, a, buckets[digit], P)
+
+        # sum(d * bucket[d]) = sum of the running sums of the buckets, from the top down
+        running = JACOBIAN_INFINITY
+        window_sum = JACOBIAN_INFINITY
+        for digit in range(mask, 0, -1):
+            running = jacobian_add(p, a, running, buckets[digit])
+            window_sum = jacobian_add(p, a, window_sum, running)
+        res = jacobian_add(p, a, res, window_sum)
+    return res
+
+def multi_scale_jacobian(p: int, a: int, b: int, scalars: list[int], points: list[tuple[int, int]]) -> JacobianPoint:
+    """Returns sum(k_i P_i) in Jacobian coordinates. Scalars may be negative."""
+    if len(scalars) != len(points):
+        raise ValueError(f"scalars and points must have the same length ({len(scalars)} != {len(points)})")
+
+    # Fold negative scalars into the points, and drop terms that are trivially zero
+    ks: list[int] = []
+    Ps: list[tuple[int, int]] = []
+    for k, P in zip(scalars, points):
+        if k == 0 or is_affine_infinity(p, P):
+            continue
+        if k < 0:
+            k, P = -k, _negate(p, P)
+        ks.append(k)
+        Ps.append((P[0] % p, P[1] % p))
+
+    if len(ks) == 0:
+        return JACOBIAN_INFINITY
+    if len(ks) == 2:
+        return straus_jsf(p, a, b, ks[0], Ps[0], ks[1], Ps[1])
+    if len(ks) < PIPPENGER_THRESHOLD:
+        return straus_wnaf(p, a, b, ks, Ps)
+    return pippenger(p, a, b, ks, Ps)
+
+def multi_scale(p: int, a: int, b: int, scalars: list[int], points: list[tuple[int, int]]) -> tuple[int, int]:
+    """Returns sum(k_i P_i). Scalars may be negative."""
+    return to_affine(p, multi_scale_jacobian(p, a, b, scalars, points))
+
+class TestMultiScale(unittest.TestCase):
+    p = 827
+    a = 29
+    b = 13
+    G = (338, 71)
+
+    def naive(self, scalars: list[int], points: list[tuple[int, int]]) -> tuple[int, int]:
+        p, a, b = self.p, self.a, self.b
+        res = (0, 0)
+        for k, P in zip(scalars, points):
+            if k < 0:
+                k, P = -k, _negate(p, P)
+            res = add(p, a, b, res, double_and_add(p, a, b, k, P))
+        return res
+
+    def points(self, n: int) -> list[tuple[int, int]]:
+        return [double_and_add(self.p, self.a, self.b, 7 * i + 3, self.G) for i in range(n)]
+
+    def test_joint_sparse_form(self):
+        for k0 in range(0, 200):
+            for k1 in range(0, 200, 7):
+                digits0, digits1 = joint_sparse_form(k0, k1)
+                self.assertEqual(sum(d << i for i, d in enumerate(digits0)), k0)
+                self.assertEqual(sum(d << i for i, d in enumerate(digits1)), k1)
+                # Of any 3 consecutive columns, at least one is zero
+                columns = [(x, y) != (0, 0) for x, y in zip(digits0, digits1)]
+                for i in range(len(columns) - 2):
+                    self.assertFalse(all(columns[i:i + 3]), f"k0 = {k0}, k1 = {k1}")
+
+    def test_straus_jsf(self):
+        P0, P1 = self.points(2)
+        for k0 in range(0, 100, 3):
+            for k1 in range(0, 100, 5):
+                self.assertEqual(to_affine(self.p, straus_jsf(self.p, self.a, self.b, k0, P0, k1, P1)), self.naive([k0, k1], [P0, P1]))
+
+    def test_straus_wnaf_and_pippenger(self):
+        for n in [1, 3, 5, 10, 40]:
+            points = self.points(n)
+            for trial in range(10):
+                scalars = [(trial * 1009 + i * 7919) % 3000 for i in range(n)]
+                expected = self.naive(scalars, points)
+                self.assertEqual(to_affine(self.p, straus_wnaf(self.p, self.a, self.b, scalars, points)), expected)
+                self.assertEqual(to_affine(self.p, pippenger(self.p, self.a, self.b, scalars, points)), expected)
+
+    def test_multi_scale(self):
+        for n in [0, 1, 2, 3, PIPPENGER_THRESHOLD + 1]:
+            points = self.points(n)
+            scalars = [(-1) ** i * (i * 7919 % 3000) for i in range(n)]
+            self.assertEqual(multi_scale(self.p, self.a, self.b, scalars, points), self.naive(scalars, points))
+        self.assertRaises(ValueError, multi_scale, self.p, self.a, self.b, [1], [])
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -0,0 +1,407 @@
+import random
+from math import isqrt, prod
+from ..crt import crt
+from ..legendre import legendre
+from ..find_sq_roots import find_sq_roots
+from ..prime.sieve import next_prime
+from ..polynomial import Polynomial, PolynomialModulus, poly_add, poly_divmod, poly_eval, poly_gcd, poly_mul, poly_scale, poly_sub
+from .double_and_add import double_and_add_jacobian
+from .jacobian import batch_to_affine, jacobian_add, jacobian_double
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Schoof only computes the trace t modulo small primes l until their product
+# leaves at most this many candidates for t in the Hasse interval, and the
+# candidates are then told apart with a baby-step giant-step on a random
+# point: the largest l are by far the most expensive ones.
+SCHOOF_BSGS_MAX_CANDIDATES = 1 << 34
+
+# Random points tried before giving up on the baby-step giant-step, when the
+# orders of the points cannot tell the candidates apart (then Schoof adds another l)
+SCHOOF_BSGS_POINTS = 8
+
+# Giant steps converted to affine coordinates with a single inversion
+SCHOOF_BSGS_BATCH = 256
+
+# A point (X, Y, Z) of E over Z/pZ[x]/(h) stands for (X / Z^2, y Y / Z^3), in
+# Jacobian coordinates with the factor y written apart: then with y^2 = f(x),
+# X, Y and Z are all polynomials in x alone.
+TorsionPoint = tuple[Polynomial, Polynomial, Polynomial]
+
+class _ProperFactor(Exception):
+    """Raised when a computation modulo h ran into a proper factor of h, to carry on modulo that factor."""
+
+    def __init__(self, factor: Polynomial) -> None:
+        super().__init__()
+        self.factor = factor
+
+def division_polynomials(p: int, a: int, b: int, indices: list[int]) -> dict[int, Polynomial]:
+    """
+    Returns { n: F_n } for the division polynomials of y^2 = x^3 + a x + b
+    over Z/pZ, where psi_n = F_n for odd n and psi_n = y F_n for even n.
+    The roots of F_n, n odd, are the x-coordinates of the points of order
+    dividing n (but 0). Only the F_n that the recurrences need are computed.
+    """
+    f = [b % p, a % p, 0, 1]
+    f2 = poly_mul(f, f, p)
+    inv2 = pow(2, -1, p)
+    F: dict[int, Polynomial] = {
+        0: [],
+        1: [1],
+        2: [2 % p],
+        3: [(-a * a) % p, 12 * b % p, 6 * a % p, 0, 3 % p],
+        4: poly_scale([(-a**3 - 8 * b * b) % p, (-4 * a * b) % p, (-5 * a * a) % p, 20 * b % p, 5 * a % p, 0, 1], 4, p),
+    }
+
+    def compute(n: int) -> Polynomial:
+        if n in F:
+            return F[n]
+        m = n // 2
+        if n % 2 == 1:
+            u = poly_mul(compute(m + 2), poly_mul(compute(m), poly_mul(compute(m), compute(m), p), p), p)
+            v = poly_mul(compute(m - 1), poly_mul(compute(m + 1), poly_mul(compute(m + 1), compute(m + 1), p), p), p)
+            if m % 2 == 0:
+                u = poly_mul(f2, u, p)
+            else:
+                v = poly_mul(f2, v, p)
+            F[n] = poly_sub(u, v, p)
+        else:
+            u = poly_mul(compute(m + 2), poly_mul(compute(m - 1), compute(m - 1), p), p)
+            v = poly_mul(compute(m - 2), poly_mul(compute(m + 1), compute(m + 1), p), p)
+            F[n] = poly_scale(poly_mul(compute(m), poly_sub(u, v, p), p), inv2, p)
+        return F[n]
+
+    return { n: compute(n) for n in indices }
+
+class _TorsionArithmetic:
+    """The group law on E over Z/pZ[x]/(h), for the generic point (x, y) of the torsion that h cuts out."""
+
+    def __init__(self, M: PolynomialModulus, a: int, b: int) -> None:
+        self.M = M
+        self.p = M.p
+        self.a = a % M.p
+        self.f = M.reduce([b % M.p, self.a, 0, 1])
+
+    def double(self, P: TorsionPoint) -> TorsionPoint:
+        M, p, f = self.M, self.p, self.f
+        X, Y, Z = P
+        YY = M.mul(M.mul(Y, Y), f) # (y Y)^2
+        Z2 = M.mul(Z, Z)
+        m = poly_add(poly_scale(M.mul(X, X), 3, p), poly_scale(M.mul(Z2, Z2), self.a, p), p)
+        s = poly_scale(M.mul(X, YY), 4, p)
+        X3 = poly_sub(M.mul(m, m), poly_scale(s, 2, p), p)
+        Y3 = poly_sub(M.mul(m, poly_sub(s, X3, p)), poly_scale(M.mul(YY, YY), 8, p), p)
+        # The new Z = 2 y Y Z has a factor y: scaling by y moves it to X and Y
+        return M.mul(f, X3), M.mul(f, Y3), M.mul(poly_scale(M.mul(Y, Z), 2, p), f)
+
+    def add(self, P: TorsionPoint, Q: TorsionPoint) -> TorsionPoint:
+        """Returns P + Q, for P != +-Q at every root of h."""
+        M, p = self.M, self.p
+        X1, Y1, Z1 = P
+        X2, Y2, Z2 = Q
+        Z1Z1 = M.mul(Z1, Z1)
+        Z2Z2 = M.mul(Z2, Z2)
+        U1 = M.mul(X1, Z2Z2)
+        U2 = M.mul(X2, Z1Z1)
+        S1 = M.mul(Y1, M.mul(Z2, Z2Z2))
+        S2 = M.mul(Y2, M.mul(Z1, Z1Z1))
+        H = poly_sub(U2, U1, p)
+        R = poly_sub(S2, S1, p)
+        HH = M.mul(H, H)
+        HHH = M.mul(H, HH)
+        U1HH = M.mul(U1, HH)
+        X3 = poly_sub(poly_sub(M.mul(M.mul(R, R), self.f), HHH, p), poly_scale(U1HH, 2, p), p)
+        Y3 = poly_sub(M.mul(R, poly_sub(U1HH, X3, p)), M.mul(S1, HHH), p)
+        return X3, Y3, M.mul(H, M.mul(Z1, Z2))
+
+    def multiply(self, k: int, P: TorsionPoint) -> TorsionPoint:
+        """Returns kP for 0 < k < l when P has order l."""
+        R = P
+        for i in range(k.bit_length() - 2, -1, -1):
+            R = self.double(R)
+            if (k >> i) & 1:
+                R = self.add(R, P)
+        return R
+
+    def same_x(self, P: TorsionPoint, Q: TorsionPoint) -> bool:
+        M = self.M
+        return M.mul(P[0], M.mul(Q[2], Q[2])) == M.mul(Q[0], M.mul(P[2], P[2]))
+
+    def same_y(self, P: TorsionPoint, Q: TorsionPoint) -> bool:
+        M = self.M
+        return M.mul(P[1], M.mul(Q[2], M.mul(Q[2], Q[2]))) == M.mul(Q[1], M.mul(P[2], M.mul(P[2], P[2])))
+
+def _proper_factor(g: Polynomial, h: Polynomial, p: int) -> Polynomial|None:
+    """Returns the smaller of gcd(g, h) and h / gcd(g, h) when they are both non-constant."""
+    d = poly_gcd(g, h, p)
+    if len(d) <= 1 or len(d) == len(h):
+        return None
+    cofactor = poly_divmod(h, d, p)[0]
+    return d if len(d) <= len(cofactor) else cofactor
+
+def _trace_mod_l_over(M: PolynomialModulus, p: int, a: int, b: int, l: int) -> int:
+    """
+    Returns t mod l from the characteristic equation of the Frobenius
+    phi(x, y) = (x^p, y^p), phi^2 - t phi + p = 0, on the points of order l
+    whose x-coordinates are the roots of h (M's modulus).
+    """
+    E = _TorsionArithmetic(M, a, b)
+    h = M.h
+    k = p % l
+    xp = M.pow([0, 1], p)
+    yp = M.pow(E.f, (p - 1) // 2) # y^p = y f^((p - 1) / 2)
+    # phi is a ring homomorphism: x^(p^2) = x^p(x^p), and y^(p^2) = y^p(x^p) y^p
+    xp2 = M.compose(xp, xp)
+    yp2 = M.mul(M.compose(yp, xp), yp)
+    P: TorsionPoint = ([0, 1], [1], [1])
+    phiP: TorsionPoint = (xp, yp, [1])
+    phi2P: TorsionPoint = (xp2, yp2, [1])
+    kP = E.multiply(k, P)
+
+    if E.same_x(phi2P, kP):
+        if not E.same_y(phi2P, kP):
+            mixed = _proper_factor(poly_sub(kP[1], M.mul(yp2, M.mul(kP[2], M.mul(kP[2], kP[2]))), p), h, p)
+            if mixed is not None:
+                raise _ProperFactor(mixed)
+            return 0 # phi^2 P = -kP, so t phi P = 0
+        # phi^2 P = kP: t phi P = 2 kP = 2 phi^2 P, so phi has an eigenvalue w, with w^2 = k
+        if legendre(k, l) != 1:
+            return 0
+        w = next(w for w in range(1, l) if w * w % l == k)
+        wP = E.multiply(w, P)
+        Z2 = M.mul(wP[2], wP[2])
+        eigen = poly_gcd(poly_sub(wP[0], M.mul(xp, Z2), p), h, p)
+        if len(eigen) <= 1:
+            return 0
+        if len(eigen) < len(h):
+            raise _ProperFactor(eigen)
+        if E.same_y(phiP, wP):
+            return 2 * w % l
+        minus = _proper_factor(poly_sub(wP[1], M.mul(yp, M.mul(Z2, wP[2])), p), h, p)
+        if minus is not None:
+            raise _ProperFactor(minus)
+        return -2 * w % l
+
+    S = E.add(phi2P, kP)
+    Q = phiP
+    for tau in range(1, (l - 1) // 2 + 1):
+        if tau == 2:
+            Q = E.double(phiP)
+        elif tau > 2:
+            Q = E.add(Q, phiP)
+        if E.same_x(S, Q):
+            return tau if E.same_y(S, Q) else l - tau
+
+    # phi^2 P = +-kP at some of the roots only, which the addition above got wrong
+    Z2 = M.mul(kP[2], kP[2])
+    factor = _proper_factor(poly_sub(kP[0], M.mul(xp2, Z2), p), h, p)
+    if factor is None:
+        raise RuntimeError(f"Please review this algorithm. FAIL TEST: no trace found modulo l = {l} (p = {p}, a = {a}, b = {b})")
+    raise _ProperFactor(factor)
+
+def frobenius_trace_mod_l(p: int, a: int, b: int, l: int) -> int:
+    """Returns t mod l, where p + 1 - t is the number of points of y^2 = x^3 + a x + b over Z/pZ, for a prime l != p."""
+    if l == 2:
+        # t is even iff there is a point of order 2, i.e. iff x^3 + a x + b has a root
+        f = [b % p, a % p, 0, 1]
+        xp = PolynomialModulus(f, p).pow([0, 1], p)
+        return 0 if len(poly_gcd(poly_sub(xp, [0, 1], p), f, p)) > 1 else 1
+    h = division_polynomials(p, a, b, [l])[l]
+    while True:
+        try:
+            return _trace_mod_l_over(PolynomialModulus(h, p), p, a, b, l)
+        except _ProperFactor as e:
+            h = e.factor
+
+def random_point_on_curve(p: int, a: int, b: int) -> tuple[int, int]:
+    """Returns a random point of y^2 = x^3 + a x + b over Z/pZ, not of order 2 nor at infinity."""
+    while True:
+        x = random.randrange(p)
+        y2 = (x**3 + a * x + b) % p
+        if y2 != 0 and legendre(y2, p) == 1:
+            return x, find_sq_roots(y2, p, True)[0]
+
+def _killing_orders(p: int, a: int, P: tuple[int, int], N0: int, step: int, count: int) -> list[int]|None:
+    """
+    Returns every N = N0 + j step, 0 <= j < count, such that N P = 0, by
+    baby-step giant-step, or None when step P = 0 (then either all of them
+    or none of them kill P).
+    """
+    G = double_and_add_jacobian(p, a, step, P)
+    if G[2] % p == 0:
+        return None
+    # N0 P + j G = 0 with j = 2 m v +- u iff R_v = N0 P + 2 m v G = -+u G: the baby
+    # steps u G, 0 < u <= m, are looked up by x alone, then y tells the sign.
+    m = isqrt(count // 2) + 1
+    babies = [G]
+    for _ in range(m - 1):
+        babies.append(jacobian_add(p, a, babies[-1], G))
+    baby: dict[int, list[tuple[int, int]]] = {}
+    baby_at_infinity: list[int] = []
+    for u, (B, (x, y)) in enumerate(zip(babies, batch_to_affine(p, babies)), 1):
+        if B[2] % p == 0:
+            baby_at_infinity.append(u)
+        else:
+            baby.setdefault(x, []).append((u, y))
+    giant = jacobian_double(p, a, babies[-1])
+
+    found: set[int] = set()
+    R = double_and_add_jacobian(p, a, N0, P)
+    v = 0
+    while 2 * m * v - m < count:
+        # The giant steps are converted to affine coordinates a batch at a time
+        batch = [R]
+        for _ in range(SCHOOF_BSGS_BATCH - 1):
+            batch.append(jacobian_add(p, a, batch[-1], giant))
+        R = jacobian_add(p, a, batch[-1], giant)
+        for Rv, (x, y) in zip(batch, batch_to_affine(p, batch)):
+            if Rv[2] % p == 0:
+                js = [2 * m * v] + [2 * m * v + s * u for u in baby_at_infinity for s in (-1, 1)]
+            else:
+                # Both signs when y = 0
+                js = [2 * m * v - u for u, yu in baby.get(x, []) if y == yu]
+                js += [2 * m * v + u for u, yu in baby.get(x, []) if y == (p - yu) % p]
+            found.update(N0 + j * step for j in js if 0 <= j < count)
+            v += 1
+    return sorted(found)
+
+def count_points_on_curve_with_bsgs(p: int, a: int, b: int, t: int = 0, modulus: int = 1) -> int|None:
+    """
+    Returns the number of points N = p + 1 - t' of y^2 = x^3 + a x + b over
+    Z/pZ, knowing t' = t mod modulus, by baby-step giant-step over the
+    candidates of the Hasse interval: about sqrt(8 sqrt(p) / modulus) point
+    additions. Returns None if SCHOOF_BSGS_POINTS random points could not
+    tell the candidates apart.
+
+    Mestre's trick: the points are taken alternately on the curve and on
+    its quadratic twist, of order 2p + 2 - N, since when the group of one
+    of them has a small exponent, the other one has not (for p > 229).
+    """
+    bound = isqrt(4 * p) # Hasse: |t'| <= 2 sqrt(p)
+    t_min = -bound + (t + bound) % modulus
+    count = (bound - t_min) // modulus + 1
+    N0 = p + 1 - (t_min + (count - 1) * modulus)
+    if count == 1:
+        return N0
+    d = 2
+    while legendre(d, p) != -1:
+        d += 1
+    twist_a, twist_b = a * d * d % p, b * d**3 % p # y^2 = x^3 + a d^2 x + b d^3
+    candidates: list[int]|None = None
+    for i in range(SCHOOF_BSGS_POINTS):
+        if candidates is None:
+            candidates = _killing_orders(p, a, random_point_on_curve(p, a, b), N0, modulus, count)
+        elif i % 2 == 1:
+            P = random_point_on_curve(p, twist_a, twist_b)
+            candidates = [N for N in candidates if double_and_add_jacobian(p, twist_a, 2 * p + 2 - N, P)[2] % p == 0]
+        else:
+            P = random_point_on_curve(p, a, b)
+            candidates = [N for N in candidates if double_and_add_jacobian(p, a, N, P)[2] % p == 0]
+        if candidates is not None and len(candidates) <= 1:
+            if not candidates:
+                raise RuntimeError(f"Please review this algorithm. FAIL TEST: no order found for t = {t} mod {modulus} (p = {p}, a = {a}, b = {b})")
+            return candidates[0]
+    return None
+
+def count_points_on_curve_with_schoof(p: int, a: int, b: int) -> int:
+    """
+    Returns the number of points of y^2 = x^3 + a x + b over Z/pZ (with the
+    point at infinity), for a prime p > 3, with Schoof's algorithm: the trace
+    t = p + 1 - N of the Frobenius is computed modulo small primes l from its
+    action on the l-torsion, then recombined with the CRT. The last bits of t
+    are left to count_points_on_curve_with_bsgs() rather than to the largest
+    l, so that up to about 64 bits, only t mod 2 is computed here.
+
+    Takes time polynomial in log p, but Elkies' and Atkin's improvements are
+    not implemented, so the division polynomials have degree (l^2 - 1) / 2:
+    in pure Python, about a second for a 64-bit p, 20 seconds for 128 bits and
+    5 minutes for 192 bits.
+    """
+    N = count_points_on_curve_with_schoof_sieved(p, a, b, 0)
+    assert N is not None
+    return N
+
+def count_points_on_curve_with_schoof_sieved(p: int, a: int, b: int, sieve_bound: int) -> int|None:
+    """
+    Same as count_points_on_curve_with_schoof(), but returns None as soon as
+    the number of points N = p + 1 - t turns out to be divisible by a prime
+    l <= sieve_bound, i.e. t = p + 1 mod l. Every t mod l up to sieve_bound
+    is computed first, so that most curves whose N cannot be prime are
+    rejected before the expensive part of the count.
+    """
+    if p <= 3:
+        raise ValueError(f"p must be a prime > 3, not {p}")
+    bound = isqrt(4 * p) + 1
+    L: list[int] = []
+    T: list[int] = []
+    l = 2
+    while True:
+        L.append(l)
+        T.append(frobenius_trace_mod_l(p, a, b, l))
+        if T[-1] == (p + 1) % l and l <= sieve_bound:
+            return None
+        modulus = prod(L)
+        if l >= sieve_bound and 2 * bound // modulus <= SCHOOF_BSGS_MAX_CANDIDATES:
+            N = count_points_on_curve_with_bsgs(p, a, b, crt(T, L), modulus)
+            if N is not None:
+                return N
+        l = next_prime(l)
+        if l == p:
+            l = next_prime(l)
+
+class TestSchoof(unittest.TestCase):
+    def _naive_count(self, p: int, a: int, b: int) -> int:
+        return 1 + sum(1 + legendre((x**3 + a * x + b) % p, p) for x in range(p))
+
+    def test_division_polynomials(self):
+        p, a, b = 1009, 7, 11
+        F = division_polynomials(p, a, b, [3, 5, 7, 8])
+        for x in range(p):
+            y2 = (x**3 + a * x + b) % p
+            if y2 == 0 or legendre(y2, p) != 1:
+                continue
+            P = (x, find_sq_roots(y2, p, True)[0])
+            for n in [3, 5, 7]:
+                self.assertEqual(poly_eval(F[n], x, p) == 0, double_and_add_jacobian(p, a, n, P)[2] % p == 0, f"n = {n}, P = {P}")
+            self.assertEqual(poly_eval(F[8], x, p) == 0, double_and_add_jacobian(p, a, 8, P)[2] % p == 0, f"n = 8, P = {P}")
+
+    def test_trace_mod_l(self):
+        # Among them, b = 0 and a = 0 have complex multiplication, where phi^2 = +-k
+        # on the l-torsion is common, and the 2-torsion is rational when b = 0
+        for p, a, b in [(1009, 7, 11), (1009, 0, 5), (1009, 3, 0), (10007, 1, 1), (10007, 0, 1), (10009, 1, 0)]:
+            t = p + 1 - self._naive_count(p, a, b)
+            for l in [2, 3, 5, 7, 11, 13]:
+                self.assertEqual(frobenius_trace_mod_l(p, a, b, l), t % l, f"p = {p}, a = {a}, b = {b}, l = {l}")
+
+    def test_bsgs(self):
+        for p, a, b in [(10007, 1, 1), (10007, 10006, 0), (100003, 0, 3)]:
+            self.assertEqual(count_points_on_curve_with_bsgs(p, a, b), self._naive_count(p, a, b), f"p = {p}, a = {a}, b = {b}")
+        # Every point of y^2 = x^3 + 1 over Z/307Z is also killed by 288, 306 and 342,
+        # so that only the points of the twist tell 324 apart
+        for _ in range(10):
+            self.assertEqual(count_points_on_curve_with_bsgs(307, 0, 1), 324)
+        N = self._naive_count(10007, 1, 1)
+        self.assertEqual(count_points_on_curve_with_bsgs(10007, 1, 1, (10008 - N) % 7, 7), N)
+
+    def test_sieved(self):
+        for p in [4099, 65537]:
+            for a, b in [(1, 1), (2, 3), (5, 7), (11, 13), (0, 5), (7, 0)]:
+                N = self._naive_count(p, a, b)
+                sieved = count_points_on_curve_with_schoof_sieved(p, a, b, 7)
+                if any(N % l == 0 for l in [2, 3, 5, 7]):
+                    self.assertIsNone(sieved, f"p = {p}, a = {a}, b = {b}")
+                else:
+                    self.assertEqual(sieved, N, f"p = {p}, a = {a}, b = {b}")
+
+    def test_count(self):
+        for p, a, b in [(10007, 1, 1), (10009, 1, 0), (100003, 0, 3)]:
+            self.assertEqual(count_points_on_curve_with_schoof(p, a, b), self._naive_count(p, a, b))
+        p, a, b = 2**64 - 59, 3, 7
+        N = count_points_on_curve_with_schoof(p, a, b)
+        self.assertLessEqual((p + 1 - N) ** 2, 4 * p)
+        for _ in range(5):
+            self.assertEqual(double_and_add_jacobian(p, a, N, random_point_on_curve(p, a, b))[2] % p, 0)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
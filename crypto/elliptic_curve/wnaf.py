@@ -0,0 +1,92 @@
+from .double_and_add import double_and_add
+from .jacobian import JacobianPoint, JACOBIAN_INFINITY, batch_to_affine, is_affine_infinity, jacobian_add, jacobian_add_affine, jacobian_double, to_affine, to_jacobian
+
+from ..CHECK_TESTING import CHECK_TESTING
+import unittest
+
+WNAF_WIDTH = 4
+
+def wnaf(s: int, w: int = WNAF_WIDTH) -> list[int]:
+    """
+    Returns the width-w non-adjacent form of s >= 0, from LSB to MSB.
+    Every non-zero digit is odd, lies in (-2^(w-1), 2^(w-1)), and is
+    followed by at least w - 1 zeros, so on average only one digit in
+    w + 1 is non-zero (versus one in 2 for plain binary).
+    """
+    if w < 2:
+        raise ValueError(f"w must be at least 2 (w = {w})")
+    if s < 0:
+        raise ValueError(f"s must be non-negative (s = {s})")
+
+    half = 1 << (w - 1)
+    full = 1 << w
+    digits: list[int] = []
+    while s > 0:
+        if s & 1:
+            d = s & (full - 1)
+            if d >= half:
+                d -= full
+            s -= d
+        else:
+            d = 0
+        digits.append(d)
+        s >>= 1
+    return digits
+
+def wnaf_precompute_jacobian(p: int, a: int, P: tuple[int, int], w: int = WNAF_WIDTH) -> list[JacobianPoint]:
+    """Returns the odd multiples [P, 3P, 5P, ..., (2^(w-1) - 1)P] in Jacobian coordinates."""
+    P1 = to_jacobian(p, P)
+    P2 = jacobian_double(p, a, P1)
+    odd_multiples = [P1]
+    for _ in range(1, 1 << (w - 2)):
+        odd_multiples.append(jacobian_add(p, a, odd_multiples[-1], P2))
+    return odd_multiples
+
+def wnaf_precompute(p: int, a: int, b: int, P: tuple[int, int], w: int = WNAF_WIDTH) -> list[tuple[int, int]]:
+    """Returns the odd multiples [P, 3P, 5P, ..., (2^(w-1) - 1)P] in affine coordinates."""
+    return batch_to_affine(p, wnaf_precompute_jacobian(p, a, P, w))
+
+def wnaf_scale(p: int, a: int, b: int, s: int, P: tuple[int, int], w: int = WNAF_WIDTH) -> tuple[int, int]:
+    """
+    Returns sP using the width-w NAF of s. Negative digits are handled for
+    free thanks to -(x, y) = (x, p - y).
+    """
+    return to_affine(p, wnaf_scale_jacobian(p, a, b, s, P, w))
+
+def wnaf_scale_jacobian(p: int, a: int, b: int, s: int, P: tuple[int, int], w: int = WNAF_WIDTH) -> JacobianPoint:
+    """Same as wnaf_scale(), but returns sP in Jacobian coordinates."""
+    if s <= 0 or is_affine_infinity(p, P):
+        return JACOBIAN_INFINITY
+
+    digits = wnaf(s, w)
+    odd_multiples = wnaf_precompute(p, a, b, P, w)
+    negated_odd_multiples = [(x, (p - y) % p) for x, y in odd_multiples]
+
+    res = JACOBIAN_INFINITY
+    for d in reversed(digits):
+        res = jacobian_double(p, a, res)
+        if d > 0:
+            res = jacobian_add_affine(p, a, res, odd_multiples[d >> 1])
+        elif d < 0:
+            res = jacobian_add_affine(p, a, res, negated_odd_multiples[(-d) >> 1])
+    return res
+
+class TestWnaf(unittest.TestCase):
+    def test_digits(self):
+        for w in range(2, 7):
+            for s in range(0, 2000):
+                digits = wnaf(s, w)
+                self.assertEqual(sum(d << i for i, d in enumerate(digits)), s)
+                for i, d in enumerate(digits):
+                    if d != 0:
+                        self.assertEqual(d % 2, 1)
+                        self.assertLess(abs(d), 1 << (w - 1))
+                        self.assertTrue(all(e == 0 for e in digits[i + 1:i + w]), f"s = {s}, w = {w}, digits = {digits}")
+
+    def test_against_double_and_add(self):
+        for w in range(2, 7):
+            for s in range(0, 300):
+                self.assertEqual(wnaf_scale(827, 29, 13, s, (338, 71), w), double_and_add(827, 29, 13, s, (338, 71)), f"s = {s}, w = {w}")
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -56,6 +56,39 @@ def gcd(a: int, b: int) -> int:
 def inverse(a: int, b: int) -> int|None:
     return extended_euclidean(a, b)[1]
 
+def batch_inverse(values: list[int], modulus: int) -> list[int|None]:
+    """
+    Returns [inverse(v, modulus) for v in values], using Montgomery's trick:
+    a single modular inversion plus 3(n - 1) multiplications.
+    Entries that are not invertible mod modulus get None.
+    """
+    results: list[int|None] = [None] * len(values)
+    if modulus == 1:
+        return [0] * len(values)
+
+    # Zeros are never invertible, so leave them out of the product right away
+    indices = [i for i, v in enumerate(values) if v % modulus != 0]
+    reduced = [values[i] % modulus for i in indices]
+
+    prefix_products: list[int] = []
+    acc = 1
+    for v in reduced:
+        prefix_products.append(acc)
+        acc = acc * v % modulus
+    
+    acc_inverse = inverse(acc, modulus)
+    if acc_inverse is None:
+        # Some entries share a factor with the modulus. Find them, then invert the others.
+        invertible = [k for k, v in enumerate(reduced) if gcd(v, modulus) == 1]
+        for k, v_inverse in zip(invertible, batch_inverse([reduced[k] for k in invertible], modulus)):
+            results[indices[k]] = v_inverse
+        return results
+
+    for k in range(len(reduced) - 1, -1, -1):
+        results[indices[k]] = acc_inverse * prefix_products[k] % modulus
+        acc_inverse = acc_inverse * reduced[k] % modulus
+    return results
+
 import unittest
 
 class TestExtendedEuclidean(unittest.TestCase):
@@ -96,6 +129,14 @@ class TestExtendedEuclidean(unittest.TestCase):
         self.assertEqual( inverse(28, 28), None )
         self.assertEqual( inverse(16, 320), None )
         self.assertEqual( inverse(30, 28), None )
+    
+    def test_batch_inverse(self):
+        self.assertEqual( batch_inverse([], 16), [] )
+        for modulus in [1, 2, 16, 28, 29, 30, 320]:
+            values = list(range(0, 2 * modulus + 3))
+            self.assertEqual( batch_inverse(values, modulus), [inverse(v, modulus) for v in values], f"modulus = {modulus}" )
+        self.assertEqual( batch_inverse([13, 101, 320, 1], 16), [5, 13, None, 1] )
+        self.assertEqual( batch_inverse([13, -3], 16), [5, 5] )
 
 if __name__ == '__main__':
     CHECK_TESTING()
@@ -1,51 +1,149 @@
-import sys, unittest
-from .int_sqrt import int_sqrt
+import sys, time, unittest
+from typing import Callable
 from .prime.is_prime import is_prime
+from .prime.sieve import next_prime, primes_up_to
+from .pollard import pollard_p_minus_1, pollard_rho_brent
+from .fact_cache import get_factorization_cache
 from .CHECK_TESTING import CHECK_TESTING
 
 MAX_INT_OF_FLOAT = 2**40 - 1
 
+# Prime factors below this bound are found by trial division, before any other method
+FACT_TRIAL_DIVISION_BOUND = 2**12
+
+# Length of the first, cheap Pollard rho walk tried on every composite
+FACT_RHO_QUICK_ITERATIONS = 2**14
+
+# A factoring method gets a composite n (not a perfect power, without prime
+# factors below FACT_TRIAL_DIVISION_BOUND) and a deadline (a time.monotonic()
+# value, or None), and returns a non-trivial factor of n, or None if it gives up.
+FactorMethod = Callable[[int, float|None], int|None]
+
+_factor_methods: list[FactorMethod] = []
+
+_trial_division_primes: list[int]|None = None
+
+def _get_trial_division_primes() -> list[int]:
+    global _trial_division_primes
+    if _trial_division_primes is None:
+        _trial_division_primes = primes_up_to(FACT_TRIAL_DIVISION_BOUND)
+    return _trial_division_primes
+
+def register_factor_method(method: FactorMethod) -> None:
+    """
+    Makes fact() try method on the composites that the quick rho walk and
+    Pollard p - 1 could not split, before falling back to ECM.
+    Methods are tried in the order they were registered.
+    """
+    if method not in _factor_methods:
+        _factor_methods.append(method)
+
+def unregister_factor_method(method: FactorMethod) -> None:
+    if method in _factor_methods:
+        _factor_methods.remove(method)
+
+class FactorizationTimeout(RuntimeError):
+    """Raised by fact() when its timeout runs out. Keeps what was found so far."""
+    def __init__(self, factors: dict[int, int], unfactored: dict[int, int]) -> None:
+        super().__init__(f"Factorization timed out with composites left: {list(unfactored)}")
+        self.factors = factors
+        self.unfactored = unfactored
+
 def find_next_prime_from(x: int) -> int:
-    x += 1
+    """Returns the smallest prime p > x. Same as prime.sieve.next_prime()."""
+    return next_prime(x)
+
+def _int_root(n: int, k: int) -> int:
+    """Returns floor(n^(1/k)) for n >= 1."""
+    x = 1 << -(-n.bit_length() // k)
     while True:
-        if is_prime(x):
+        y = ((k - 1) * x + n // x ** (k - 1)) // k
+        if y >= x:
             return x
-        x += 1
+        x = y
+
+def _perfect_power(n: int) -> tuple[int, int]|None:
+    """Returns (b, k) with b^k = n and k >= 2 prime, or None if n is not a perfect power."""
+    for k in primes_up_to(n.bit_length()):
+        b = _int_root(n, k)
+        if b ** k == n:
+            return b, k
+    return None
+
+def _split(n: int, deadline: float|None, parallel: bool) -> int|None:
+    d = pollard_rho_brent(n, max_iterations=FACT_RHO_QUICK_ITERATIONS, deadline=deadline)
+    if d is not None:
+        return d
+    d = pollard_p_minus_1(n, deadline=deadline)
+    if d is not None:
+        return d
+    for method in list(_factor_methods):
+        d = method(n, deadline)
+        if d is not None and 1 < d < n and n % d == 0:
+            return d
+    # Imported here, since the elliptic_curve package depends on this module
+    from .elliptic_curve.ecm import ecm_factor
+    return ecm_factor(n, deadline, parallel)
 
-def fact(x: int) -> dict[int, int]:
+def fact(x: int, timeout: float|None = None, parallel: bool = False) -> dict[int, int]:
+    """
+    Returns the prime factorization of x as { prime: exponent }, by
+    increasing primes. Small factors come out of trial division, the others
+    from Pollard rho (Brent), Pollard p - 1, the methods added with
+    register_factor_method(), and finally ECM, whose curves run on the
+    prime worker pool if parallel is True. If timeout (in seconds) runs out
+    first, raises FactorizationTimeout; otherwise runs until done.
+
+    Results go through the process-wide factorization cache, see
+    get_factorization_cache() and seed_factorization().
+    """
     if x <= 1:
         raise RuntimeError(f"Invalid op: FACT({x})")
-    
-    k = 2
+    cache = get_factorization_cache()
+    cached = cache.get(x)
+    if cached is not None:
+        return cached
+    original_x = x
+    deadline = None if timeout is None else time.monotonic() + timeout
+
     results: dict[int, int] = {}
-    x_changed = True
-    while x != 1:
-        if x_changed:
-            sqrt_x = int_sqrt(x)
-            if sqrt_x * sqrt_x == x:
-                res = fact(sqrt_x)
-                for k, v in res.items():
-                    results[k] = results.get(k, 0) + v * 2
-                break
-
-            if is_prime(x):
-                results[x] = 1
-                break
-
-        x_changed = False
-
-        if x % k == 0:
+    for p in _get_trial_division_primes():
+        if p * p > x:
+            break
+        if x % p == 0:
             i = 0
-            while x % k == 0:
-                x = x // k
+            while x % p == 0:
+                x = x // p
                 i += 1
-            results[k] = i
-            x_changed = True
-        if x == 1: break
+            results[p] = i
 
-        k = find_next_prime_from(k)
+    # Every entry divides x, so it has no prime factor below FACT_TRIAL_DIVISION_BOUND either
+    stack: list[tuple[int, int]] = [(x, 1)] if x > 1 else []
+    while len(stack) > 0:
+        n, e = stack.pop()
+        if n < FACT_TRIAL_DIVISION_BOUND ** 2 or is_prime(n, "deterministic"):
+            results[n] = results.get(n, 0) + e
+            continue
+
+        power = _perfect_power(n)
+        if power is not None:
+            b, k = power
+            stack.append((b, e * k))
+            continue
+
+        d = _split(n, deadline, parallel)
+        if d is None:
+            unfactored: dict[int, int] = {}
+            for m, f in [(n, e)] + stack:
+                unfactored[m] = unfactored.get(m, 0) + f
+            raise FactorizationTimeout(dict(sorted(results.items())), unfactored)
+        stack.append((d, e))
+        stack.append((n // d, e))
+    results = dict(sorted(results.items()))
+    cache.put(original_x, results)
     return results
 
+from .fact_cache import seed_factorization
 class TestPrimeFactorization(unittest.TestCase):
     def test_simple(self):
         self.assertDictEqual(fact(198), { 2: 1, 3: 2, 11: 1 })
@@ -65,6 +163,63 @@ class TestPrimeFactorization(unittest.TestCase):
         self.assertDictEqual(fact(6504346563197524455529813700253542208823287129308640242881), { 283988607550897: 4 })
         self.assertDictEqual(fact(283988607550898), { 2: 1, 141994303775449: 1 })
 
+    def test_against_trial_division(self):
+        def reference(x: int) -> dict[int, int]:
+            results: dict[int, int] = {}
+            k = 2
+            while k * k <= x:
+                while x % k == 0:
+                    x //= k
+                    results[k] = results.get(k, 0) + 1
+                k += 1
+            if x > 1:
+                results[x] = results.get(x, 0) + 1
+            return results
+
+        for x in list(range(2, 3000)) + [4093 * 4099, 4093**2 * 4099**3, 65537**3, 2**40 * 3**5 * 1000003, 999983 * 1000003 * 1000033]:
+            self.assertEqual( list(fact(x).items()), sorted(reference(x).items()), f"x = {x}" )
+
+    def test_large_factors(self):
+        # rho
+        self.assertDictEqual(fact((2**31 - 1) * 4294967291), { 2**31 - 1: 1, 4294967291: 1 })
+        self.assertDictEqual(fact(2**64 - 1), { 3: 1, 5: 1, 17: 1, 257: 1, 641: 1, 65537: 1, 6700417: 1 })
+        # ECM (p - 1 = 2 * 3 * 13 * 17 * 29 * 26005097 is not smooth enough for p - 1, and p is too large for the quick rho walk)
+        self.assertDictEqual(fact(1000000000039 * (2**89 + 29)), { 1000000000039: 1, 2**89 + 29: 1 })
+        # p - 1 (2^61 - 2 is smooth)
+        self.assertDictEqual(fact((2**61 - 1) * (2**89 + 29) * 12), { 2: 2, 3: 1, 2**61 - 1: 1, 2**89 + 29: 1 })
+        # perfect powers
+        self.assertDictEqual(fact((2**61 - 1)**3 * (2**31 - 1)**2), { 2**31 - 1: 2, 2**61 - 1: 3 })
+
+    def test_cache(self):
+        cache = get_factorization_cache()
+        x = 1000000000039 * (2**89 + 29)
+        stats_before = cache.stats()
+        f = fact(x)
+        del f[1000000000039]
+        self.assertDictEqual(fact(x), { 1000000000039: 1, 2**89 + 29: 1 })
+        self.assertGreater(cache.stats()["hits"], stats_before["hits"])
+
+        # A seeded factorization is served as is, even one that fact() itself could not find in time
+        p, q = 2**89 + 29, 2**107 + 39
+        seed_factorization(p * q * 2, { 2: 1, p: 1, q: 1 })
+        self.assertDictEqual(fact(p * q * 2, timeout=0.1), { 2: 1, p: 1, q: 1 })
+
+    def test_timeout_and_factor_method(self):
+        p, q = 2**89 + 29, 2**107 + 39 # p - 1 and q - 1 are not smooth, and rho would need ~2^44 steps
+        get_factorization_cache().clear()
+        with self.assertRaises(FactorizationTimeout) as cm:
+            fact(6 * p * q, timeout=0.5)
+        self.assertDictEqual(cm.exception.factors, { 2: 1, 3: 1 })
+        self.assertDictEqual(cm.exception.unfactored, { p * q: 1 })
+
+        def oracle(n: int, deadline: float|None) -> int|None:
+            return p if n % p == 0 else None
+        register_factor_method(oracle)
+        try:
+            self.assertDictEqual(fact(6 * p * q, timeout=10), { 2: 1, 3: 1, p: 1, q: 1 })
+        finally:
+            unregister_factor_method(oracle)
+
 if __name__ == '__main__':
     CHECK_TESTING()
 
@@ -0,0 +1,211 @@
+import os
+import dbm
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .CHECK_TESTING import CHECK_TESTING
+import unittest
+
+FACT_CACHE_MAX_ENTRIES = 4096
+
+# Bound on the total bit length of the cached numbers and of their prime factors,
+# so that a few huge factorizations cannot take all the memory
+FACT_CACHE_MAX_BITS = 1 << 22
+
+# Below this, factoring again is about as cheap as a lookup, so nothing is cached
+FACT_CACHE_MIN_BITS = 32
+
+# Set this environment variable to a file path to spill the factorizations
+# evicted from the default cache to disk, and to look them up there again.
+FACT_CACHE_PATH_ENV = "CRYPTOENGINE_FACT_CACHE"
+
+# dbm.error is a tuple of the errors of every dbm backend
+_SPILL_ERRORS = (OSError, ValueError, KeyError) + tuple(dbm.error)
+
+def _size_in_bits(x: int, factors: dict[int, int]) -> int:
+    return x.bit_length() + sum(p.bit_length() for p in factors)
+
+class FactorizationCache:
+    """
+    Bounded LRU cache of prime factorizations { x: { prime: exponent } }.
+    The least recently used entries are evicted once there are more than
+    max_entries of them, or once they add up to more than max_bits. If path
+    is given, evicted entries are spilled to a dbm file there, and looked up
+    again on a miss. Everything handed out is a copy, so callers may modify it.
+    """
+
+    def __init__(self, max_entries: int = FACT_CACHE_MAX_ENTRIES, max_bits: int = FACT_CACHE_MAX_BITS, min_bits: int = FACT_CACHE_MIN_BITS, path: str|None = None) -> None:
+        self.max_entries = max_entries
+        self.max_bits = max_bits
+        self.min_bits = min_bits
+        self.path = path
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[int, dict[int, int]] = OrderedDict()
+        self._bits = 0
+        self._lock = threading.Lock()
+
+    def get(self, x: int) -> dict[int, int]|None:
+        if x.bit_length() < self.min_bits:
+            return None
+        with self._lock:
+            factors = self._entries.get(x)
+            if factors is not None:
+                self._entries.move_to_end(x)
+                self.hits += 1
+                return dict(factors)
+            factors = self._load_spilled(x)
+            if factors is None:
+                self.misses += 1
+                return None
+            self.spill_hits += 1
+            self._insert(x, factors)
+            return dict(factors)
+
+    def put(self, x: int, factors: dict[int, int]) -> None:
+        """Caches the factorization of x, which is trusted as is. See seed() for outside sources."""
+        if x.bit_length() < self.min_bits:
+            return
+        with self._lock:
+            self._insert(x, dict(factors))
+
+    def seed(self, x: int, factors: dict[int, int]) -> None:
+        """
+        Caches a factorization known from elsewhere, e.g. the one of p - 1
+        returned with p by random_prime_with_fact_of_p_minus_1(). Only the
+        product is checked, not the primality of the factors.
+        """
+        product = 1
+        for p, e in factors.items():
+            if p < 2 or e < 1:
+                raise ValueError(f"Invalid factor {p}^{e} in the factorization of {x}")
+            product *= p ** e
+        if product != x:
+            raise ValueError(f"The factors multiply to {product}, not to {x}")
+        self.put(x, factors)
+
+    def clear(self) -> None:
+        """Empties the cache in memory and resets the stats. The spill file is kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bits = 0
+            self.hits = self.spill_hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "spill_hits": self.spill_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bits": self._bits,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, x: int, factors: dict[int, int]) -> None:
+        old = self._entries.pop(x, None)
+        if old is not None:
+            self._bits -= _size_in_bits(x, old)
+        self._entries[x] = factors
+        self._bits += _size_in_bits(x, factors)
+        while len(self._entries) > self.max_entries or (self._bits > self.max_bits and len(self._entries) > 1):
+            evicted_x, evicted_factors = self._entries.popitem(last=False)
+            self._bits -= _size_in_bits(evicted_x, evicted_factors)
+            self.evictions += 1
+            self._spill(evicted_x, evicted_factors)
+
+    def _spill(self, x: int, factors: dict[int, int]) -> None:
+        if self.path is None:
+            return
+        # Spilling is best-effort: failing to write must never break the caller
+        try:
+            with dbm.open(self.path, "c", 0o600) as db:
+                db[hex(x)] = json.dumps({hex(p): e for p, e in factors.items()})
+        except _SPILL_ERRORS:
+            pass
+
+    def _load_spilled(self, x: int) -> dict[int, int]|None:
+        if self.path is None:
+            return None
+        try:
+            with dbm.open(self.path, "r") as db:
+                value = db.get(hex(x))
+            if value is None:
+                return None
+            return {int(p, 16): int(e) for p, e in json.loads(value).items()}
+        except _SPILL_ERRORS:
+            return None
+
+_factorization_cache = FactorizationCache(path=os.environ.get(FACT_CACHE_PATH_ENV) or None)
+
+def get_factorization_cache() -> FactorizationCache:
+    """The cache in front of fact()."""
+    return _factorization_cache
+
+def seed_factorization(x: int, factors: dict[int, int]) -> None:
+    """Makes fact(x) return factors without any computation, see FactorizationCache.seed()."""
+    _factorization_cache.seed(x, factors)
+
+class TestFactorizationCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = FactorizationCache(max_entries=2, min_bits=0)
+        cache.put(6, { 2: 1, 3: 1 })
+        cache.put(10, { 2: 1, 5: 1 })
+        self.assertEqual(cache.get(6), { 2: 1, 3: 1 }) # 10 is now the least recently used
+        cache.put(14, { 2: 1, 7: 1 })
+        self.assertIsNone(cache.get(10))
+        self.assertEqual(cache.get(14), { 2: 1, 7: 1 })
+        self.assertEqual(cache.stats(), { "hits": 2, "spill_hits": 0, "misses": 1, "evictions": 1, "entries": 2, "bits": 3 + 2 + 2 + 4 + 2 + 3 })
+
+    def test_bits_limit_and_min_bits(self):
+        cache = FactorizationCache(max_bits=200)
+        cache.put(2**64 - 1, { 3: 1, 5: 1, 17: 1, 257: 1, 641: 1, 65537: 1, 6700417: 1 })
+        cache.put(2**100, { 2: 100 })
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(2**64 - 1))
+        cache.put(6, { 2: 1, 3: 1 }) # too small to be worth caching
+        self.assertIsNone(cache.get(6))
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_copies(self):
+        cache = FactorizationCache(min_bits=0)
+        factors = { 2: 1, 3: 1 }
+        cache.put(6, factors)
+        factors[5] = 1
+        got = cache.get(6)
+        assert got is not None
+        del got[2]
+        self.assertEqual(cache.get(6), { 2: 1, 3: 1 })
+
+    def test_seed(self):
+        cache = FactorizationCache()
+        cache.seed(2**64 - 2, { 2: 1, 7: 2, 73: 1, 127: 1, 337: 1, 92737: 1, 649657: 1 })
+        self.assertEqual(cache.get(2**64 - 2), { 2: 1, 7: 2, 73: 1, 127: 1, 337: 1, 92737: 1, 649657: 1 })
+        self.assertRaises(ValueError, cache.seed, 2**64, { 2: 63 })
+        self.assertRaises(ValueError, cache.seed, 2**64, { 1: 1, 2: 64 })
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "fact")
+            cache = FactorizationCache(max_entries=1, min_bits=0, path=path)
+            cache.put(6, { 2: 1, 3: 1 })
+            cache.put(10, { 2: 1, 5: 1 }) # spills 6
+            self.assertEqual(cache.get(6), { 2: 1, 3: 1 })
+            self.assertEqual(cache.stats()["spill_hits"], 1)
+            # Another cache on the same file sees what was spilled: 6, then 10 when 6 came back
+            other = FactorizationCache(max_entries=1, min_bits=0, path=path)
+            self.assertEqual(other.get(10), { 2: 1, 5: 1 })
+            self.assertIsNone(other.get(14))
+            # The spilled factorizations may be of secrets: only the owner reads them
+            for name in os.listdir(directory):
+                self.assertEqual(os.stat(os.path.join(directory, name)).st_mode & 0o077, 0, name)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
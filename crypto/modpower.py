@@ -5,18 +5,101 @@ import unittest
 
 sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
+# Window width of the fixed-base tables of ModPowerContext
+MODPOWER_CONTEXT_WINDOW_BITS = 4
+
 def modpower(b: int, n: int, m: int) -> int:
     """Returns b^n mod m"""
-    x = 1
+    if n < 0:
+        raise ValueError(f"n must be non-negative (n = {n})")
+    if n == 0:
+        return 1 # even mod 1, as the bit-by-bit loop always did
+    # The interpreter's pow is exact and runs its own sliding window in C
+    return pow(b, n, m)
+
+def sliding_window_modpower(b: int, n: int, m: int, window_bits: int|None = None) -> int:
+    """
+    Returns b^n mod m with left-to-right sliding-window exponentiation, which
+    only needs the odd powers b, b^3, ..., b^(2^w - 1). modpower() is faster
+    in practice; this is the same algorithm written out in Python.
+    """
+    if n < 0:
+        raise ValueError(f"n must be non-negative (n = {n})")
+    if n == 0:
+        return 1
+    if window_bits is None:
+        # Roughly minimizes 2^(w-1) precomputations + n.bit_length() / (w + 1) multiplications
+        window_bits = 1
+        while (1 << window_bits) * (window_bits + 2) < n.bit_length():
+            window_bits += 1
+
     b %= m
-    p = n
-    while p != 0:
-        r = p % 2
-        if r == 1:
-            x = (x * b) % m
-        b = (b * b) % m
-        p = (p // 2)
-    return x
+    b2 = b * b % m
+    odd_powers = [b]
+    for _ in range(1, 1 << (window_bits - 1)):
+        odd_powers.append(odd_powers[-1] * b2 % m)
+
+    x = 1
+    i = n.bit_length() - 1
+    while i >= 0:
+        if not (n >> i) & 1:
+            x = x * x % m
+            i -= 1
+            continue
+        # Longest window n[i..j] of at most window_bits bits ending with a 1
+        j = max(i - window_bits + 1, 0)
+        while not (n >> j) & 1:
+            j += 1
+        for _ in range(i - j + 1):
+            x = x * x % m
+        x = x * odd_powers[((n >> j) & ((1 << (i - j + 1)) - 1)) >> 1] % m
+        i = j - 1
+    return x % m
+
+class ModPowerContext:
+    """
+    Precomputed powers of a fixed base b modulo m:
+
+        rows[i][j] = b^(j * 2^(w*i)) mod m    for 0 <= j < 2^w
+
+    An exponent n < 2^(w * len(rows)) is then split into w-bit digits and
+    b^n is the product of one table entry per non-zero digit - no squaring
+    at all. Worth it when the same base is raised to many exponents.
+    """
+
+    def __init__(self, b: int, m: int, max_exponent_bits: int, window_bits: int = MODPOWER_CONTEXT_WINDOW_BITS) -> None:
+        self.b = b
+        self.m = m
+        self.window_bits = window_bits
+        num_rows = (max_exponent_bits + window_bits - 1) // window_bits
+        self.rows: list[list[int]] = []
+        base = b % m
+        for _ in range(num_rows):
+            row = [1 % m]
+            for _j in range(1, 1 << window_bits):
+                row.append(row[-1] * base % m)
+            self.rows.append(row)
+            base = row[-1] * base % m # b^(2^w) times the previous base
+
+    @property
+    def max_exponent_bits(self) -> int:
+        return self.window_bits * len(self.rows)
+
+    def power(self, n: int) -> int:
+        """Returns b^n mod m, same as modpower(b, n, m)."""
+        if n <= 0 or n.bit_length() > self.max_exponent_bits:
+            return modpower(self.b, n, self.m)
+        m = self.m
+        mask = (1 << self.window_bits) - 1
+        x = 1
+        for row in self.rows:
+            digit = n & mask
+            if digit != 0:
+                x = x * row[digit] % m
+            n >>= self.window_bits
+            if n == 0:
+                break
+        return x
 
 class TestModPower(unittest.TestCase):
     def test_1(self):
@@ -27,6 +110,23 @@ class TestModPower(unittest.TestCase):
         self.assertEqual( modpower(5, 20, 43), 17 )
     def test_4(self):
         self.assertEqual( modpower(1024, 2000, 2579), 80 )
+    def test_edge_cases(self):
+        self.assertEqual( modpower(5, 0, 1), 1 )
+        self.assertEqual( modpower(5, 3, 1), 0 )
+        self.assertEqual( modpower(0, 0, 7), 1 )
+        self.assertRaises( ValueError, modpower, 5, -1, 7 )
+    def test_sliding_window(self):
+        for m in [1, 2, 201, 2579, 2**127 - 1, 3**80]:
+            for b in [0, 1, 2, 51, 1024, m - 1, 3**50]:
+                for n in [0, 1, 2, 3, 40, 101, 2000, 2**64 + 12345, 3**100]:
+                    for window_bits in [None, 1, 3, 5]:
+                        self.assertEqual( sliding_window_modpower(b, n, m, window_bits), modpower(b, n, m), f"b = {b}, n = {n}, m = {m}" )
+    def test_context(self):
+        for m in [2, 201, 2579, 2**127 - 1]:
+            for b in [0, 2, 51, m - 1]:
+                context = ModPowerContext(b, m, 130)
+                for n in [0, 1, 2, 15, 16, 40, 101, 2000, 2**128 + 7, 2**200 + 1]:
+                    self.assertEqual( context.power(n), modpower(b, n, m), f"b = {b}, n = {n}, m = {m}" )
 
 if __name__ == "__main__":
     CHECK_TESTING()
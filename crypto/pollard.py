@@ -0,0 +1,157 @@
+import sys
+sys.set_int_max_str_digits(2147483647) # 2^31 - 1
+
+import time
+import unittest
+from math import gcd
+from .prime.sieve import primes_up_to, segmented_sieve
+from .CHECK_TESTING import CHECK_TESTING
+
+# Number of products accumulated between two gcds in Pollard's rho
+BRENT_GCD_BATCH = 128
+
+POLLARD_P_MINUS_1_B1 = 10**4
+POLLARD_P_MINUS_1_B2 = 50 * POLLARD_P_MINUS_1_B1
+
+def _out_of_time(deadline: float|None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+def pollard_rho_brent(n: int, c: int = 1, x0: int = 2, max_iterations: int|None = None, deadline: float|None = None) -> int|None:
+    """
+    Returns a non-trivial factor of the composite n, or None if the walk
+    x -> x^2 + c mod n closes its cycle without revealing one (then retry
+    with another c), or if max_iterations or the deadline (a time.monotonic()
+    value) is reached first.
+
+    Brent's variant: the cycle is detected by comparing x_i with x_(2^k)
+    instead of Floyd's x_i with x_2i, and the differences are multiplied
+    together so that a gcd is only computed every BRENT_GCD_BATCH steps.
+    Finds a prime factor q after about sqrt(q) steps.
+    """
+    if n % 2 == 0:
+        return 2 if n > 2 else None
+
+    y = x0 % n
+    x = ys = y
+    r = 1
+    q = 1
+    g = 1
+    iterations = 0
+    while g == 1:
+        x = y
+        for _ in range(r):
+            y = (y * y + c) % n
+        k = 0
+        while k < r and g == 1:
+            ys = y
+            for _ in range(min(BRENT_GCD_BATCH, r - k)):
+                y = (y * y + c) % n
+                q = q * (x - y) % n
+            g = gcd(q, n)
+            k += BRENT_GCD_BATCH
+        iterations += 2 * r
+        r *= 2
+        if g == 1 and ((max_iterations is not None and iterations >= max_iterations) or _out_of_time(deadline)):
+            return None
+
+    if g == n:
+        # The batch overshot: replay it one step at a time
+        g = 1
+        while g == 1:
+            ys = (ys * ys + c) % n
+            g = gcd(x - ys, n)
+    return g if g != n else None
+
+def pollard_p_minus_1(n: int, B1: int = POLLARD_P_MINUS_1_B1, B2: int = POLLARD_P_MINUS_1_B2, deadline: float|None = None) -> int|None:
+    """
+    Returns a non-trivial factor of the composite n, or None. Succeeds when
+    n has a prime factor q such that q - 1 is B1-smooth, except for at most
+    one prime factor in (B1, B2].
+    """
+    if n % 2 == 0:
+        return 2 if n > 2 else None
+
+    # Stage 1: a = 3^M where M is the product of all the prime powers <= B1.
+    # Not 2, whose order is tiny modulo Mersenne and Fermat numbers.
+    a = 3
+    primes = primes_up_to(B1)
+    for i in range(0, len(primes), BRENT_GCD_BATCH):
+        batch = primes[i:i + BRENT_GCD_BATCH]
+        a_before = a
+        for p in batch:
+            pk = p
+            while pk * p <= B1:
+                pk *= p
+            a = pow(a, pk, n)
+        g = gcd(a - 1, n)
+        if g == n:
+            # Every prime factor got caught in the same batch: replay it prime by prime
+            a = a_before
+            for p in batch:
+                pk = p
+                while pk * p <= B1:
+                    pk *= p
+                a = pow(a, pk, n)
+                g = gcd(a - 1, n)
+                if g != 1:
+                    return g if g != n else None
+            return None
+        if g != 1:
+            return g
+        if _out_of_time(deadline):
+            return None
+
+    # Stage 2: the primes q of (B1, B2], stepping from one to the next with
+    # a cached a^gap, since the gaps between consecutive primes are small and even
+    if B2 <= B1:
+        return None
+    a_to_gap: dict[int, int] = {}
+    q_prev = 0
+    x = 1
+    product = 1
+    count = 0
+    for q in segmented_sieve(B1 + 1, B2 + 1):
+        if q_prev == 0:
+            x = pow(a, q, n)
+        else:
+            gap = q - q_prev
+            a_gap = a_to_gap.get(gap)
+            if a_gap is None:
+                a_gap = a_to_gap[gap] = pow(a, gap, n)
+            x = x * a_gap % n
+        q_prev = q
+        product = product * (x - 1) % n
+        count += 1
+        if count % (16 * BRENT_GCD_BATCH) == 0:
+            g = gcd(product, n)
+            if g != 1:
+                return g if g != n else None
+            if _out_of_time(deadline):
+                return None
+    g = gcd(product, n)
+    return g if g not in (1, n) else None
+
+class TestPollard(unittest.TestCase):
+    def test_rho(self):
+        for p, q in [(3, 5), (101, 103), (1000003, 999983), (2**31 - 1, 2**61 - 1)]:
+            n = p * q
+            d = None
+            c = 1
+            while d is None:
+                d = pollard_rho_brent(n, c)
+                c += 1
+            self.assertIn(d, (p, q))
+        self.assertEqual(pollard_rho_brent(1000), 2)
+        self.assertIsNone(pollard_rho_brent((2**61 - 1) * (2**89 + 29), max_iterations=1000))
+
+    def test_p_minus_1(self):
+        p, q = 2**89 + 29, 2**107 + 39 # p - 1 and q - 1 both have prime factors > 10^10
+        # 2^61 - 2 = 2 * 3^2 * 5^2 * 7 * 11 * 13 * 31 * 41 * 61 * 151 * 331 * 1321 is B1-smooth
+        self.assertEqual(pollard_p_minus_1((2**61 - 1) * p), 2**61 - 1)
+        # 60222 = 2 * 3 * 10037 is caught by stage 2 only
+        self.assertIsNone(pollard_p_minus_1(60223 * p, B2=0))
+        self.assertEqual(pollard_p_minus_1(60223 * p), 60223)
+        self.assertIsNone(pollard_p_minus_1(p * q))
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -0,0 +1,337 @@
+import decimal
+import random
+import unittest
+from math import isqrt
+from .CHECK_TESTING import CHECK_TESTING
+
+# Polynomials over Z/pZ are lists of coefficients in [0, p), lowest degree
+# first, without trailing zeros: [] is 0, [1] is 1 and [b, a, 0, 1] is x^3 + a x + b.
+Polynomial = list[int]
+
+# Below this many coefficients in the shorter factor, the schoolbook product
+# beats packing both factors into integers
+POLY_SCHOOLBOOK_MAX_LEN = 16
+
+# From this many bytes in the packed factors on, the products go through
+# decimal, whose multiplication switches to a number-theoretic transform for
+# large operands, while the one of int stays at Karatsuba's
+POLY_DECIMAL_MIN_BYTES = 1 << 15
+
+_DECIMAL_CONTEXT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+def poly_trim(f: Polynomial) -> Polynomial:
+    while f and f[-1] == 0:
+        f.pop()
+    return f
+
+def poly_degree(f: Polynomial) -> int:
+    """Returns the degree of f, -1 for the zero polynomial."""
+    return len(f) - 1
+
+def poly_add(f: Polynomial, g: Polynomial, p: int) -> Polynomial:
+    if len(f) < len(g):
+        f, g = g, f
+    return poly_trim([(c + g[i]) % p for i, c in enumerate(f[:len(g)])] + f[len(g):])
+
+def poly_sub(f: Polynomial, g: Polynomial, p: int) -> Polynomial:
+    n = max(len(f), len(g))
+    f = f + [0] * (n - len(f))
+    g = g + [0] * (n - len(g))
+    return poly_trim([(c - d) % p for c, d in zip(f, g)])
+
+def poly_scale(f: Polynomial, c: int, p: int) -> Polynomial:
+    c %= p
+    if c == 0:
+        return []
+    return [x * c % p for x in f]
+
+def poly_mul(f: Polynomial, g: Polynomial, p: int) -> Polynomial:
+    """
+    Returns f g. Large products go through Kronecker substitution: the
+    coefficients are packed into one integer each, in slots wide enough to
+    hold every coefficient of the product, so that a single multiplication
+    of Python integers does all the work.
+    """
+    if not f or not g:
+        return []
+    if min(len(f), len(g)) <= POLY_SCHOOLBOOK_MAX_LEN:
+        if len(f) < len(g):
+            f, g = g, f
+        h = [0] * (len(f) + len(g) - 1)
+        for j, d in enumerate(g):
+            if d:
+                for i, c in enumerate(f):
+                    h[i + j] += c * d
+        return poly_trim([c % p for c in h])
+
+    width = (2 * (p - 1).bit_length() + min(len(f), len(g)).bit_length() + 7) // 8
+    if min(len(f), len(g)) * width >= POLY_DECIMAL_MIN_BYTES:
+        return _poly_mul_decimal(f, g, p)
+    F = int.from_bytes(b"".join(c.to_bytes(width, "little") for c in f), "little")
+    if f is g:
+        H = F * F
+    else:
+        H = F * int.from_bytes(b"".join(c.to_bytes(width, "little") for c in g), "little")
+    n = len(f) + len(g) - 1
+    raw = H.to_bytes(n * width, "little")
+    return poly_trim([int.from_bytes(raw[i:i + width], "little") % p for i in range(0, n * width, width)])
+
+def _poly_mul_decimal(f: Polynomial, g: Polynomial, p: int) -> Polynomial:
+    # Same packing in base 10: slots of width decimal digits, the highest degree first
+    width = len(str((p - 1) * (p - 1) * min(len(f), len(g))))
+    F = decimal.Decimal("".join(str(c).zfill(width) for c in reversed(f)))
+    if f is g:
+        H = _DECIMAL_CONTEXT.multiply(F, F)
+    else:
+        H = _DECIMAL_CONTEXT.multiply(F, decimal.Decimal("".join(str(c).zfill(width) for c in reversed(g))))
+    n = len(f) + len(g) - 1
+    digits = str(H).zfill(n * width)
+    return poly_trim([int(digits[i - width:i]) % p for i in range(n * width, 0, -width)])
+
+def poly_inverse_series(f: Polynomial, n: int, p: int) -> Polynomial:
+    """Returns g such that f g = 1 mod x^n, by Newton's iteration g <- g (2 - f g). f[0] must be invertible."""
+    g = [pow(f[0], -1, p)]
+    k = 1
+    while k < n:
+        k = min(2 * k, n)
+        e = [(-c) % p for c in poly_mul(f[:k], g, p)[:k]]
+        e += [0] * (k - len(e))
+        e[0] = (e[0] + 2) % p
+        g = poly_mul(g, poly_trim(e), p)[:k]
+    return g
+
+def poly_divmod(f: Polynomial, g: Polynomial, p: int) -> tuple[Polynomial, Polynomial]:
+    """Returns (q, r) such that f = q g + r and deg r < deg g, by long division."""
+    if not g:
+        raise ZeroDivisionError("polynomial division by zero")
+    r = list(f)
+    if len(r) < len(g):
+        return [], r
+    inv = pow(g[-1], -1, p)
+    q = [0] * (len(r) - len(g) + 1)
+    dg = len(g) - 1
+    for i in range(len(q) - 1, -1, -1):
+        c = r[i + dg] * inv % p
+        q[i] = c
+        if c:
+            for j in range(dg):
+                r[i + j] = (r[i + j] - c * g[j]) % p
+        r[i + dg] = 0
+    return poly_trim(q), poly_trim(r[:dg])
+
+def poly_monic(f: Polynomial, p: int) -> Polynomial:
+    if not f:
+        return []
+    return poly_scale(f, pow(f[-1], -1, p), p)
+
+def poly_gcd(f: Polynomial, g: Polynomial, p: int) -> Polynomial:
+    """Returns the monic gcd of f and g (0 if both are 0)."""
+    while g:
+        f, g = g, poly_divmod(f, g, p)[1]
+    return poly_monic(f, p)
+
+def poly_eval(f: Polynomial, x: int, p: int) -> int:
+    y = 0
+    for c in reversed(f):
+        y = (y * x + c) % p
+    return y
+
+class PolynomialModulus:
+    """
+    Arithmetic modulo a fixed polynomial h over Z/pZ. Remainders are taken
+    with two products by a precomputed inverse of the reversed h (Barrett's
+    reduction for polynomials) instead of a long division, which costs as
+    much as a product of polynomials of degree deg h.
+    """
+
+    def __init__(self, h: Polynomial, p: int) -> None:
+        if len(h) < 2:
+            raise ValueError("the modulus must have degree at least 1")
+        self.p = p
+        self.h = poly_monic(h, p)
+        self.degree = len(self.h) - 1
+        self._reversed = self.h[::-1]
+        self._inverse: Polynomial = [1]
+
+    def reduce(self, f: Polynomial) -> Polynomial:
+        n = self.degree
+        if len(f) <= n:
+            return f
+        m = len(f) - n # number of coefficients of the quotient
+        if len(self._inverse) < m:
+            self._inverse = poly_inverse_series(self._reversed, max(m, n - 1), self.p)
+        reversed_q = poly_mul(poly_trim(f[:n - 1:-1]), self._inverse[:m], self.p)[:m]
+        q = poly_trim((reversed_q + [0] * (m - len(reversed_q)))[::-1])
+        return poly_sub(f[:n], poly_mul(q, self.h, self.p)[:n], self.p)
+
+    def mul(self, f: Polynomial, g: Polynomial) -> Polynomial:
+        return self.reduce(poly_mul(f, g, self.p))
+
+    def compose(self, g: Polynomial, u: Polynomial) -> Polynomial:
+        """
+        Returns g(u) mod h, with Brent and Kung's baby steps u^i, i < k, and
+        giant step u^k for k ~ sqrt(deg g): about 2 sqrt(deg g) products
+        instead of deg g with Horner. The baby steps are packed into integers
+        as in poly_mul(), so that each block of k coefficients of g costs k
+        multiplications of an integer by a coefficient.
+        """
+        p = self.p
+        n = self.degree
+        g = self.reduce(g)
+        if len(g) <= 1:
+            return g
+        k = isqrt(len(g) - 1) + 1
+        powers = [[1], self.reduce(u)]
+        while len(powers) <= k:
+            powers.append(self.mul(powers[-1], powers[1]))
+        width = (2 * (p - 1).bit_length() + k.bit_length() + 7) // 8
+        packed = [int.from_bytes(b"".join(c.to_bytes(width, "little") for c in power), "little") for power in powers[:k]]
+        result: Polynomial = []
+        for j in range((len(g) - 1) // k, -1, -1):
+            block = sum(c * packed[i] for i, c in enumerate(g[j * k:(j + 1) * k]) if c)
+            raw = block.to_bytes(n * width, "little")
+            r = poly_trim([int.from_bytes(raw[i:i + width], "little") % p for i in range(0, n * width, width)])
+            result = poly_add(self.mul(result, powers[k]), r, p)
+        return result
+
+    def pow(self, f: Polynomial, e: int) -> Polynomial:
+        """Returns f^e mod h, with a fixed window of 4 bits (of 1 bit when f is small, since f x is then cheap)."""
+        f = self.reduce(f)
+        if e == 0:
+            return [1]
+        if len(f) <= POLY_SCHOOLBOOK_MAX_LEN:
+            result = f
+            for i in range(e.bit_length() - 2, -1, -1):
+                result = self.mul(result, result)
+                if (e >> i) & 1:
+                    result = self.mul(result, f)
+            return result
+
+        table = [[1], f]
+        for _ in range(14):
+            table.append(self.mul(table[-1], f))
+        digits = []
+        while e:
+            digits.append(e & 15)
+            e >>= 4
+        result = table[digits[-1]]
+        for d in reversed(digits[:-1]):
+            for _ in range(4):
+                result = self.mul(result, result)
+            if d:
+                result = self.mul(result, table[d])
+        return result
+
+def poly_roots(f: Polynomial, p: int) -> list[int]:
+    """
+    Returns the distinct roots of f in Z/pZ, p prime, in increasing order:
+    those of gcd(f, x^p - x), the product of the x - r, split by Cantor and
+    Zassenhaus' gcd with (x + d)^((p - 1) / 2) - 1 for random d, which keeps
+    about half of the roots, the r such that r + d is a square.
+    """
+    f = poly_monic(f, p)
+    if not f:
+        raise ValueError("every element is a root of the zero polynomial")
+    if p == 2:
+        return [r for r in range(2) if poly_eval(f, r, 2) == 0]
+    roots: list[int] = []
+    if f[0] == 0:
+        roots.append(0)
+        while f[0] == 0:
+            f = f[1:]
+    if len(f) > 1:
+        xp = PolynomialModulus(f, p).pow([0, 1], p)
+        pending = [poly_gcd(f, poly_sub(xp, [0, 1], p), p)]
+        while pending:
+            g = pending.pop()
+            if len(g) <= 1:
+                continue
+            if len(g) == 2:
+                roots.append(-g[0] % p)
+                continue
+            modulus = PolynomialModulus(g, p)
+            while True:
+                h = poly_gcd(g, poly_sub(modulus.pow([random.randrange(p), 1], (p - 1) // 2), [1], p), p)
+                if 1 < len(h) < len(g):
+                    break
+            pending += [h, poly_divmod(g, h, p)[0]]
+    return sorted(roots)
+
+class TestPolynomial(unittest.TestCase):
+    def test_mul(self):
+        p = 2**127 - 1
+        f = [(i * 7919 + 3) % p for i in range(100)]
+        g = [(i * i * 104729 + 1) % p for i in range(70)]
+        expected = [0] * (len(f) + len(g) - 1)
+        for i, c in enumerate(f):
+            for j, d in enumerate(g):
+                expected[i + j] = (expected[i + j] + c * d) % p
+        self.assertEqual(poly_mul(f, g, p), expected)
+        self.assertEqual(poly_mul(f, f, p), poly_mul(f, list(f), p))
+        self.assertEqual(poly_mul([p - 1, 1], [1, 1], p), [p - 1, 0, 1])
+        self.assertEqual(poly_mul(f, [], p), [])
+
+    def test_divmod_and_gcd(self):
+        p = 1000003
+        f = [3, 1, 4, 1, 5, 9, 2, 6]
+        g = [2, 7, 1, 8]
+        q, r = poly_divmod(f, g, p)
+        self.assertEqual(poly_add(poly_mul(q, g, p), r, p), f)
+        self.assertLess(len(r), len(g))
+        h = [5, 0, 1]
+        self.assertEqual(poly_gcd(poly_mul(f, h, p), poly_mul(g, h, p), p), poly_monic(poly_mul(h, poly_gcd(f, g, p), p), p))
+
+    def test_modulus(self):
+        p = 2**61 - 1
+        h = [(i * 31337 + 11) % p for i in range(60)]
+        M = PolynomialModulus(h, p)
+        f = [(i * i + 5) % p for i in range(150)]
+        self.assertEqual(M.reduce(f), poly_divmod(f, h, p)[1])
+        g = [(3 * i + 1) % p for i in range(59)]
+        self.assertEqual(M.mul(g, g), poly_divmod(poly_mul(g, g, p), h, p)[1])
+        # x^p = x modulo x^2 - x (Fermat on both roots 0 and 1)
+        self.assertEqual(PolynomialModulus([0, p - 1, 1], p).pow([0, 1], p), [0, 1])
+        e = 1234
+        expected = [1]
+        for _ in range(e):
+            expected = M.mul(expected, g)
+        self.assertEqual(M.pow(g, e), expected)
+
+    def test_decimal_mul(self):
+        p = 2**255 - 19
+        f = [(i**3 * 7919 + 3) % p for i in range(POLY_DECIMAL_MIN_BYTES // 32)]
+        g = [(i * i * 104729 + 1) % p for i in range(POLY_DECIMAL_MIN_BYTES // 32 + 5)]
+        for x in [2, 12345, p - 1]:
+            self.assertEqual(poly_eval(poly_mul(f, g, p), x, p), poly_eval(f, x, p) * poly_eval(g, x, p) % p)
+            self.assertEqual(poly_eval(poly_mul(f, f, p), x, p), poly_eval(f, x, p) ** 2 % p)
+        self.assertEqual(_poly_mul_decimal(f[:50], g[:60], p), poly_mul(f[:50], g[:60], p))
+
+    def test_roots(self):
+        for p in [2, 3, 1009, 2**61 - 1]:
+            for roots in [[], [0], [1, 2], [0, 5, 7, 11, 1000, 1001], list(range(1, 30))]:
+                roots = sorted(set(r % p for r in roots))
+                f = [1]
+                for r in roots:
+                    f = poly_mul(f, [-r % p, 1], p)
+                self.assertEqual(poly_roots(f, p), roots)
+                # Multiplicities and factors without roots do not change them
+                if p > 2:
+                    c = next(c for c in range(2, p) if pow(c, (p - 1) // 2, p) == p - 1)
+                    g = poly_mul(poly_mul(f, f, p), [p - c, 0, 1], p) # x^2 - c
+                    self.assertEqual(poly_roots(g, p), roots, f"p = {p}")
+
+    def test_compose(self):
+        p = 1000003
+        h = [(i * 31337 + 11) % p for i in range(40)] + [1]
+        M = PolynomialModulus(h, p)
+        g = [(i * i + 5) % p for i in range(40)]
+        u = [(7 * i + 2) % p for i in range(40)]
+        expected: Polynomial = []
+        for c in reversed(g):
+            expected = poly_add(M.mul(expected, u), [c], p)
+        self.assertEqual(M.compose(g, u), expected)
+        # Frobenius: g(x)^p = g(x^p)
+        self.assertEqual(M.compose(g, M.pow([0, 1], p)), M.pow(g, p))
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -6,3 +6,4 @@ from .is_prime_trivial import *
 from .is_prime import *
 from .lucas_sequence import *
 from .random_prime import *
+from .sieve import *
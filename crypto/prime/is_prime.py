@@ -3,22 +3,108 @@ sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
 import unittest
 import typing
+import random
 from .is_prime_trivial import is_prime_trivial
 from .is_prime_miller_rabin import is_prime_miller_rabin
 from .is_prime_lucas import is_prime_lucas
 from ..CHECK_TESTING import CHECK_TESTING
 
-def is_prime(n: int) -> bool|typing.Literal["likely"]:
-    res = is_prime_trivial(n, 15199)
+# "bpsw": trial division, then Miller-Rabin to base 2 and a strong Lucas test (Baillie-PSW)
+# "deterministic": same as "bpsw", except below DETERMINISTIC_MILLER_RABIN_BOUND, where
+#   Miller-Rabin to the fixed bases DETERMINISTIC_MILLER_RABIN_BASES gives an exact answer
+# "fast": trial division, then Miller-Rabin to FAST_MILLER_RABIN_ROUNDS random bases only,
+#   to filter out bulk candidates cheaply
+PrimalityProfile = typing.Literal["bpsw", "deterministic", "fast"]
+
+DEFAULT_PRIMALITY_PROFILE: PrimalityProfile = "bpsw"
+
+TRIAL_DIVISION_THRESHOLD = 15199
+
+# (bound, bases): Miller-Rabin to these bases has no strong pseudoprime below the bound
+# https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test#Testing_against_small_sets_of_bases
+DETERMINISTIC_MILLER_RABIN_BASES: list[tuple[int, list[int]]] = [
+    (2047, [2]),
+    (1373653, [2, 3]),
+    (25326001, [2, 3, 5]),
+    (3215031751, [2, 3, 5, 7]),
+    (2152302898747, [2, 3, 5, 7, 11]),
+    (3474749660383, [2, 3, 5, 7, 11, 13]),
+    (341550071728321, [2, 3, 5, 7, 11, 13, 17]),
+    (3825123056546413051, [2, 3, 5, 7, 11, 13, 17, 19, 23]),
+    (318665857834031151167461, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37]),
+    (3317044064679887385961981, [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]),
+]
+DETERMINISTIC_MILLER_RABIN_BOUND = DETERMINISTIC_MILLER_RABIN_BASES[-1][0]
+
+# Below DETERMINISTIC_MILLER_RABIN_BOUND, trial division only needs to weed out the most common factors
+DETERMINISTIC_TRIAL_DIVISION_THRESHOLD = 256
+
+FAST_MILLER_RABIN_ROUNDS = 8
+
+def _is_prime_deterministic_miller_rabin(n: int) -> bool:
+    """Exact answer for 2 < n < DETERMINISTIC_MILLER_RABIN_BOUND with no factor up to the largest base."""
+    for bound, bases in DETERMINISTIC_MILLER_RABIN_BASES:
+        if n < bound:
+            return all(is_prime_miller_rabin(n, base) == "likely" for base in bases)
+    raise ValueError(f"n must be less than {DETERMINISTIC_MILLER_RABIN_BOUND} (n = {n})")
+
+def is_prime(n: int, profile: PrimalityProfile = DEFAULT_PRIMALITY_PROFILE) -> bool|typing.Literal["likely"]:
+    if profile == "deterministic" and n < DETERMINISTIC_MILLER_RABIN_BOUND:
+        res = is_prime_trivial(n, DETERMINISTIC_TRIAL_DIVISION_THRESHOLD)
+        if res != "unknown":
+            return res
+        return _is_prime_deterministic_miller_rabin(n)
+    
+    res = is_prime_trivial(n, TRIAL_DIVISION_THRESHOLD)
     if res != "unknown":
         return res
     
+    if profile == "fast":
+        for _ in range(FAST_MILLER_RABIN_ROUNDS):
+            if is_prime_miller_rabin(n, random.randrange(2, n - 1)) is False:
+                return False
+        return "likely"
+    
+    if profile not in ("bpsw", "deterministic"):
+        raise ValueError(f"Unknown primality profile {profile}")
+    
     res = is_prime_miller_rabin(n, 2)
     if res != "likely":
         return res
     
     return is_prime_lucas(n)
 
+def _is_prime_bpsw(n: int) -> bool|typing.Literal["likely"]:
+    return is_prime(n, "bpsw")
+
+def _is_prime_deterministic(n: int) -> bool|typing.Literal["likely"]:
+    return is_prime(n, "deterministic")
+
+def _is_prime_fast(n: int) -> bool|typing.Literal["likely"]:
+    return is_prime(n, "fast")
+
+# Top-level functions, so that worker processes can unpickle them
+_IS_PRIME_BY_PROFILE: dict[str, typing.Callable[[int], bool|typing.Literal["likely"]]] = {
+    "bpsw": _is_prime_bpsw,
+    "deterministic": _is_prime_deterministic,
+    "fast": _is_prime_fast,
+}
+
+def is_prime_many(candidates: list[int], profile: PrimalityProfile = DEFAULT_PRIMALITY_PROFILE, parallel: bool = False) -> list[bool|typing.Literal["likely"]]:
+    """
+    Returns [is_prime(n, profile) for n in candidates]. If parallel is True,
+    the candidates are spread over the shared prime worker pool
+    (see random_prime_fast.PrimeWorkerPool).
+    """
+    if profile not in _IS_PRIME_BY_PROFILE:
+        raise ValueError(f"Unknown primality profile {profile}")
+    func = _IS_PRIME_BY_PROFILE[profile]
+    if not parallel or len(candidates) <= 1:
+        return [func(n) for n in candidates]
+    # Imported here because random_prime_fast itself depends on this module
+    from ..random_prime_fast import get_prime_worker_pool
+    return get_prime_worker_pool().map(func, candidates)
+
 class TestIsPrime(unittest.TestCase):
     def test_simple(self):
         self.assertEqual( is_prime(1), False )
@@ -47,6 +133,33 @@ class TestIsPrime(unittest.TestCase):
         self.assertEqual( is_prime(343297432904879866339161144355150973070059509567481001176061191962483502185829454661824227101650238259476214615343257158801279249835524897541830644057216467876742285007045006311950780413199348787434831657770117208970524026727468710637497448491180279593592621106520452439299673213290971396558259345476917784991), "likely" )
         self.assertEqual( is_prime(41838562179304313180287602753435208833626736481873400412818460664413794794661457651796205878870553915780222204080679060252638687274555677320604793971393230367398195532776875735909753467670095554136694576100748509467858899069719978618821824498869020922875446747476235622947779129016976335104125119369671835029406881353652684059057596718034730841106309454096848254657942654678576181064181330548929446533449568773897047246620259022878051214494827722881352075259153878839236848504753278290708390108857942251588900168449021800811499015254210946309370755684662579038568220043062171393302105833953904841311700124921745058747), "likely" )
 
+class TestPrimalityProfiles(unittest.TestCase):
+    def test_deterministic(self):
+        for n in list(range(-5, 20000)) + list(range(2**40, 2**40 + 2000)):
+            self.assertEqual( is_prime(n, "deterministic") is not False, is_prime(n) is not False, f"n = {n}" )
+        # Every bound is the smallest strong pseudoprime to the bases below it
+        for bound, _bases in DETERMINISTIC_MILLER_RABIN_BASES:
+            self.assertEqual( is_prime(bound, "deterministic"), False, f"n = {bound}" )
+        self.assertEqual( is_prime(283988607550897, "deterministic"), True )
+        self.assertEqual( is_prime(2**61 - 1, "deterministic"), True )
+        self.assertEqual( is_prime(640574363347658008976065577313410602633, "deterministic"), "likely" )
+    
+    def test_fast(self):
+        self.assertEqual( is_prime(283988607550897, "fast"), "likely" )
+        self.assertEqual( is_prime(283988607550898, "fast"), False )
+        self.assertEqual( is_prime(3825123056546413051, "fast"), False )
+        self.assertEqual( is_prime(133899814796759504088957153916739612559944132263794949, "fast"), False )
+        self.assertEqual( is_prime(13, "fast"), True )
+        self.assertRaises( ValueError, is_prime, 283988607550897, "unknown" )
+    
+    def test_is_prime_many(self):
+        candidates = list(range(0, 300)) + [283988607550897, 283988607550898, 2**61 - 1]
+        for profile in typing.get_args(PrimalityProfile):
+            expected = [is_prime(n, profile) is not False for n in candidates]
+            self.assertEqual( [res is not False for res in is_prime_many(candidates, profile)], expected )
+            self.assertEqual( [res is not False for res in is_prime_many(candidates, profile, parallel=True)], expected )
+        self.assertEqual( is_prime_many([]), [] )
+
 if __name__ == '__main__':
     CHECK_TESTING()
 
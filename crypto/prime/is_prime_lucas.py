@@ -3,7 +3,7 @@ sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
 import typing
 from ..factor_out_2s import factor_out_2s
-from .lucas_sequence import find_D_P_Q_candidates, lucas_sequence, lucas_sequence_double_subscript
+from .lucas_sequence import find_D_P_Q_candidates, lucas_sequence_with_Q_power
 
 def is_prime_lucas(N: int) -> typing.Literal[False]|typing.Literal["likely"]:
     if N % 2 == 0:
@@ -14,34 +14,44 @@ def is_prime_lucas(N: int) -> typing.Literal[False]|typing.Literal["likely"]:
         DELTA_OF_N = N - JACOBI_D_N
         d, s = factor_out_2s(DELTA_OF_N)
 
+        # All the tests below only need U, V at d * 2^j, so run one Lucas chain up to d
+        # and double the subscript from there: U(2k) = U(k) V(k), V(2k) = V(k)^2 - 2 Q^k
+        chain = [lucas_sequence_with_Q_power(P, Q, d, N)]
+        def at(j: int) -> tuple[int, int]:
+            """Returns U(d * 2^j) and V(d * 2^j)."""
+            while len(chain) <= j:
+                u, v, Qk = chain[-1]
+                chain.append((u * v % N, (v * v - 2 * Qk) % N, Qk * Qk % N))
+            return chain[j][0], chain[j][1]
+
         if Q % N != 0:
             # Perform BWL test
             # https://en.wikipedia.org/wiki/Lucas_pseudoprime#Baillie-Wagstaff-Lucas_pseudoprimes
-            u = lucas_sequence(P, Q, DELTA_OF_N, N)[0]
+            u = at(s)[0] # U(DELTA_OF_N)
             if u % N != 0:
                 return False
 
         # Perform strong Lucas test
         # https://en.wikipedia.org/wiki/Lucas_pseudoprime#Strong_Lucas_pseudoprimes
-        u, v = lucas_sequence(P, Q, d, N)
+        j = 0 # d * 2^j
+        u, v = at(j)
         if u % N == 0 or v % N == 0:
             pass
         else:
             is_composite = True
-            for _r in range(1, s):
-                u, v = lucas_sequence_double_subscript(P, Q, u, v, N)
+            for r in range(1, s):
+                u, v = at(r)
                 if v % N == 0:
                     is_composite = False
                     break
-                d *= 2
+                j += 1
             if is_composite:
-                print("HERE")
                 return False
 
         if Q == 1:
             # Perform extra strong Lucas test
             # https://en.wikipedia.org/wiki/Lucas_pseudoprime#Strong_Lucas_pseudoprimes
-            u, v = lucas_sequence(P, Q, d, N)
+            u, v = at(j)
             if (
                 u % N == 0 and (v % N == 2 or v % N == N - 2)
             ) or (
@@ -50,12 +60,11 @@ def is_prime_lucas(N: int) -> typing.Literal[False]|typing.Literal["likely"]:
                 pass
             else:
                 is_composite = True
-                for _r in range(1, s - 1):
-                    u, v = lucas_sequence_double_subscript(P, Q, u, v, N)
+                for r in range(1, s - 1):
+                    u, v = at(j + r)
                     if v % N == 0:
                         is_composite = False
                         break
-                    d *= 2
                 if is_composite:
                     return False
     return "likely"
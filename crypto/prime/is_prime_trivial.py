@@ -3,42 +3,43 @@ sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
 import typing
 import unittest
+from functools import lru_cache
+from math import gcd, isqrt
 from ..CHECK_TESTING import CHECK_TESTING
-from ..int_sqrt import int_sqrt
+from .sieve import primes_up_to
+
+@lru_cache(maxsize=32)
+def _primorial(n: int) -> int:
+    """The product of all the primes p <= n."""
+    product = 1
+    for p in primes_up_to(n):
+        product *= p
+    return product
 
 def is_prime_trivial(N: int, threshold: int) -> bool|typing.Literal["unknown"]:
+    """
+    Trial division of N by 2..threshold. Returns False if a divisor is found
+    (or N is a perfect square), True if N <= threshold + 1 and has no divisor,
+    and "unknown" otherwise.
+    """
     if N <= 1:
         return False
     if N == 2:
         return True
 
-    try:
-        SQ = int_sqrt(N)
-    except OverflowError:
-        real_threshold = threshold
-        sure = False
-    else:
-        if SQ * SQ == N:
-            return False
+    SQ = isqrt(N)
+    if SQ * SQ == N:
+        return False
 
-        S = SQ + 1
-        threshold += 1
-
-        if N > threshold:
-            real_threshold = threshold
-            sure = False
-        elif S > threshold:
-            real_threshold = S
-            sure = False
-        else:
-            real_threshold = S
-            sure = True
-
-    for k in range(2, real_threshold):
-        if N % k == 0:
-            return False
+    if N > threshold + 1:
+        # Some k in [2, threshold] divides N iff a prime p <= threshold does,
+        # which a single gcd with the product of those primes tells.
+        return False if gcd(N, _primorial(threshold)) != 1 else "unknown"
 
-    return True if sure else "unknown"
+    for p in primes_up_to(SQ):
+        if N % p == 0:
+            return False
+    return True
 
 class TestIsPrimeTrivial(unittest.TestCase):
     def test(self):
@@ -53,5 +54,23 @@ class TestIsPrimeTrivial(unittest.TestCase):
         self.assertEqual( is_prime_trivial(283988607550898, 15199), False )
         self.assertEqual( is_prime_trivial(80649529218697960541660606404, 18), False ) # perfect square 283988607550898 * 283988607550898
 
+    def test_against_division_by_every_k(self):
+        def reference(N: int, threshold: int) -> bool|typing.Literal["unknown"]:
+            if N <= 1:
+                return False
+            if N == 2:
+                return True
+            if isqrt(N) ** 2 == N:
+                return False
+            sure = N <= threshold + 1
+            for k in range(2, isqrt(N) + 1 if sure else threshold + 1):
+                if N % k == 0:
+                    return False
+            return True if sure else "unknown"
+
+        for threshold in [-1, 0, 1, 2, 3, 10, 18, 100, 1000]:
+            for N in list(range(-3, 3000)) + [15199 * 15217, 2**61 - 1, 3 * (2**61 - 1), 997 * 1009 * (2**61 - 1)]:
+                self.assertEqual( is_prime_trivial(N, threshold), reference(N, threshold), f"N = {N}, threshold = {threshold}" )
+
 if __name__ == "__main__":
     CHECK_TESTING()
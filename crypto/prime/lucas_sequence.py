@@ -79,71 +79,64 @@ def lucas_sequence_increment_subscript(P: int, Q: int, Uk: int, Vk: int, N: int)
     Vkp1 = ((D * Uk) % N + (P * Vk) % N) * half_mod_N % N
     return (Ukp1, Vkp1)
 
+def lucas_sequence_with_Q_power(P: int, Q: int, k: int, N: int) -> tuple[int, int, int]:
+    """
+    Returns U(k), V(k) and Q^k, all mod N, for an odd N. Uses a left-to-right
+    binary Lucas chain, going from k to 2k with
+
+        U(2k) = U(k) V(k), V(2k) = V(k)^2 - 2 Q^k
+
+    and from k to k + 1 with
+
+        U(k+1) = (P U(k) + V(k)) / 2, V(k+1) = (D U(k) + P V(k)) / 2
+
+    where D = P^2 - 4Q is computed once, and dividing by 2 mod N means adding N to odd values first.
+    """
+    # https://en.wikipedia.org/wiki/Lucas_pseudoprime#Implementing_a_Lucas_probable_prime_test
+    if N % 2 == 0:
+        raise ValueError(f"N must be odd (N = {N})")
+    if k < 0:
+        raise ValueError(f"k must be non-negative (k = {k})")
+    P %= N
+    Q %= N
+    D = (P * P - 4 * Q) % N
+
+    U, V, Qk = 0, 2 % N, 1 % N
+    for bit in bin(k)[2:]:
+        U = U * V % N
+        V = (V * V - 2 * Qk) % N
+        Qk = Qk * Qk % N
+        if bit == "1":
+            U, V = P * U + V, D * U + P * V
+            if U & 1:
+                U += N
+            if V & 1:
+                V += N
+            U = (U >> 1) % N
+            V = (V >> 1) % N
+            Qk = Qk * Q % N
+    return U, V, Qk
+
+def _lucas_sequence_any_modulus(P: int, Q: int, k: int, N: int) -> tuple[int, int]:
+    """Same as lucas_sequence(), without any division, so that N may be even."""
+    # Ladder on (U(k), U(k+1)) with U(2k) = U(k) (2 U(k+1) - P U(k)) and U(2k+1) = U(k+1)^2 - Q U(k)^2
+    U0, U1 = 0, 1 % N
+    for bit in bin(k)[2:]:
+        U2k = U0 * (2 * U1 - P * U0) % N
+        U2k_plus_1 = (U1 * U1 - Q * U0 * U0) % N
+        if bit == "1":
+            U0, U1 = U2k_plus_1, (P * U2k_plus_1 - Q * U2k) % N
+        else:
+            U0, U1 = U2k, U2k_plus_1
+    return U0, (2 * U1 - P * U0) % N # V(k) = 2 U(k+1) - P U(k)
+
 def lucas_sequence(P: int, Q: int, k: int, N: int) -> tuple[int, int]:
     """Returns U(k) and V(k), both mod N."""
     # https://en.wikipedia.org/wiki/Lucas_sequence#Explicit_expressions
-
-    # Too much recursion (see non-trivial case below) could cause stack overflow.
-    # We therefore increase the recursion limit.
-
-    old_recursion_limit = sys.getrecursionlimit()
-    if k > 1000:
-        sys.setrecursionlimit(42000)
-    try:
-        # THE FOLLOWING CODE IS FOUND TO BE UNRELIABLE DUE TO FLOATING POINT ERRORS
-        # (although SageMath does not suffer from this issue!!!)
-
-        # D = P*P - 4*Q
-        # sqrtD = int_sqrt(D)
-        # a = (P + sqrtD) / 2
-        # b = (P - sqrtD) / 2
-
-        # if k * log2(abs(a)) < 60 and k * log2(abs(b)) < 60:
-        #     Uk = round((a ** k - b ** k) / sqrtD) % N
-        #     Vk = round(a ** k + b ** k) % N
-
-        # else:
-        #     # from now on, same as the non-trivial case below
-
-        # WE THEREFORE USE THE FOLLOWING CODE INSTEAD, DIRECTLY UTILIZING THE
-        # RESULTS FROM https://en.wikipedia.org/wiki/Lucas_sequence#Examples
-        if k == 0:
-            return 0, 2 % N
-        elif k == 1:
-            return 1, P % N
-        elif k == 2:
-            return P, (modpower(P, 2, N) - 2 * Q) % N
-        elif k == 3:
-            return (modpower(P, 2, N) - Q) % N, (modpower(P, 3, N) - 3 * P * Q) % N
-        elif k == 4:
-            return (modpower(P, 2, N) - 2 * Q % N) * P % N, ((modpower(P, 4, N) - 4 * modpower(P, 2, N) * Q) % N + 2 * modpower(Q, 2, N)) % N
-        elif k == 5 or k == 6:
-            P2 = modpower(P, 2, N)
-            P3 = P2 * P % N
-            P4 = P3 * P % N
-            P5 = P4 * P % N
-
-            Q2 = modpower(Q, 2, N)
-
-            if k == 5:
-                return (P4 - 3 * (P2 * Q % N) % N + Q2) % N, (P5 - 5 * (P3 * Q % N) % N + 5 * (P * Q2 % N)) % N
-            
-            elif k == 6:
-                P6 = P5 * P % N
-                Q3 = Q2 * Q % N
-                return (P5 - 4 * (P3 * Q % N) % N + 3 * (P * Q2 % N) % N) % N, (P6 - 6 * (P4 * Q % N) % N + 9 * (P2 * Q2 % N) % N - 2 * Q3) % N
-        else:
-            # Non-trivial case
-            u, v = lucas_sequence(P, Q, k // 2, N)
-            u, v = lucas_sequence_double_subscript(P, Q, u, v, N)
-            if k % 2 == 1:
-                u, v = lucas_sequence_increment_subscript(P, Q, u, v, N)
-            Uk = u
-            Vk = v
-        
-        return (Uk, Vk)
-    finally:
-        sys.setrecursionlimit(old_recursion_limit)
+    if N % 2 == 1:
+        U, V, _Qk = lucas_sequence_with_Q_power(P, Q, k, N)
+        return U, V
+    return _lucas_sequence_any_modulus(P, Q, k, N)
 
 class TestLucasSequence(unittest.TestCase):
     def test_trivial(self):
@@ -160,6 +153,19 @@ class TestLucasSequence(unittest.TestCase):
 
         self.assertEqual( lucas_sequence(5, -7, 4, 78), (39, 19) )
     
+    def test_against_recurrence(self):
+        for N in [1, 2, 3, 7, 11, 78, 1000, 9999999, 2**61 - 1]:
+            for P, Q in [(1, -1), (5, 3), (5, -7), (3, 1), (7, 11)]:
+                u, u_next = 0, 1
+                v, v_next = 2, P
+                for k in range(200):
+                    self.assertEqual( lucas_sequence(P, Q, k, N), (u % N, v % N), f"P = {P}, Q = {Q}, k = {k}, N = {N}" )
+                    if N % 2 == 1:
+                        self.assertEqual( lucas_sequence_with_Q_power(P, Q, k, N), (u % N, v % N, pow(Q, k, N)) )
+                    u, u_next = u_next, P * u_next - Q * u
+                    v, v_next = v_next, P * v_next - Q * v
+        self.assertRaises( ValueError, lucas_sequence_with_Q_power, 1, -1, 10, 78 )
+
     def test_both_double_and_add(self):
         for k in range(5, 100):
             for n in [3, 7, 11]:
@@ -1,14 +1,79 @@
 import sys
 sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
+import typing
+import unittest
+from typing import Iterator
 from .is_prime import is_prime
+from .is_prime_miller_rabin import is_prime_miller_rabin
+from .is_prime_lucas import is_prime_lucas
+from .sieve import primes_up_to
 from ..CHECK_TESTING import CHECK_TESTING
 from .boundaries import compute_lbound_ubound
 from random import randrange
 
-def random_prime(lbound: int|str, ubound: int|str) -> int:
+# "random": test independent random integers with is_prime()
+# "sieve": sieve an interval from a random start, so that only the survivors are tested
+RandomPrimeMode = typing.Literal["random", "sieve"]
+
+# Candidates of the "sieve" mode have no prime factor up to this bound
+SIEVE_PRIMES_BOUND = 2**16
+
+_sieve_primes: list[int]|None = None
+
+def _get_sieve_primes() -> list[int]:
+    global _sieve_primes
+    if _sieve_primes is None:
+        _sieve_primes = primes_up_to(SIEVE_PRIMES_BOUND)[1:] # odd primes only
+    return _sieve_primes
+
+def sieved_prime_candidates(lbound: int, ubound: int) -> Iterator[int]:
+    """
+    Yields odd integers of [lbound, ubound) without any prime factor up to
+    SIEVE_PRIMES_BOUND, forever. Each round picks a random odd start and
+    sieves the interval after it by all the small primes at once: one bignum
+    modulo per small prime for the whole interval, instead of trial division
+    of every candidate. lbound must be greater than SIEVE_PRIMES_BOUND.
+
+    Like any incremental search, primes right after a long prime gap are
+    slightly more likely to be picked than others.
+    """
+    if lbound <= SIEVE_PRIMES_BOUND:
+        raise ValueError(f"lbound must be greater than {SIEVE_PRIMES_BOUND} (lbound = {lbound})")
+    sieve_primes = _get_sieve_primes()
+    # About 2 ln(N) / ln(2) odd numbers, i.e. a few primes per interval on average
+    interval_length = 2 * ubound.bit_length()
+
+    while True:
+        start = randrange(lbound, ubound) | 1
+        if start >= ubound:
+            continue
+        length = min(interval_length, (ubound - 1 - start) // 2 + 1)
+        # is_candidate[i] tells whether start + 2i survives
+        is_candidate = bytearray([1]) * length
+        for p in sieve_primes:
+            # Smallest i with start + 2i = 0 mod p, using 2^(-1) = (p + 1) / 2 mod p
+            i = (p - start % p) * ((p + 1) >> 1) % p
+            if i < length:
+                is_candidate[i::p] = bytes(len(range(i, length, p)))
+        for i in range(length):
+            if is_candidate[i]:
+                yield start + 2 * i
+
+def _is_prime_sieved(n: int) -> bool:
+    """is_prime() for n > SIEVE_PRIMES_BOUND known to have no small prime factor: trial division would find nothing."""
+    return is_prime_miller_rabin(n, 2) == "likely" and is_prime_lucas(n) != False
+
+def random_prime(lbound: int|str, ubound: int|str, mode: RandomPrimeMode = "random") -> int:
     lbound, ubound = compute_lbound_ubound(lbound, ubound)
 
+    if mode == "sieve" and lbound > SIEVE_PRIMES_BOUND:
+        for n in sieved_prime_candidates(lbound, ubound):
+            if _is_prime_sieved(n):
+                return n
+    elif mode not in ("random", "sieve"):
+        raise ValueError(f"Unknown mode {mode}")
+
     n = randrange(lbound, ubound)
     while not is_prime(n):
         n = randrange(lbound, ubound)
@@ -26,12 +91,23 @@ def random_prime(lbound: int|str, ubound: int|str) -> int:
     #     n -= 2
     # raise ValueError(f"Could not find a prime between {lbound} and {ubound}")
 
-def random_prime_with_max_num_iters(lbound: int|str, ubound: int|str, max_iters: int) -> int:
+def random_prime_with_max_num_iters(lbound: int|str, ubound: int|str, max_iters: int, mode: RandomPrimeMode = "random") -> int:
+    """In "sieve" mode, only the candidates surviving the sieve count as iterations."""
     lbound, ubound = compute_lbound_ubound(lbound, ubound, lbound_min=2)
 
     if ubound <= 2:
         return 2
     
+    if mode == "sieve" and lbound > SIEVE_PRIMES_BOUND:
+        for n in sieved_prime_candidates(lbound, ubound):
+            if _is_prime_sieved(n):
+                return n
+            max_iters -= 1
+            if max_iters == 0:
+                raise StopIteration
+    elif mode not in ("random", "sieve"):
+        raise ValueError(f"Unknown mode {mode}")
+    
     while True:
         n = randrange(lbound, ubound)
         if is_prime(n):
@@ -40,6 +116,26 @@ def random_prime_with_max_num_iters(lbound: int|str, ubound: int|str, max_iters:
         if max_iters == 0:
             raise StopIteration
 
+class TestRandomPrime(unittest.TestCase):
+    def test_sieved_prime_candidates(self):
+        lbound, ubound = 2**40, 2**40 + 10**6
+        candidates = sieved_prime_candidates(lbound, ubound)
+        for _ in range(2000):
+            n = next(candidates)
+            self.assertTrue(lbound <= n < ubound)
+            self.assertTrue(all(n % p != 0 for p in [2] + _get_sieve_primes()), f"n = {n}")
+        self.assertRaises(ValueError, next, sieved_prime_candidates(1000, 2**20))
+
+    def test_modes(self):
+        for mode in typing.get_args(RandomPrimeMode):
+            for lbound, ubound in [(2, 3), (2, 100), (10**5, 10**5 + 100), ("64b", "65b"), ("512b", "513b")]:
+                p = random_prime(lbound, ubound, mode)
+                lo, hi = compute_lbound_ubound(lbound, ubound)
+                self.assertTrue(lo <= p < hi and is_prime(p), f"p = {p}, mode = {mode}")
+                p = random_prime_with_max_num_iters(lbound, ubound, 10**6, mode)
+                self.assertTrue(is_prime(p), f"p = {p}, mode = {mode}")
+        self.assertRaises(ValueError, random_prime, 2, 100, "unknown")
+
 if __name__ == "__main__":
     CHECK_TESTING()
 
@@ -0,0 +1,161 @@
+import sys
+sys.set_int_max_str_digits(2147483647) # 2^31 - 1
+
+import threading
+import unittest
+from array import array
+from bisect import bisect_right
+from itertools import compress
+from math import isqrt
+from typing import Iterator
+from ..CHECK_TESTING import CHECK_TESTING
+
+# Number of integers sieved at once by the segmented sieve
+SIEVE_SEGMENT_SIZE = 1 << 16
+
+# The table of small primes is sieved at least up to this bound the first time it is used...
+SMALL_PRIMES_TABLE_MIN_BOUND = 1 << 16
+# ...and grows (by doubling) at most up to this one: about 1.1M primes, 8 bytes each.
+# Past it, primes are sieved on the fly instead of being kept.
+SMALL_PRIMES_TABLE_MAX_BOUND = 1 << 24
+
+# From this bound on, next_prime() no longer sieves completely (that would need
+# all the primes up to sqrt(n)), but tests the survivors of the table primes with is_prime().
+NEXT_PRIME_SIEVE_LIMIT = SMALL_PRIMES_TABLE_MAX_BOUND ** 2
+
+_small_primes = array("Q")
+_small_primes_bound = 1 # every prime p <= _small_primes_bound is in _small_primes
+_small_primes_lock = threading.Lock()
+
+def _sieve_segment(lbound: int, ubound: int, base_primes: Iterator[int]|list[int]) -> bytearray:
+    """
+    Returns flags for the integers of [lbound, ubound): flags[i] is 0 iff
+    lbound + i < 2 or lbound + i is a proper multiple of one of base_primes.
+    """
+    flags = bytearray([1]) * (ubound - lbound)
+    for n in range(lbound, min(2, ubound)):
+        flags[n - lbound] = 0
+    for p in base_primes:
+        start = max(p * p, (lbound + p - 1) // p * p)
+        if start >= ubound:
+            continue
+        flags[start - lbound::p] = bytes(len(range(start - lbound, ubound - lbound, p)))
+    return flags
+
+def _grow_small_primes(n: int) -> None:
+    """Makes the table cover at least min(n, SMALL_PRIMES_TABLE_MAX_BOUND)."""
+    global _small_primes_bound
+    if n <= _small_primes_bound or _small_primes_bound >= SMALL_PRIMES_TABLE_MAX_BOUND:
+        return
+    with _small_primes_lock:
+        if _small_primes_bound == 1:
+            # Bootstrap with a plain sieve
+            bound = SMALL_PRIMES_TABLE_MIN_BOUND
+            flags = _sieve_segment(0, bound + 1, [])
+            for k in range(2, isqrt(bound) + 1):
+                if flags[k]:
+                    flags[k * k::k] = bytes(len(range(k * k, bound + 1, k)))
+            _small_primes.extend(array("Q", compress(range(bound + 1), flags)))
+            _small_primes_bound = bound
+        # The table covers sqrt(bound) by far, so it sieves its own extension.
+        # Readers may run meanwhile: the table is only ever extended, by one whole array at once.
+        bound = min(max(n, 2 * _small_primes_bound), SMALL_PRIMES_TABLE_MAX_BOUND)
+        if bound > _small_primes_bound:
+            _small_primes.extend(array("Q", segmented_sieve(_small_primes_bound + 1, bound + 1)))
+            _small_primes_bound = bound
+
+def segmented_sieve(lbound: int, ubound: int) -> Iterator[int]:
+    """
+    Yields the primes of [lbound, ubound) in increasing order, sieving
+    SIEVE_SEGMENT_SIZE integers at a time, so that memory stays in
+    O(sqrt(ubound) + SIEVE_SEGMENT_SIZE) whatever the length of the interval.
+    """
+    lbound = max(lbound, 2)
+    if lbound >= ubound:
+        return
+    root = isqrt(ubound - 1)
+    _grow_small_primes(root)
+    if _small_primes_bound >= root:
+        base_primes = _small_primes[:bisect_right(_small_primes, root)]
+    else:
+        base_primes = array("Q", _small_primes)
+        base_primes.extend(segmented_sieve(_small_primes_bound + 1, root + 1))
+
+    for start in range(lbound, ubound, SIEVE_SEGMENT_SIZE):
+        end = min(start + SIEVE_SEGMENT_SIZE, ubound)
+        yield from compress(range(start, end), _sieve_segment(start, end, base_primes))
+
+def primes_up_to(n: int) -> list[int]:
+    """Returns all the primes p <= n."""
+    _grow_small_primes(n)
+    if n <= _small_primes_bound:
+        return _small_primes[:bisect_right(_small_primes, n)].tolist()
+    return _small_primes.tolist() + list(segmented_sieve(_small_primes_bound + 1, n + 1))
+
+def prime_pi(n: int) -> int:
+    """Returns the number of primes p <= n."""
+    _grow_small_primes(n)
+    if n <= _small_primes_bound:
+        return bisect_right(_small_primes, n)
+    return len(_small_primes) + sum(1 for _ in segmented_sieve(_small_primes_bound + 1, n + 1))
+
+def next_prime(n: int) -> int:
+    """Returns the smallest prime p > n."""
+    if n < SMALL_PRIMES_TABLE_MAX_BOUND:
+        _grow_small_primes(n + 1)
+        i = bisect_right(_small_primes, n)
+        if i < len(_small_primes):
+            return _small_primes[i]
+
+    start = max(n + 1, 2)
+    while start < NEXT_PRIME_SIEVE_LIMIT:
+        end = min(start + SIEVE_SEGMENT_SIZE, NEXT_PRIME_SIEVE_LIMIT)
+        for p in segmented_sieve(start, end):
+            return p
+        start = end
+
+    # Imported here, since is_prime depends on this module through is_prime_trivial
+    from .is_prime import is_prime
+    base_primes = primes_up_to(SMALL_PRIMES_TABLE_MIN_BOUND)
+    while True:
+        end = start + SIEVE_SEGMENT_SIZE
+        for p in compress(range(start, end), _sieve_segment(start, end, base_primes)):
+            if is_prime(p):
+                return p
+        start = end
+
+class TestSieve(unittest.TestCase):
+    def test_primes_up_to(self):
+        self.assertEqual( primes_up_to(-5), [] )
+        self.assertEqual( primes_up_to(1), [] )
+        self.assertEqual( primes_up_to(2), [2] )
+        self.assertEqual( primes_up_to(30), [2, 3, 5, 7, 11, 13, 17, 19, 23, 29] )
+        self.assertEqual( primes_up_to(97)[-1], 97 )
+        self.assertEqual( len(primes_up_to(15199)), 1775 )
+        self.assertEqual( primes_up_to(15199)[-1], 15199 )
+
+    def test_segmented_sieve(self):
+        def naive(lbound: int, ubound: int) -> list[int]:
+            return [n for n in range(max(lbound, 2), ubound) if all(n % k != 0 for k in range(2, isqrt(n) + 1))]
+
+        for lbound, ubound in [(0, 100), (2, 3), (10, 10), (90, 97), (90, 98), (1000, 3000), (SIEVE_SEGMENT_SIZE - 50, SIEVE_SEGMENT_SIZE + 50)]:
+            self.assertEqual( list(segmented_sieve(lbound, ubound)), naive(lbound, ubound), f"lbound = {lbound}, ubound = {ubound}" )
+        self.assertEqual( list(segmented_sieve(10**12, 10**12 + 100)), [10**12 + 39, 10**12 + 61, 10**12 + 63, 10**12 + 91] )
+
+    def test_prime_pi(self):
+        self.assertEqual( prime_pi(1), 0 )
+        self.assertEqual( prime_pi(2), 1 )
+        self.assertEqual( prime_pi(100), 25 )
+        self.assertEqual( prime_pi(10**6), 78498 )
+
+    def test_next_prime(self):
+        self.assertEqual( next_prime(-10), 2 )
+        self.assertEqual( next_prime(2), 3 )
+        self.assertEqual( next_prime(13), 17 )
+        self.assertEqual( next_prime(15198), 15199 )
+        self.assertEqual( next_prime(10**12), 10**12 + 39 )
+        self.assertEqual( next_prime(2**64), 2**64 + 13 )
+        self.assertEqual( next_prime(2**127 - 2), 2**127 - 1 )
+
+if __name__ == "__main__":
+    CHECK_TESTING()
@@ -0,0 +1,297 @@
+import os
+import json
+import atexit
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+try:
+    import fcntl
+except ImportError: # not on Windows, where the reservoir is not persisted
+    fcntl = None
+
+from .random_prime_fast import Output, random_prime_fast_with_fact_of_p_minus_1
+from .prime.boundaries import compute_lbound_ubound
+
+from .CHECK_TESTING import CHECK_TESTING
+import unittest
+
+# Number of primes kept ready for each reserved kind of prime
+PRIME_RESERVOIR_CAPACITY = 8
+
+# Set this environment variable to a file path to persist the default reservoir
+# across restarts. Primes are removed from the file as soon as they are taken,
+# under a lock shared by all the processes using the file (path + ".lock").
+PRIME_RESERVOIR_PATH_ENV = "CRYPTOENGINE_PRIME_RESERVOIR"
+
+# Set this environment variable to 1 so that the default reservoir reserves
+# every kind of prime taken from it, e.g. the key sizes of RSA and ElGamal:
+# the first key is generated on the spot, the next ones are ready.
+PRIME_RESERVOIR_RESERVE_TAKEN_ENV = "CRYPTOENGINE_PRIME_RESERVOIR_RESERVE_TAKEN"
+
+# Seconds the background thread waits before trying again after an unexpected error
+PRIME_RESERVOIR_RETRY_SECONDS = 10.0
+
+_logger = logging.getLogger(__name__)
+
+# lbound, ubound, want_p_congruent_to_3_mod_4
+PrimeKind = tuple[int, int, bool]
+
+def _prime_kind(lbound: int|str, ubound: int|str, want_p_congruent_to_3_mod_4: bool) -> PrimeKind:
+    lbound, ubound = compute_lbound_ubound(lbound, ubound)
+    return lbound, ubound, want_p_congruent_to_3_mod_4
+
+class PrimeReservoir:
+    """
+    Primes generated ahead of time by a background thread, so that key
+    generation can take them with near-zero latency.
+
+    Each kind of prime passed to reserve() gets a queue of at most capacity
+    primes (with the factorization of p - 1), refilled in the background
+    through random_prime_fast. Taking a kind that is empty, or was never
+    reserved, just generates the primes on the spot, and reserves it if
+    reserve_taken is True. If path is given, the queues live in that file,
+    so that a restarted process starts warm: every access re-reads it under
+    an exclusive lock, so that processes sharing it never take the same
+    primes. The file is not used on platforms without fcntl.
+    """
+
+    def __init__(self, capacity: int = PRIME_RESERVOIR_CAPACITY, path: str|None = None, reserve_taken: bool = False) -> None:
+        self.capacity = capacity
+        self.path = path
+        self.reserve_taken = reserve_taken
+        self._condition = threading.Condition()
+        self._queues: dict[PrimeKind, list[Output]] = {}
+        self._reserved: list[PrimeKind] = []
+        self._thread: threading.Thread|None = None
+        self._stopping = False
+
+    def reserve(self, lbound: int|str, ubound: int|str, want_p_congruent_to_3_mod_4: bool = False) -> None:
+        """Keeps primes in [lbound, ubound) ready from now on, and starts the background thread if needed."""
+        kind = _prime_kind(lbound, ubound, want_p_congruent_to_3_mod_4)
+        with self._condition:
+            if kind not in self._reserved:
+                self._reserved.append(kind)
+            self._stopping = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._fill, name="PrimeReservoir", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def take_with_fact_of_p_minus_1(self, lbound: int|str, ubound: int|str, takes: int, want_p_congruent_to_3_mod_4: bool = False) -> list[Output]:
+        """Same as random_prime_fast_with_fact_of_p_minus_1(), but serves reserved primes first."""
+        kind = _prime_kind(lbound, ubound, want_p_congruent_to_3_mod_4)
+        with self._condition:
+            with self._synced(write=True):
+                queue = self._queues.get(kind, [])
+                outputs = queue[:takes]
+                del queue[:takes]
+            if len(outputs) > 0:
+                self._condition.notify_all() # wake up the background thread to refill
+        if len(outputs) < takes:
+            outputs.extend(random_prime_fast_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, takes=takes - len(outputs), want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4))
+        if self.reserve_taken:
+            # After generating, so that the background thread does not compete with the caller
+            self.reserve(lbound, ubound, want_p_congruent_to_3_mod_4)
+        return outputs
+
+    def take(self, lbound: int|str, ubound: int|str, takes: int, want_p_congruent_to_3_mod_4: bool = False) -> list[int]:
+        """Same as random_prime_fast(), but serves reserved primes first."""
+        return [p for p, _ in self.take_with_fact_of_p_minus_1(lbound, ubound, takes, want_p_congruent_to_3_mod_4)]
+
+    def size(self, lbound: int|str, ubound: int|str, want_p_congruent_to_3_mod_4: bool = False) -> int:
+        kind = _prime_kind(lbound, ubound, want_p_congruent_to_3_mod_4)
+        with self._condition, self._synced(write=False):
+            return len(self._queues.get(kind, []))
+
+    def stop(self, timeout: float|None = None) -> None:
+        """Stops the background thread after its current batch. Primes already generated are kept."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _next_kind_to_fill(self) -> PrimeKind|None:
+        missing = [(len(self._queues.get(kind, [])), kind) for kind in self._reserved if len(self._queues.get(kind, [])) < self.capacity]
+        return min(missing)[1] if len(missing) > 0 else None
+
+    def _fill(self) -> None:
+        while True:
+            with self._condition:
+                with self._synced(write=False):
+                    kind = self._next_kind_to_fill()
+                while not self._stopping and kind is None:
+                    self._condition.wait()
+                    with self._synced(write=False):
+                        kind = self._next_kind_to_fill()
+                if self._stopping or kind is None:
+                    return
+
+            lbound, ubound, want_p_congruent_to_3_mod_4 = kind
+            try:
+                outputs = random_prime_fast_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, takes=1, want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4)
+            except RuntimeError:
+                return # the worker pool was shut down, e.g. at exit
+            except Exception:
+                # Keep the reservoir alive: takes still generate on the spot meanwhile
+                _logger.exception("Could not generate a reserved prime in [%d, %d)", lbound, ubound)
+                with self._condition:
+                    if not self._stopping:
+                        self._condition.wait(PRIME_RESERVOIR_RETRY_SECONDS)
+                continue
+
+            with self._condition, self._synced(write=True):
+                self._queues.setdefault(kind, []).extend(outputs)
+
+    @contextmanager
+    def _synced(self, write: bool) -> Iterator[None]:
+        """
+        Runs the body on the queues of the file, if any: read again under its
+        lock, then written back before releasing it if write. Another process
+        may have taken or added primes since the last access. To be called
+        with self._condition held.
+        """
+        if self.path is None or fcntl is None:
+            yield
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            lock = open(self.path + ".lock", "a")
+        except OSError:
+            yield # the queues just stay in memory
+            return
+        with lock: # closing it releases the lock
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            self._load()
+            yield
+            if write:
+                self._save()
+
+    def _load(self) -> None:
+        self._queues = {}
+        try:
+            with open(self.path, "r") as f:
+                d = json.load(f)
+            for entry in d["primes"]:
+                kind = (int(entry["lbound"], 16), int(entry["ubound"], 16), bool(entry["want_p_congruent_to_3_mod_4"]))
+                output = (int(entry["p"], 16), {int(base, 16): int(exponent) for base, exponent in entry["fact_of_p_minus_1"].items()})
+                self._queues.setdefault(kind, []).append(output)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self._queues.clear() # a missing or corrupted file just means a cold start
+
+    def _save(self) -> None:
+        assert self.path is not None
+        entries = [
+            {
+                "lbound": hex(lbound),
+                "ubound": hex(ubound),
+                "want_p_congruent_to_3_mod_4": want_p_congruent_to_3_mod_4,
+                "p": hex(p),
+                "fact_of_p_minus_1": {hex(base): exponent for base, exponent in fact_of_p_minus_1.items()},
+            }
+            for (lbound, ubound, want_p_congruent_to_3_mod_4), queue in self._queues.items()
+            for p, fact_of_p_minus_1 in queue
+        ]
+        # Persisting is best-effort: failing to write the file must never break the caller.
+        # mkstemp creates the file readable by the owner only, which matters since these primes become private keys.
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"primes": entries}, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+
+_prime_reservoir = PrimeReservoir(
+    path=os.environ.get(PRIME_RESERVOIR_PATH_ENV) or None,
+    reserve_taken=os.environ.get(PRIME_RESERVOIR_RESERVE_TAKEN_ENV) == "1",
+)
+atexit.register(_prime_reservoir.stop, 1.0)
+
+def get_prime_reservoir() -> PrimeReservoir:
+    """
+    The reservoir used by the key generators. Nothing is generated in the
+    background until reserve() is called, or a key is generated with
+    CRYPTOENGINE_PRIME_RESERVOIR_RESERVE_TAKEN=1.
+    """
+    return _prime_reservoir
+
+from .prime.is_prime import is_prime
+class TestPrimeReservoir(unittest.TestCase):
+    def test_take_without_reserve(self):
+        reservoir = PrimeReservoir()
+        for p in reservoir.take("64b", "65b", takes=2):
+            self.assertTrue(is_prime(p))
+            self.assertGreaterEqual(p, 2**64)
+
+    def test_background_fill_and_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reservoir.json")
+            reservoir = PrimeReservoir(capacity=3, path=path)
+            reservoir.reserve("64b", "65b", want_p_congruent_to_3_mod_4=True)
+            while reservoir.size("64b", "65b", want_p_congruent_to_3_mod_4=True) < 3:
+                threading.Event().wait(0.05)
+            reservoir.stop()
+
+            # A new reservoir on the same file starts warm
+            restarted = PrimeReservoir(capacity=3, path=path)
+            self.assertEqual(restarted.size(2**64, 2**65, want_p_congruent_to_3_mod_4=True), 3)
+            self.assertEqual(restarted.size("64b", "65b"), 0)
+            outputs = restarted.take_with_fact_of_p_minus_1("64b", "65b", takes=2, want_p_congruent_to_3_mod_4=True)
+            for p, fact_of_p_minus_1 in outputs:
+                self.assertTrue(is_prime(p))
+                self.assertEqual(p % 4, 3)
+                product = 1
+                for base, exponent in fact_of_p_minus_1.items():
+                    product *= base ** exponent
+                self.assertEqual(product, p - 1)
+
+            # Taken primes are gone from the file, so they are never handed out twice
+            self.assertEqual(PrimeReservoir(capacity=3, path=path).size("64b", "65b", want_p_congruent_to_3_mod_4=True), 1)
+
+    def test_shared_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reservoir.json")
+            reservoir = PrimeReservoir(capacity=3, path=path)
+            reservoir.reserve("64b", "65b")
+            while reservoir.size("64b", "65b") < 3:
+                threading.Event().wait(0.05)
+            reservoir.stop()
+
+            # Two processes (or instances) on the same file, both warm, each taking 2 of the 3 primes
+            first, second = PrimeReservoir(path=path), PrimeReservoir(path=path)
+            self.assertEqual((first.size("64b", "65b"), second.size("64b", "65b")), (3, 3))
+            taken = first.take("64b", "65b", takes=2)
+            taken += second.take("64b", "65b", takes=2)
+            self.assertEqual(len(set(taken)), 4)
+            self.assertEqual(PrimeReservoir(path=path).size("64b", "65b"), 0)
+
+    def test_reserve_taken(self):
+        reservoir = PrimeReservoir(capacity=2, reserve_taken=True)
+        self.assertEqual(len(reservoir.take("64b", "65b", takes=1)), 1)
+        while reservoir.size("64b", "65b") < 2:
+            threading.Event().wait(0.05)
+        reservoir.stop()
+        # By default, taking starts nothing in the background
+        reservoir = PrimeReservoir(capacity=2)
+        reservoir.take("64b", "65b", takes=1)
+        self.assertIsNone(reservoir._thread)
+
+    def test_corrupted_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reservoir.json")
+            with open(path, "w") as f:
+                f.write("{not json")
+            self.assertEqual(PrimeReservoir(path=path).size("64b", "65b"), 0)
+
+if __name__ == "__main__":
+    CHECK_TESTING()
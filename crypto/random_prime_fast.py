@@ -9,69 +9,196 @@ MAX_NUM_ITERS = 160
 # the maximum number of iterations is about 1000.
 MAX_NUM_ITERS_BASIC = 1000
 
+# Number of times a task looks whether it was cancelled over its iterations: when the call that
+# started it has returned, it stops within a fraction of a second instead of running for seconds
+WORKER_CANCEL_CHECKS = 16
+
+import os
 import sys
+import atexit
+import threading
 import multiprocessing as mp
+import multiprocessing.pool
+from typing import Any, Callable, Hashable
 from .CHECK_TESTING import CHECK_TESTING
 
 Input = tuple[int|str, int|str] # lbound, ubound
+
+# The workers start from a fresh single-threaded process, not a fork of this one, whose
+# threads (the result handlers of the pool, the prime reservoir) could hold locks
+_mp_context = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
 Output = tuple[int, dict[int, int]]
 
-def _worker(lbound: int|str, ubound: int|str, want_p_congruent_to_3_mod_4: bool) -> Output:
-    try:
-        return random_prime_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, max_iters=MAX_NUM_ITERS, want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4)
-    except StopIteration:
-        return 0, {}
+# In a worker process, the cancellation counter of the pool that started it
+_worker_cancel_epoch: Any = None
+
+def _init_worker(cancel_epoch: Any) -> None:
+    global _worker_cancel_epoch
+    _worker_cancel_epoch = cancel_epoch
+
+def worker_task_cancelled(epoch: int|None) -> bool:
+    """
+    For a task started by PrimeWorkerPool.take(..., cancellable=True), which
+    gets epoch as its last argument: whether the call that started it has
+    returned, so that the task should give up. Always False outside of the
+    workers, or with epoch None.
+    """
+    return epoch is not None and _worker_cancel_epoch is not None and _worker_cancel_epoch.value != epoch
+
+class PrimeWorkerPool:
+    """
+    A long-lived pool of worker processes shared by every random_prime_fast*() call.
+
+    The processes are only started on first use, and are stopped by shutdown()
+    or when the interpreter exits. Each call keeps one task per process in
+    flight and takes the primes as soon as any worker finds one. Extra primes
+    found meanwhile are kept for the next call with the same arguments, and
+    the tasks still running when a cancellable call returns stop, so that
+    the next calls do not wait behind them.
+    """
+
+    def __init__(self, processes: int|None = None) -> None:
+        self.processes = processes or mp.cpu_count()
+        self._pool: mp.pool.Pool|None = None
+        self._pid: int|None = None
+        self._condition = threading.Condition()
+        self._found: dict[Hashable, list[Any]] = {}
+        self._in_flight: dict[Hashable, int] = {}
+        self._errors: dict[Hashable, BaseException] = {}
+        self._atexit_registered = False
+        # Only written by this process, under self._condition: no need for a lock
+        self._cancel_epoch = _mp_context.RawValue("q", 0)
+
+    def _get_pool(self) -> mp.pool.Pool:
+        # A forked child must not reuse the workers of its parent
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = _mp_context.Pool(processes=self.processes, initializer=_init_worker, initargs=(self._cancel_epoch,))
+            self._pid = os.getpid()
+            self._found.clear()
+            self._in_flight.clear()
+            self._errors.clear()
+            if not self._atexit_registered:
+                atexit.register(self.shutdown)
+                self._atexit_registered = True
+        return self._pool
+
+    def shutdown(self) -> None:
+        """Stops the worker processes. The pool starts again on the next call."""
+        with self._condition:
+            pool = self._pool
+            self._pool = None
+            self._found.clear()
+            self._in_flight.clear()
+            self._errors.clear()
+            self._condition.notify_all()
+        if pool is not None and self._pid == os.getpid():
+            pool.terminate()
+            pool.join()
+
+    def take(self, func: Callable[..., Any], args: tuple[Any, ...], takes: int, is_found: Callable[[Any], bool], on_output: Callable[[Any], None]|None = None, cancellable: bool = False) -> list[Any]:
+        """
+        Runs func(*args) on the workers until takes of the results satisfy is_found, and returns them in the order they were found.
+        on_output is called with every result, found or not, from the thread of the pool that collects them,
+        until the call returns: the results of the tasks still running then are not passed to it.
+        With cancellable, func gets one more argument, for worker_task_cancelled() to tell the tasks still
+        running that the call has returned. This also cancels the tasks of the other calls running meanwhile,
+        which are then started again.
+        """
+        key = (func.__qualname__, args)
+        results: list[Any] = []
+        done = False
+        with self._condition:
+            pool = self._get_pool()
+
+            def on_result(output: Any) -> None:
+                with self._condition:
+                    if self._pool is not pool:
+                        return
+                    self._in_flight[key] -= 1
+                    if on_output is not None and not done:
+                        on_output(output)
+                    if is_found(output):
+                        self._found.setdefault(key, []).append(output)
+                    self._condition.notify_all()
+
+            def on_error(error: BaseException) -> None:
+                with self._condition:
+                    if self._pool is not pool:
+                        return
+                    self._in_flight[key] -= 1
+                    self._errors[key] = error
+                    self._condition.notify_all()
+
+            try:
+                while len(results) < takes:
+                    if self._pool is not pool:
+                        raise RuntimeError("The prime worker pool was shut down while waiting for results")
+                    if key in self._errors:
+                        raise self._errors.pop(key)
+                    found = self._found.get(key)
+                    if found:
+                        results.append(found.pop(0))
+                        continue
+                    # Keep every worker busy until enough primes come back
+                    while self._in_flight.get(key, 0) < max(self.processes, takes - len(results)):
+                        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+                        task_args = args + (self._cancel_epoch.value,) if cancellable else args
+                        pool.apply_async(func, args=task_args, callback=on_result, error_callback=on_error)
+                    self._condition.wait()
+            finally:
+                # Under the lock, so no on_result() is running meanwhile
+                done = True
+            if cancellable:
+                self._cancel_epoch.value += 1
+        return results
+
+    def map(self, func: Callable[[Any], Any], items: list[Any]) -> list[Any]:
+        """Returns [func(item) for item in items], computed by the workers."""
+        with self._condition:
+            pool = self._get_pool()
+        chunksize = max(1, len(items) // (4 * self.processes))
+        return pool.map(func, items, chunksize)
+
+_prime_worker_pool = PrimeWorkerPool()
+
+def get_prime_worker_pool() -> PrimeWorkerPool:
+    return _prime_worker_pool
+
+def shutdown_prime_worker_pool() -> None:
+    _prime_worker_pool.shutdown()
+
+def _worker(lbound: int|str, ubound: int|str, want_p_congruent_to_3_mod_4: bool, epoch: int|None = None) -> Output:
+    for _ in range(WORKER_CANCEL_CHECKS):
+        if worker_task_cancelled(epoch):
+            break
+        try:
+            return random_prime_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, max_iters=MAX_NUM_ITERS // WORKER_CANCEL_CHECKS, want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4)
+        except StopIteration:
+            pass
+    return 0, {}
 
 def random_prime_fast_with_fact_of_p_minus_1(lbound: int|str, ubound: int|str, takes: int, want_p_congruent_to_3_mod_4: bool = False) -> list[Output]:
-    outputs_queue = mp.Manager().Queue()
-
-    PROCESSES = mp.cpu_count()
-    outputs: list[Output] = []
-
-    with mp.Pool(processes=PROCESSES) as pool:
-        async_outputs = [pool.apply_async(_worker, args=(lbound, ubound, want_p_congruent_to_3_mod_4), callback=outputs_queue.put) for _ in range(PROCESSES)]
-        for async_output in async_outputs:
-            output = async_output.get()
-            if output[0] != 0:
-                outputs.append(output)
-                if len(outputs) == takes:
-                    # Terminate all the other processes
-                    pool.terminate()
-                    return outputs
-    
-    outputs.extend( random_prime_fast_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, takes=takes - len(outputs), want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4) )
-    return outputs
+    return _prime_worker_pool.take(_worker, (lbound, ubound, want_p_congruent_to_3_mod_4), takes, lambda output: output[0] != 0, cancellable=True)
 
 def random_prime_fast(lbound: int|str, ubound: int|str, takes: int, want_p_congruent_to_3_mod_4: bool = False) -> list[int]:
     return [p for p, _ in random_prime_fast_with_fact_of_p_minus_1(lbound=lbound, ubound=ubound, takes=takes, want_p_congruent_to_3_mod_4=want_p_congruent_to_3_mod_4)]
 
-def _worker_basic(lbound: int|str, ubound: int|str) -> int:
-    try:
-        return random_prime_with_max_num_iters(lbound=lbound, ubound=ubound, max_iters=MAX_NUM_ITERS_BASIC)
-    except StopIteration:
-        return 0
-
+def _worker_basic(lbound: int|str, ubound: int|str, epoch: int|None = None) -> int:
+    for _ in range(WORKER_CANCEL_CHECKS):
+        if worker_task_cancelled(epoch):
+            break
+        try:
+            return random_prime_with_max_num_iters(lbound=lbound, ubound=ubound, max_iters=MAX_NUM_ITERS_BASIC // WORKER_CANCEL_CHECKS, mode="sieve")
+        except StopIteration:
+            pass
+    return 0
 
 def random_prime_fast_basic(lbound: int|str, ubound: int|str, takes: int) -> list[int]:
-    outputs_queue = mp.Manager().Queue()
-
-    PROCESSES = mp.cpu_count()
-    outputs: list[int] = []
-
-    with mp.Pool(processes=PROCESSES) as pool:
-        async_outputs = [pool.apply_async(_worker_basic, args=(lbound, ubound), callback=outputs_queue.put) for _ in range(PROCESSES)]
-        for async_output in async_outputs:
-            output = async_output.get()
-            if output != 0:
-                outputs.append(output)
-                if len(outputs) == takes:
-                    # Terminate all the other processes
-                    pool.terminate()
-                    return outputs
-    
-    outputs.extend( random_prime_fast_basic(lbound=lbound, ubound=ubound, takes=takes - len(outputs)) )
-    return outputs
+    return _prime_worker_pool.take(_worker_basic, (lbound, ubound), takes, lambda output: output != 0, cancellable=True)
 
+import time
+import shutil
+import tempfile
 import unittest
 from functools import reduce
 from .prime.is_prime import is_prime
@@ -139,6 +266,70 @@ class TestRandomPrimeFastWithFactOfPMinus1(unittest.TestCase):
         i = self.i
         i("256b", "257b", 14)
 
+def _found_or_wait_for_cancellation(path: str, seconds: float, epoch: int) -> str:
+    # The first task to create the file finds something at once, the others run until cancelled
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL))
+        return "found"
+    except FileExistsError:
+        pass
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if worker_task_cancelled(epoch):
+            return "cancelled"
+        time.sleep(0.01)
+    return "timeout"
+
+class TestPrimeWorkerPool(unittest.TestCase):
+    def test_reused_across_calls(self):
+        pool = get_prime_worker_pool()
+        random_prime_fast_basic("64b", "65b", takes=1)
+        workers = pool._pool
+        self.assertIsNotNone(workers)
+        random_prime_fast_basic("64b", "65b", takes=3)
+        random_prime_fast("64b", "65b", takes=2)
+        self.assertIs(pool._pool, workers)
+    
+    def test_shutdown_and_restart(self):
+        shutdown_prime_worker_pool()
+        self.assertIsNone(get_prime_worker_pool()._pool)
+        for p in random_prime_fast_basic("64b", "65b", takes=2):
+            self.assertTrue( is_prime(p) )
+    
+    def test_errors_are_raised(self):
+        self.assertRaises(Exception, random_prime_fast_basic, "not a bound", 100, 1)
+
+    def test_cancellable(self):
+        pool = PrimeWorkerPool(processes=4)
+        directory = tempfile.mkdtemp()
+        try:
+            outputs: list[str] = []
+            found = pool.take(_found_or_wait_for_cancellation, (os.path.join(directory, "found"), 30.0), 1, lambda output: output == "found", on_output=outputs.append, cancellable=True)
+            self.assertEqual(found, ["found"])
+            deadline = time.monotonic() + 10
+            while any(pool._in_flight.values()) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertFalse(any(pool._in_flight.values()))
+            # The cancelled tasks ended after the call returned, so their outputs were dropped
+            self.assertEqual(outputs, ["found"])
+            self.assertFalse(worker_task_cancelled(0)) # not in a worker
+        finally:
+            pool.shutdown()
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_prime_tasks_stop_when_the_call_returns(self):
+        # Unless cancelled, each of the other tasks would run its 1000 iterations on 2048-bit candidates, for half a minute
+        pool = PrimeWorkerPool(processes=4)
+        try:
+            pool.take(_worker_basic, ("64b", "65b"), 1, lambda output: output != 0, cancellable=True) # start the workers
+            self.assertTrue(is_prime(pool.take(_worker_basic, ("2048b", "2049b"), 1, lambda output: output != 0, cancellable=True)[0]))
+            deadline = time.monotonic() + 15
+            while any(pool._in_flight.values()) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertFalse(any(pool._in_flight.values()))
+        finally:
+            pool.shutdown()
+
 class TestRandomPrimeFastBasic(unittest.TestCase):
     def i(self, lbound: int|str, ubound: int|str, takes: int = 2) -> None:
         for p in random_prime_fast_basic(lbound, ubound, takes=takes):
@@ -5,7 +5,7 @@
 # I will still keep it here for research interest.
 
 from .prime import random_prime
-from .prime.basic_primes import basic_primes
+from .prime.sieve import primes_up_to
 from .prime.is_prime_trivial import is_prime_trivial
 from .modpower import modpower
 from .extended_euclidean import gcd
@@ -76,7 +76,7 @@ def random_prime_maurer(k: int) -> int:
         # b = a ** (R2) mod n
         # c = b * a ** [R2(q-1)] mod n
 
-        for a in basic_primes[:4]:
+        for a in primes_up_to(7):
             R2 = 2 * R
             b = modpower(a, R2, n)
             c = b * modpower(a, R2 * (q-1), n) % n
@@ -3,12 +3,15 @@ sys.set_int_max_str_digits(2147483647) # 2^31 - 1
 
 from .prime.is_prime import is_prime
 from .CHECK_TESTING import CHECK_TESTING
-from .prime.basic_primes import basic_primes
+from .prime.sieve import next_prime, prime_pi, primes_up_to
 from .prime.boundaries import compute_lbound_ubound
 from .fact import fact
 import random
 import unittest
 
+# p - 1 is built as a product of random primes up to this bound
+P_MINUS_1_FACTORS_BOUND = 97
+
 def random_prime_with_fact_of_p_minus_1(lbound: int|str, ubound: int|str, max_iters: int|None = None, want_p_congruent_to_3_mod_4: bool = False) -> tuple[int, dict[int, int]]:
     lbound, ubound = compute_lbound_ubound(lbound, ubound, lbound_min=3)
 
@@ -17,15 +20,19 @@ def random_prime_with_fact_of_p_minus_1(lbound: int|str, ubound: int|str, max_it
             # 3 is itself congruent to 3 mod 4
             return 3, { 2: 1 }
 
-        while True:
-            p = random.randrange(lbound, ubound)
-            if want_p_congruent_to_3_mod_4 and p % 4 != 3:
-                p = max(3, (p + 1) // 4 * 4 + 3)
-            if not is_prime(p):
-                continue
-            return p, fact(p - 1)
+        # Pick directly among the primes of the range, from the sieve table
+        primes = [p for p in primes_up_to(ubound - 1)[prime_pi(lbound - 1):] if not want_p_congruent_to_3_mod_4 or p % 4 == 3]
+        if len(primes) > 0:
+            p = random.choice(primes)
+        else:
+            # No suitable prime in the range: settle for the first one after it
+            p = next_prime(lbound - 1)
+            while want_p_congruent_to_3_mod_4 and p % 4 != 3:
+                p = next_prime(p)
+        return p, fact(p - 1)
     
     threshold = (ubound + lbound) // 2
+    factor_primes = primes_up_to(P_MINUS_1_FACTORS_BOUND)
 
     iters = max_iters
     while True:
@@ -38,7 +45,7 @@ def random_prime_with_fact_of_p_minus_1(lbound: int|str, ubound: int|str, max_it
         p_minus_1 = 2
 
         while p_minus_1 < threshold:
-            pk = random.choice(basic_primes)
+            pk = random.choice(factor_primes)
             # Because: if p ≡ 3 mod 4 then (p - 1) ≡ 2 mod 4 then we have p - 1 = 4m + 2 for some m
             # Which is equivalent to (p - 1)/2 = 2m + 1 which in turns is equivalent to:
             #              p - 1 ≡ 0 mod 2  AND  (p - 1)/2 ≡ 1 mod 2
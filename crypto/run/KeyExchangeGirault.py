@@ -3,7 +3,7 @@ Q_BITS = 512
 
 from ..prime import is_prime, random_prime
 from ..random_prime_fast import random_prime_fast_basic
-from ..modpower import modpower
+from ..modpower import modpower, ModPowerContext
 from ..extended_euclidean import inverse
 from random import randint
 
@@ -91,6 +91,8 @@ def run_KeyExchangeGirault():
     alpha = generate_alpha(p1, q1)
     print(f"alpha = {alpha}")
     print()
+    # Every exponentiation of alpha below is mod n, so precompute its powers once
+    alpha_context = ModPowerContext(alpha, n, n.bit_length() + 1)
     print("Bước 3: Sinh e, d")
     e, d = generate_e_d(p, q)
     print(f"e = {e}")
@@ -101,15 +103,15 @@ def run_KeyExchangeGirault():
     ID_A = 8235 + 10_000
     print(f"ID_A = {ID_A}")
     a_A = randint(1000, 9999)
-    a_A = modpower(alpha, a_A, n)
-    b_A = modpower(alpha, a_A, n)
+    a_A = alpha_context.power(a_A)
+    b_A = alpha_context.power(a_A)
     p_A = modpower(b_A - ID_A, d, n)
     print(f"a_A = {a_A}")
     print(f"b_A = {b_A}")
     print(f"p_A = {p_A}")
     r_A = randint(1000, 9999)
-    r_A = modpower(alpha, r_A, n)
-    s_A = modpower(alpha, r_A, n)
+    r_A = alpha_context.power(r_A)
+    s_A = alpha_context.power(r_A)
     print(f"s_A = {s_A}")
     print()
 
@@ -117,15 +119,15 @@ def run_KeyExchangeGirault():
     ID_B = 8246 + 10_000
     print(f"ID_B = {ID_B}")
     a_B = randint(1000, 9999)
-    a_B = modpower(alpha, a_B, n)
-    b_B = modpower(alpha, a_B, n)
+    a_B = alpha_context.power(a_B)
+    b_B = alpha_context.power(a_B)
     p_B = modpower(b_B - ID_B, d, n)
     print(f"a_B = {a_B}")
     print(f"b_B = {b_B}")
     print(f"p_B = {p_B}")
     r_B = randint(1000, 9999)
-    r_B = modpower(alpha, r_B, n)
-    s_B = modpower(alpha, r_B, n)
+    r_B = alpha_context.power(r_B)
+    s_B = alpha_context.power(r_B)
     print(f"s_B = {s_B}")
     print()
 
@@ -139,7 +141,7 @@ def run_KeyExchangeGirault():
     print(f"k_B = {k_B}")
 
     print()
-    k = modpower(alpha, r_A * a_B + r_B * a_A, n)
+    k = alpha_context.power(r_A * a_B + r_B * a_A)
     print(f"k = {k}")
 
     assert k == k_A and k == k_B, "Key was not exchanged correctly"
@@ -118,7 +118,7 @@ class ECElGamalCryptoSystem(CryptoSystem[
         plain_numbers: list[int] = []
         for pair in cipher_text.pairs:
             M1, M2 = pair.M1, pair.M2
-            M = ec.add_points(M2, ec.scale_point(-s, M1))
+            M = ec.multi_scale([1, -s], [M2, M1]) # M2 - s * M1
             plain_number = convert_point_on_curve_to_plain_number(BIT_PADDING_CONFIG, ec, M)
             plain_numbers.append(plain_number)
         return Plaintext(plain_numbers)
@@ -10,13 +10,15 @@ from typing import override
 from random import randrange
 import unittest
 
-from ..extended_euclidean import inverse
-from ..modpower import modpower
+from ..extended_euclidean import batch_inverse
+from ..modpower import modpower, ModPowerContext
 from ..primitive_root import is_primitive_root_fast
 from ..random_prime_with_fact_of_p_minus_1 import random_prime_with_fact_of_p_minus_1
+from ..prime_reservoir import get_prime_reservoir
 from ..pubkeyops import CryptoSystem, CryptoSystemTest, Plaintext
 from ..bit_padding import pad, unpad, BitPaddingConfig
 from ..fact import fact
+from ..fact_cache import seed_factorization
 
 BIT_PADDING_CONFIG = BitPaddingConfig(LEFT_PADDING_SIZE, RIGHT_PADDING_SIZE)
 
@@ -59,7 +61,9 @@ class ElGamalCiphertext:
         return f"ElGamalCiphertext(\n    {'\n    '.join([str(x) for x in self.cipher_pairs])}\n)"
 
 def ElGamal_generate_keypair(pbits: int) -> tuple[tuple[int, int, int], tuple[int, int], dict[int, int]]:
-    p, fact_of_p_minus_1 = random_prime_with_fact_of_p_minus_1(lbound=f"{pbits}b", ubound=f"{pbits + 1}b")
+    p, fact_of_p_minus_1 = get_prime_reservoir().take_with_fact_of_p_minus_1(lbound=f"{pbits}b", ubound=f"{pbits + 1}b", takes=1)[0]
+    # p is public, so later fact(p - 1) calls, e.g. to sign, can reuse the factorization found with it
+    seed_factorization(p - 1, fact_of_p_minus_1)
     # alpha = p // 2
     alpha = 2
     while not is_primitive_root_fast(alpha, p, fact_of_p_minus_1):
@@ -75,6 +79,21 @@ class ElGamalCryptoPublicKey:
         self.alpha = alpha
         self.beta = beta
         self.fact_of_p_minus_1 = dict(fact_of_p_minus_1)
+        self._alpha_context: ModPowerContext|None = None
+        self._beta_context: ModPowerContext|None = None
+    
+    @property
+    def alpha_context(self) -> ModPowerContext:
+        """Precomputed powers of alpha, built on first use and shared by all encryptions with this key."""
+        if self._alpha_context is None:
+            self._alpha_context = ModPowerContext(self.alpha, self.p, self.p.bit_length())
+        return self._alpha_context
+    
+    @property
+    def beta_context(self) -> ModPowerContext:
+        if self._beta_context is None:
+            self._beta_context = ModPowerContext(self.beta, self.p, self.p.bit_length())
+        return self._beta_context
     
     def __repr__(self) -> str:
         return f"ElGamalCryptoPublicKey(p = {self.p}, alpha = {self.alpha}, beta = {self.beta})"
@@ -127,38 +146,37 @@ class ElGamalCryptoSystem(CryptoSystem[
     
     @override
     def encrypt(self, public_key: ElGamalCryptoPublicKey, plain_text: Plaintext) -> ElGamalCiphertext:
-        p, alpha, beta, fact_of_p_minus_1 = public_key.p, public_key.alpha, public_key.beta, public_key.fact_of_p_minus_1
-        def encrypt_number(plain_number: int) -> ElGamalCiphertextPair:
-            n = convert_plain_number_to_primitive_root(p, plain_number, fact_of_p_minus_1)
-
-            one_per_n = inverse(n, p)
-            if one_per_n is None:
-                raise ValueError(f"n is not invertible in Z_p (this should not happen). n = {n}, p = {p}")
-
+        p, fact_of_p_minus_1 = public_key.p, public_key.fact_of_p_minus_1
+        def encrypt_number(n: int) -> ElGamalCiphertextPair:
             k = randrange(2, p - 1)
-            y1 = modpower(alpha, k, p)
-            y2 = n * modpower(beta, k, p) % p
+            y1 = public_key.alpha_context.power(k)
+            y2 = n * public_key.beta_context.power(k) % p
 
             return ElGamalCiphertextPair(y1, y2)
         
-        cipher_pairs = [ encrypt_number(plain_number) for plain_number in plain_text.numbers ]
+        ns = [ convert_plain_number_to_primitive_root(p, plain_number, fact_of_p_minus_1) for plain_number in plain_text.numbers ]
+        # Only checks that every n is invertible, so one batch inversion is enough
+        for n, one_per_n in zip(ns, batch_inverse(ns, p)):
+            if one_per_n is None:
+                raise ValueError(f"n is not invertible in Z_p (this should not happen). n = {n}, p = {p}")
+
+        cipher_pairs = [ encrypt_number(n) for n in ns ]
         return ElGamalCiphertext(cipher_pairs)
     
     @override
     def decrypt(self, private_key: ElGamalCryptoPrivateKey, cipher_text: ElGamalCiphertext) -> Plaintext:
         p, a = private_key.p, private_key.a
-        def decrypt_number(cipher_pair: ElGamalCiphertextPair) -> int:
+        # x = y2 * modpower(y1, p - 1 - a, p) % p, with all the y1^a inverted at once
+        ss = batch_inverse([ modpower(cipher_pair.y1, a, p) for cipher_pair in cipher_text.cipher_pairs ], p)
+        def decrypt_number(cipher_pair: ElGamalCiphertextPair, s: int|None) -> int:
             y1 = cipher_pair.y1
             y2 = cipher_pair.y2
-            # x = y2 * modpower(y1, p - 1 - a, p) % p
-            s = modpower(y1, a, p)
-            s = inverse(s, p)
             if s is None:
                 raise RuntimeError(f"Could not find s such that y1^a * s = 1 mod p. y1 = {y1}, a = {a}, p = {p}")
             x = y2 * s % p
             return convert_primitive_root_to_plain_number(x)
         
-        plain_numbers = [ decrypt_number(cipher_pair) for cipher_pair in cipher_text.cipher_pairs ]
+        plain_numbers = [ decrypt_number(cipher_pair, s) for cipher_pair, s in zip(cipher_text.cipher_pairs, ss) ]
         return Plaintext(plain_numbers)
 
     @override
@@ -112,8 +112,8 @@ class MasseyOmuraCryptoSystem(ThreepassCryptoSystem[
         ec = encryption_key.public_info.ec
         s = encryption_key.s
         return MasseyOmuraSemiplaintext([
-            MasseyOmuraSemiplaintextPoint( ec.scale_point(s, M) )
-            for M in semiplaintext.points
+            MasseyOmuraSemiplaintextPoint(M)
+            for M in ec.scale_points(s, list(semiplaintext.points))
         ])
     
     @override
@@ -122,8 +122,8 @@ class MasseyOmuraCryptoSystem(ThreepassCryptoSystem[
         s_inverse = decryption_key.s_inverse
 
         return MasseyOmuraSemiplaintext([
-            MasseyOmuraSemiplaintextPoint( ec.scale_point(s_inverse, M) )
-            for M in semiplaintext.points
+            MasseyOmuraSemiplaintextPoint(M)
+            for M in ec.scale_points(s_inverse, list(semiplaintext.points))
         ])
     
     @override
@@ -1,18 +1,83 @@
 CRYPTO_BITS = (2048, 2048)
+CRYPTO_NUM_PRIMES = 2 # 3 or 4 primes of (CRYPTO_BITS[0] + CRYPTO_BITS[1]) / CRYPTO_NUM_PRIMES bits make key generation and decryption faster
 
 import sys
 sys.set_int_max_str_digits(2147483647)
 
 from typing import override
+import unittest
 
-from ..extended_euclidean import extended_euclidean
+from ..extended_euclidean import extended_euclidean, inverse
 from ..modpower import modpower
+from ..fact_cache import get_factorization_cache
 from ..prime import random_prime
-from ..random_prime_fast import random_prime_fast
+from ..prime_reservoir import get_prime_reservoir
 from ..pubkeyops import CryptoSystem, CryptoSystemTest, Plaintext
 
 # K1: public: encrypt, (n, e)
-# K2: private: decrypt, (n, d)
+# K2: private: decrypt, (n, d), optionally with the CRT parameters (p, q, dP, dQ, qInv)
+
+class RSACRTParameters:
+    """
+    The factors of n = p * q * r_3 * ... * r_k, kept so that c^d mod n can be
+    computed with k small exponentiations, recombined with Garner's formula:
+
+        m1 = c^dP mod p, m2 = c^dQ mod q, m = m2 + q * (qInv * (m1 - m2) mod p)
+
+    then, for each additional prime r_i with R_i = p * q * r_3 * ... * r_(i-1):
+
+        m_i = c^(d_i) mod r_i, m = m + R_i * (t_i * (m_i - m) mod r_i)
+
+    where other_primes holds the triples (r_i, d_i, t_i = R_i^(-1) mod r_i), as in PKCS #1.
+    """
+
+    def __init__(self, p: int, q: int, dP: int, dQ: int, qInv: int, other_primes: list[tuple[int, int, int]]|None = None) -> None:
+        self.p = p
+        self.q = q
+        self.dP = dP
+        self.dQ = dQ
+        self.qInv = qInv
+        self.other_primes = list(other_primes or [])
+    
+    @property
+    def primes(self) -> list[int]:
+        return [self.p, self.q] + [r for r, _d, _t in self.other_primes]
+    
+    @staticmethod
+    def from_primes(primes: list[int], d: int) -> "RSACRTParameters":
+        if len(primes) < 2:
+            raise ValueError(f"At least 2 primes are needed (primes = {primes})")
+        p, q = primes[0], primes[1]
+        qInv = inverse(q % p, p)
+        if qInv is None:
+            raise ValueError(f"q must be invertible mod p (p = {p}, q = {q})")
+        other_primes: list[tuple[int, int, int]] = []
+        R = p * q
+        for r in primes[2:]:
+            t = inverse(R % r, r)
+            if t is None:
+                raise ValueError(f"The primes must be pairwise coprime (primes = {primes})")
+            other_primes.append((r, d % (r - 1), t))
+            R *= r
+        return RSACRTParameters(p, q, d % (p - 1), d % (q - 1), qInv, other_primes)
+    
+    def power(self, c: int) -> int:
+        """Returns c^d mod n."""
+        p, q = self.p, self.q
+        m1 = modpower(c % p, self.dP, p)
+        m2 = modpower(c % q, self.dQ, q)
+        h = self.qInv * (m1 - m2) % p
+        m = m2 + h * q
+        R = p * q
+        for r, d_r, t in self.other_primes:
+            m_r = modpower(c % r, d_r, r)
+            h = t * (m_r - m) % r
+            m += R * h
+            R *= r
+        return m
+    
+    def __repr__(self) -> str:
+        return f"RSACRTParameters(p = {self.p} , q = {self.q} , dP = {self.dP} , dQ = {self.dQ} , qInv = {self.qInv} , other_primes = {self.other_primes})"
 
 class RSACryptoPublicKey:
     def __init__(self, n: int, e: int) -> None:
@@ -23,9 +88,10 @@ class RSACryptoPublicKey:
         return f"RSACryptoPublicKey(n = {self.n} , e = {self.e})"
 
 class RSACryptoPrivateKey:
-    def __init__(self, n: int, d: int) -> None:
+    def __init__(self, n: int, d: int, crt: RSACRTParameters|None = None) -> None:
         self.n = n
         self.d = d
+        self.crt = crt # None for keys known only as (n, d), e.g. entered interactively
     
     def __repr__(self) -> str:
         return f"RSACryptoPrivateKey(n = {self.n} , d = {self.d})"
@@ -38,13 +104,29 @@ class RSACryptoCiphertext:
         return f"RSACryptoCiphertext(<Array [{len(self.numbers)}]>{self.numbers})"
 
 def generate_RSA_keypair(
-    pbits: int, qbits: int
-) -> tuple[tuple[int, int], tuple[int, int]]:
-    p, q = random_prime_fast(lbound=2**pbits, ubound=2 ** (pbits + 1), takes=2)
-    while q == p:
-        q = random_prime(lbound=2**qbits, ubound=2 ** (qbits + 1))
-    n = p * q
-    phi_n = (p - 1) * (q - 1)
+    pbits: int, qbits: int, num_primes: int = 2
+) -> tuple[tuple[int, int], tuple[int, int], RSACRTParameters]:
+    """
+    Returns (n, e), (n, d), and the CRT parameters of d.
+    With num_primes > 2, n is the product of num_primes primes of (pbits + qbits) / num_primes bits each (multi-prime RSA).
+    """
+    if num_primes < 2:
+        raise ValueError(f"num_primes must be at least 2 (num_primes = {num_primes})")
+    if num_primes == 2:
+        p, q = get_prime_reservoir().take(lbound=2**pbits, ubound=2 ** (pbits + 1), takes=2)
+        while q == p:
+            q = random_prime(lbound=2**qbits, ubound=2 ** (qbits + 1))
+        primes = [p, q]
+    else:
+        rbits = (pbits + qbits) // num_primes
+        primes = get_prime_reservoir().take(lbound=2**rbits, ubound=2 ** (rbits + 1), takes=num_primes)
+        while len(set(primes)) < num_primes:
+            primes = list(set(primes)) + [random_prime(lbound=2**rbits, ubound=2 ** (rbits + 1))]
+    n = 1
+    phi_n = 1
+    for r in primes:
+        n *= r
+        phi_n *= r - 1
 
     while True:
         e = random_prime(lbound=2**10, ubound=2**11)
@@ -56,13 +138,16 @@ def generate_RSA_keypair(
         raise RuntimeError(
             f"e mod phi_n is not invertible, i.e. cannot calculate e^(-1) mod phi_n, with e = {e} and phi_n = {phi_n}"
         )
-    return (n, e), (n, d)
+    return (n, e), (n, d), RSACRTParameters.from_primes(primes, d)
 
 class RSACryptoSystem(CryptoSystem[RSACryptoPublicKey, RSACryptoPrivateKey, RSACryptoCiphertext]):
+    def __init__(self, num_primes: int = CRYPTO_NUM_PRIMES) -> None:
+        self.num_primes = num_primes
+    
     @override
     def generate_keypair(self) -> tuple[RSACryptoPublicKey, RSACryptoPrivateKey]:
-        (n, e), (n, d) = generate_RSA_keypair(CRYPTO_BITS[0], CRYPTO_BITS[1])
-        return RSACryptoPublicKey(n, e), RSACryptoPrivateKey(n, d)
+        (n, e), (n, d), crt = generate_RSA_keypair(CRYPTO_BITS[0], CRYPTO_BITS[1], self.num_primes)
+        return RSACryptoPublicKey(n, e), RSACryptoPrivateKey(n, d, crt)
     
     @override
     def ask_public_key_interactively(self, prompt: str|None = None) -> RSACryptoPublicKey:
@@ -95,10 +180,10 @@ class RSACryptoSystem(CryptoSystem[RSACryptoPublicKey, RSACryptoPrivateKey, RSAC
     
     @override
     def decrypt(self, private_key: RSACryptoPrivateKey, cipher_text: RSACryptoCiphertext) -> Plaintext:
-        n, d = private_key.n, private_key.d
+        n, d, crt = private_key.n, private_key.d, private_key.crt
         plain_numbers: list[int] = []
         for c in cipher_text.numbers:
-            p = modpower(c, d, n)
+            p = crt.power(c) if crt is not None else modpower(c, d, n)
             plain_numbers.append(p)
         return Plaintext(plain_numbers)
     
@@ -114,3 +199,49 @@ class RSACryptoSystemTest(CryptoSystemTest[RSACryptoPublicKey, RSACryptoPrivateK
     @override
     def create_crypto_system(self) -> RSACryptoSystem:
         return RSACryptoSystem()
+
+class TestRSACRTParameters(unittest.TestCase):
+    def test_against_modpower(self):
+        for p, q, e in [(61, 53, 17), (1009, 2003, 5), (2**61 - 1, 2**89 - 1, 65537)]:
+            n = p * q
+            d = inverse(e, (p - 1) * (q - 1))
+            assert d is not None
+            crt = RSACRTParameters.from_primes([p, q], d)
+            for c in [0, 1, 2, p, q, n - 1, 123456789 % n, (p + 1) * q % n]:
+                self.assertEqual(crt.power(c), modpower(c, d, n), f"c = {c}, p = {p}, q = {q}")
+    
+    def test_bare_private_key(self):
+        system = RSACryptoSystem()
+        (n, e), (n, d), _crt = generate_RSA_keypair(64, 64)
+        plain_text = Plaintext([2, 3, 123456789])
+        cipher_text = system.encrypt(RSACryptoPublicKey(n, e), plain_text)
+        self.assertEqual(system.decrypt(RSACryptoPrivateKey(n, d), cipher_text).numbers, plain_text.numbers)
+    
+    def test_multi_prime(self):
+        primes = [1009, 2003, 3001, 4001]
+        for k in [3, 4]:
+            n = 1
+            phi_n = 1
+            for r in primes[:k]:
+                n *= r
+                phi_n *= r - 1
+            d = inverse(17, phi_n)
+            assert d is not None
+            crt = RSACRTParameters.from_primes(primes[:k], d)
+            self.assertEqual(crt.primes, primes[:k])
+            for c in [0, 1, 2, 1009, n - 1, 123456789 % n]:
+                self.assertEqual(crt.power(c), modpower(c, d, n), f"c = {c}, k = {k}")
+        for k in [3, 4]:
+            (n, e), (n, d), crt = generate_RSA_keypair(64, 64, k)
+            self.assertEqual(len(crt.primes), k)
+            system = RSACryptoSystem(k)
+            plain_text = Plaintext([2, 3, 123456789])
+            cipher_text = system.encrypt(RSACryptoPublicKey(n, e), plain_text)
+            self.assertEqual(system.decrypt(RSACryptoPrivateKey(n, d, crt), cipher_text).numbers, plain_text.numbers)
+
+    def test_primes_not_cached(self):
+        # p - 1 must not leak from the factorization cache, which may spill to disk
+        for k in [2, 3]:
+            _public, _private, crt = generate_RSA_keypair(64, 64, k)
+            for r in crt.primes:
+                self.assertIsNone(get_factorization_cache().get(r - 1), f"r = {r}")
@@ -1,14 +1,29 @@
 SIGNATURE_BITS = 10
 
+# verify_batch() checks signatures in groups of at most this many at once.
+# The group check tries all 2^(size - 1) signs of the R points, so keep it small.
+BATCH_VERIFY_GROUP_SIZE = 8
+# Bit length of the random multipliers used to combine a group into one equation
+BATCH_VERIFY_RANDOMIZER_BITS = 64
+# On curves whose group order is shorter than this, the probabilistic group check
+# is not reliable and verify_batch() checks every signature on its own
+BATCH_VERIFY_MIN_ORDER_BITS = 96
+
 import sys
 sys.set_int_max_str_digits(2147483647)
 
 from typing import override
 from random import randrange
+import unittest
+import contextlib
+import io
 from ..pubkeyops import SignatureSystem, SignatureSystemTest, Plaintext
-from ..elliptic_curve import EllipticCurve, generate_elliptic_curve_with_number_of_points_being_prime
+from ..pubkeyops.Plaintext import Plaintext as Signature
+from ..elliptic_curve import EllipticCurve, generate_elliptic_curve_with_number_of_points_being_prime, get_special_curve
+from ..elliptic_curve.jacobian import JacobianPoint, JACOBIAN_INFINITY, jacobian_add, jacobian_negate, to_jacobian
 from ..prime import is_prime
-from ..extended_euclidean import inverse
+from ..extended_euclidean import inverse, batch_inverse
+from ..find_sq_roots import find_sq_roots
 
 from .CryptoECElGamal import ask_elliptic_curve_interactively
 
@@ -30,6 +45,29 @@ class ECDSASignatureVerifierKey:
     def __repr__(self) -> str:
         return f"ECDSASignatureVerifierKey(ec = {self.ec}, n = {self.n}, Q = {self.Q})"
 
+def _lift_r_to_point(ec: EllipticCurve, n: int, r: int) -> tuple[int, int]|None|bool:
+    """
+    Returns one of the two points R = (x, +-y) such that x mod n = r, if x is unique.
+    Returns False if there is no such point (the signature is invalid),
+    or True if x is ambiguous (x = r + n < p is also possible).
+    """
+    p, a, b = ec.p, ec.a, ec.b
+    if r + n < p:
+        return True
+    if r >= p:
+        return False
+    ys = find_sq_roots((r * r * r + a * r + b) % p, p, True)
+    if len(ys) == 0:
+        return False
+    return (r, ys[0])
+
+def _jacobian_equals_affine(p: int, P: JacobianPoint, Q: tuple[int, int]) -> bool:
+    X, Y, Z = P
+    if Z % p == 0:
+        return Q[0] % p == 0 and Q[1] % p == 0
+    ZZ = Z * Z % p
+    return (X - Q[0] * ZZ) % p == 0 and (Y - Q[1] * ZZ * Z) % p == 0
+
 class ECDSASignatureSystem(SignatureSystem[
     ECDSASignatureSignerKey,
     ECDSASignatureVerifierKey,
@@ -73,27 +111,42 @@ class ECDSASignatureSystem(SignatureSystem[
         d = signer_key.d
         G = ec.starting_point
 
+        def draw_k_r() -> tuple[int, int]:
+            r = 0
+            k = 0
+            while r == 0:
+                k = randrange(1, n - 1)
+                x1 = ec.scale_point(k, G)[0]
+                r = x1 % n
+            return k, r
+
         def sign_single(number: int) -> tuple[int, int]:
             s = 0
             r = 0
             while s == 0:
-                r = 0
-                k = 0
-                while r == 0:
-                    k = randrange(1, n - 1)
-                    x1 = ec.scale_point(k, G)[0]
-                    r = x1 % n
+                k, r = draw_k_r()
                 
                 h = number # maybe SHA-512 here
                 one_per_k_mod_n = inverse(k, n)
                 if one_per_k_mod_n is None:
-                    raise RuntimeError(f"This case should not happen: Could not find the inverse of {k} mod {n}")
+                    # n is not prime (an order entered by hand): draw another k
+                    continue
 
                 s = (h + d * r) % n * one_per_k_mod_n % n
             
             return r, s
         
-        r_s_pairs = [sign_single(number) for number in plain_text.numbers]
+        # Draw all the nonces first so that they can be inverted together
+        k_r_pairs = [draw_k_r() for _number in plain_text.numbers]
+        ks_inverse = batch_inverse([k for k, _r in k_r_pairs], n)
+        r_s_pairs: list[tuple[int, int]] = []
+        for number, (k, r), one_per_k_mod_n in zip(plain_text.numbers, k_r_pairs, ks_inverse):
+            if one_per_k_mod_n is None:
+                r_s_pairs.append(sign_single(number))
+                continue
+            h = number # maybe SHA-512 here
+            s = (h + d * r) % n * one_per_k_mod_n % n
+            r_s_pairs.append((r, s) if s != 0 else sign_single(number))
         numbers: list[int] = []
         for r, s in r_s_pairs:
             numbers.append(r)
@@ -116,7 +169,7 @@ class ECDSASignatureSystem(SignatureSystem[
             h = number
             u1 = h * w % n
             u2 = r * w % n
-            x0 = ec.add_points(ec.scale_point(u1, G), ec.scale_point(u2, Q))[0]
+            x0 = ec.multi_scale([u1, u2], [G, Q])[0]
             v = x0 % n
 
             if v != r:
@@ -135,6 +188,126 @@ class ECDSASignatureSystem(SignatureSystem[
 
         return True
     
+    def verify_batch(self, verifier_key: ECDSASignatureVerifierKey, items: list[tuple[Plaintext, Signature]]) -> list[bool]:
+        """
+        Verifies many (plain_text, signature) pairs against the same key.
+        Returns, for each pair, what verify() would have returned.
+
+        All the s^(-1) mod n are computed with one modular inversion. The
+        signatures are then checked in groups with a single randomized
+        equation per group (z_i random):
+
+            (sum z_i u1_i) G + (sum z_i u2_i) Q = sum +-z_i R_i
+
+        where R_i is the point with x-coordinate r_i. If the group check
+        fails, the group is bisected until the bad signatures are found.
+        """
+        ec = verifier_key.ec
+        n = verifier_key.n
+        Q = verifier_key.Q
+        G = ec.starting_point
+        p = ec.p
+
+        results = [True] * len(items)
+        # (item index, r, u1, u2) of every number of every item
+        entries: list[tuple[int, int, int, int]] = []
+        pending: list[tuple[int, int, int, int]] = [] # (item index, r, s, h)
+        for i, (plain_text, signature) in enumerate(items):
+            for j in range(len(plain_text.numbers)):
+                try:
+                    r = signature.numbers[2 * j]
+                    s = signature.numbers[2 * j + 1]
+                except IndexError:
+                    results[i] = False
+                    break
+                if r <= 0 or r >= n or s <= 0 or s >= n:
+                    results[i] = False
+                    break
+                pending.append((i, r, s, plain_text.numbers[j]))
+        pending = [entry for entry in pending if results[entry[0]]]
+
+        # ws[k] = s^(-1) mod n. If n is not prime (an order entered by hand),
+        # some s are not invertible, and their signature is invalid as in verify().
+        ws = batch_inverse([s for _i, _r, s, _h in pending], n)
+        for (i, r, _s, h), w in zip(pending, ws):
+            if w is None:
+                results[i] = False
+                continue
+            entries.append((i, r, h * w % n, r * w % n))
+
+        def verify_entry(entry: tuple[int, int, int, int]) -> bool:
+            _i, r, u1, u2 = entry
+            return ec.multi_scale([u1, u2], [G, Q])[0] % n == r
+
+        def verify_group(group: list[tuple[tuple[int, int, int, int], tuple[int, int]]]) -> list[bool]:
+            if len(group) == 1:
+                return [verify_entry(group[0][0])]
+            if self._verify_group_at_once(ec, n, Q, group):
+                return [True] * len(group)
+            middle = len(group) // 2
+            return verify_group(group[:middle]) + verify_group(group[middle:])
+
+        group: list[tuple[tuple[int, int, int, int], tuple[int, int]]] = []
+        def flush_group() -> None:
+            if len(group) == 0:
+                return
+            for (entry, _R), valid in zip(group, verify_group(group)):
+                if not valid:
+                    results[entry[0]] = False
+            group.clear()
+
+        use_group_check = n.bit_length() >= BATCH_VERIFY_MIN_ORDER_BITS
+        for entry in entries:
+            if not results[entry[0]]:
+                continue
+            R = _lift_r_to_point(ec, n, entry[1]) if use_group_check else True
+            if R is False:
+                results[entry[0]] = False
+            elif R is True:
+                if not verify_entry(entry):
+                    results[entry[0]] = False
+            else:
+                group.append((entry, R))
+                if len(group) == BATCH_VERIFY_GROUP_SIZE:
+                    flush_group()
+        flush_group()
+
+        return results
+
+    def _verify_group_at_once(self, ec: EllipticCurve, n: int, Q: tuple[int, int], group: list[tuple[tuple[int, int, int, int], tuple[int, int]]]) -> bool:
+        """Probabilistic check that every signature of the group is valid. Never rejects a group of valid signatures."""
+        p, a = ec.p, ec.a
+        G = ec.starting_point
+
+        zs = [1] + [randrange(1, 2**BATCH_VERIFY_RANDOMIZER_BITS) for _ in range(len(group) - 1)]
+        U1 = sum(z * entry[2] for z, (entry, _R) in zip(zs, group)) % n
+        U2 = sum(z * entry[3] for z, (entry, _R) in zip(zs, group)) % n
+        LHS = ec.multi_scale([U1, U2], [G, Q])
+
+        # u1_i G + u2_i Q is either R_i or -R_i ; try every combination of signs,
+        # flipping one sign at a time in Gray code order.
+        # The sign of the first term can stay fixed: we compare against both LHS and -LHS.
+        negated_LHS = (LHS[0], (p - LHS[1]) % p)
+        zRs = [to_jacobian(p, ec.scale_point(z, R)) for z, (_entry, R) in zip(zs, group)]
+        twice_zRs = [jacobian_add(p, a, zR, zR) for zR in zRs]
+        total = JACOBIAN_INFINITY
+        for zR in zRs:
+            total = jacobian_add(p, a, total, zR)
+        signs = [1] * len(group)
+        for k in range(1 << (len(group) - 1)):
+            if _jacobian_equals_affine(p, total, LHS) or _jacobian_equals_affine(p, total, negated_LHS):
+                return True
+            # Gray code: the bit flipping between k and k + 1
+            flipped = ((k ^ (k + 1)) & ~k).bit_length() # in [1, len(group) - 1]
+            if flipped >= len(group):
+                break
+            if signs[flipped] == 1:
+                total = jacobian_add(p, a, total, jacobian_negate(p, twice_zRs[flipped]))
+            else:
+                total = jacobian_add(p, a, total, twice_zRs[flipped])
+            signs[flipped] = -signs[flipped]
+        return False
+    
     @override
     def str2plaintext_signer(self, signer_key: ECDSASignatureSignerKey, string: str) -> Plaintext:
         return Plaintext.from_string(string)
@@ -150,3 +323,47 @@ class ECDSASignatureSystemTest(SignatureSystemTest[
     @override
     def create_signature_system(self) -> SignatureSystem[ECDSASignatureSignerKey, ECDSASignatureVerifierKey]:
         return ECDSASignatureSystem()
+
+class TestECDSAVerifyBatch(unittest.TestCase):
+    def check(self, signer: ECDSASignatureSignerKey, verifier: ECDSASignatureVerifierKey) -> None:
+        signature_system = ECDSASignatureSystem()
+        n = verifier.n
+        items: list[tuple[Plaintext, Signature]] = []
+        for i in range(21):
+            plain_text = Plaintext([randrange(1, n) for _ in range(1 + i % 3)])
+            signature = signature_system.sign(signer, plain_text)
+            if i % 5 == 3:
+                signature = Plaintext([signature.numbers[0], signature.numbers[1] % (n - 1) + 1] + signature.numbers[2:])
+            elif i % 7 == 4:
+                plain_text = Plaintext([plain_text.numbers[0] + 1] + plain_text.numbers[1:])
+            elif i == 20:
+                signature = Plaintext(signature.numbers[:-1])
+            items.append((plain_text, signature))
+
+        with contextlib.redirect_stdout(io.StringIO()): # verify() reports mismatches on stdout
+            expected = [signature_system.verify(verifier, plain_text, signature) for plain_text, signature in items]
+        self.assertEqual(signature_system.verify_batch(verifier, items), expected)
+        self.assertEqual(signature_system.verify_batch(verifier, []), [])
+
+    def test_small_curve(self):
+        signer, verifier = ECDSASignatureSystem().generate_keypair()
+        self.check(signer, verifier)
+
+    def test_secp256k1(self):
+        ec = get_special_curve(256)
+        n = ec.num_points_on_curve
+        d = randrange(1, n)
+        self.check(ECDSASignatureSignerKey(ec, n, d), ECDSASignatureVerifierKey(ec, n, ec.get_point_by_index(d)))
+
+    def test_composite_order(self):
+        # G = (338, 71) has order 81 = 3^4: the multiples of 3 are not invertible
+        signature_system = ECDSASignatureSystem()
+        ec = EllipticCurve(827, True, 29, 13, (338, 71))
+        n, d = 81, 5
+        signature = signature_system.sign(ECDSASignatureSignerKey(ec, n, d), Plaintext([7] * 40))
+        verifier = ECDSASignatureVerifierKey(ec, n, ec.get_point_by_index(d))
+        items = [(Plaintext([7]), signature)] + [(Plaintext([h]), Plaintext([r, 3 * k])) for h, r, k in [(7, 10, 1), (2, 5, 13), (4, 9, 26)]]
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = [signature_system.verify(verifier, plain_text, signature) for plain_text, signature in items]
+        self.assertEqual(expected[1:], [False] * 3)
+        self.assertEqual(signature_system.verify_batch(verifier, items), expected)
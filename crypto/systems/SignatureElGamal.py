@@ -7,7 +7,7 @@ from typing import override
 from random import randrange
 
 from ..extended_euclidean import inverse
-from ..modpower import modpower
+from ..modpower import modpower, ModPowerContext
 from ..fact import fact
 from ..pubkeyops import SignatureSystem, SignatureSystemTest, Plaintext
 
@@ -25,6 +25,14 @@ class ElGamalSignatureSignerKey:
         self.alpha = alpha
         self.a = a
         self.fact_of_p_minus_1 = dict(fact_of_p_minus_1)
+        self._alpha_context: ModPowerContext|None = None
+    
+    @property
+    def alpha_context(self) -> ModPowerContext:
+        """Precomputed powers of alpha, built on first use and shared by all signatures with this key."""
+        if self._alpha_context is None:
+            self._alpha_context = ModPowerContext(self.alpha, self.p, self.p.bit_length())
+        return self._alpha_context
     
     def __repr__(self) -> str:
         return f"ElGamalSignatureSignerKey(p = {self.p}, alpha = {self.alpha}, a = {self.a})"
@@ -35,6 +43,21 @@ class ElGamalSignatureVerifierKey:
         self.alpha = alpha
         self.beta = beta
         self.fact_of_p_minus_1 = dict(fact_of_p_minus_1)
+        self._alpha_context: ModPowerContext|None = None
+        self._beta_context: ModPowerContext|None = None
+    
+    @property
+    def alpha_context(self) -> ModPowerContext:
+        """Precomputed powers of alpha, built on first use and shared by all verifications with this key."""
+        if self._alpha_context is None:
+            self._alpha_context = ModPowerContext(self.alpha, self.p, self.p.bit_length())
+        return self._alpha_context
+    
+    @property
+    def beta_context(self) -> ModPowerContext:
+        if self._beta_context is None:
+            self._beta_context = ModPowerContext(self.beta, self.p, self.p.bit_length())
+        return self._beta_context
     
     def __repr__(self) -> str:
         return f"ElGamalSignatureVerifierKey(p = {self.p}, alpha = {self.alpha}, beta = {self.beta})"
@@ -58,7 +81,7 @@ class ElGamalSignatureSystem(SignatureSystem[
     
     @override
     def sign(self, signer_key: ElGamalSignatureSignerKey, plain_text: Plaintext) -> Plaintext:
-        p, alpha, a, fact_of_p_minus_1 = signer_key.p, signer_key.alpha, signer_key.a, signer_key.fact_of_p_minus_1
+        p, a, fact_of_p_minus_1 = signer_key.p, signer_key.a, signer_key.fact_of_p_minus_1
         p_1 = p - 1
 
         def sign_number(plain_number: int) -> tuple[int, int]:
@@ -75,7 +98,7 @@ class ElGamalSignatureSystem(SignatureSystem[
             #     if one_per_k is not None:
             #         break
 
-            gamma = modpower(alpha, k, p)
+            gamma = signer_key.alpha_context.power(k)
             delta = (x - a * gamma) % p_1 * one_per_k % p_1
             return gamma, delta
         
@@ -92,8 +115,8 @@ class ElGamalSignatureSystem(SignatureSystem[
         def verify_number(plain_number: int, gamma: int, delta: int) -> bool:
             x = convert_plain_number_to_primitive_root(p, plain_number, fact_of_p_minus_1)
 
-            LHS = modpower(beta, gamma, p) * modpower(gamma, delta, p) % p
-            RHS = modpower(alpha, x, p) % p
+            LHS = verifier_key.beta_context.power(gamma) * modpower(gamma, delta, p) % p
+            RHS = verifier_key.alpha_context.power(x) % p
 
             number_signature_ok = (LHS - RHS) % p == 0
             if not number_signature_ok:
@@ -5,7 +5,7 @@ sys.set_int_max_str_digits(2147483647)
 
 from typing import override
 
-from .CryptoRSA import generate_RSA_keypair
+from .CryptoRSA import generate_RSA_keypair, RSACRTParameters
 from ..modpower import modpower
 from ..pubkeyops import SignatureSystem, SignatureSystemTest, Plaintext
 
@@ -13,9 +13,10 @@ def h(x: int) -> int:
     return x
 
 class RSASignatureSignerKey:
-    def __init__(self, n: int, a: int) -> None:
+    def __init__(self, n: int, a: int, crt: RSACRTParameters|None = None) -> None:
         self.n = n
         self.a = a
+        self.crt = crt
     
     def __repr__(self) -> str:
         return f"RSASignatureSignerKey(n = {self.n} , a = {self.a})"
@@ -31,8 +32,8 @@ class RSASignatureVerifierKey:
 class RSASignatureSystem(SignatureSystem[RSASignatureSignerKey, RSASignatureVerifierKey]):
     @override
     def generate_keypair(self) -> tuple[RSASignatureSignerKey, RSASignatureVerifierKey]:
-        (n, b), (n, a) = generate_RSA_keypair(SIGNATURE_BITS[0], SIGNATURE_BITS[1])
-        return RSASignatureSignerKey(n, a), RSASignatureVerifierKey(n, b)
+        (n, b), (n, a), crt = generate_RSA_keypair(SIGNATURE_BITS[0], SIGNATURE_BITS[1])
+        return RSASignatureSignerKey(n, a, crt), RSASignatureVerifierKey(n, b)
     
     @override
     def ask_verification_key_interactively(self, prompt: str|None = None) -> RSASignatureVerifierKey:
@@ -42,10 +43,10 @@ class RSASignatureSystem(SignatureSystem[RSASignatureSignerKey, RSASignatureVeri
     
     @override
     def sign(self, signer_key: RSASignatureSignerKey, plain_text: Plaintext) -> Plaintext:
-        n, a = signer_key.n, signer_key.a
+        n, a, crt = signer_key.n, signer_key.a, signer_key.crt
         signed_numbers: list[int] = []
         for x in plain_text.numbers:
-            sig = modpower(h(x), a, n)
+            sig = crt.power(h(x)) if crt is not None else modpower(h(x), a, n)
             signed_numbers.append(sig)
         return Plaintext(signed_numbers)
     